@@ -1,6 +1,10 @@
 '''
     Defines engine thrust profiles for various preset rockets
+
+    Measured engine curves (RASP .eng files in inc/engines) can be used
+        anywhere a profile name is accepted, see resolve_thrust_profile
 '''
+from src.ThrustCurve import ThrustCurve, find_thrust_curve
 
 def linear_thrust(t: float, burn_time: float, max_thrust: float):
     return max(0.0, max_thrust * (1 - t / burn_time))
@@ -33,4 +37,32 @@ def patriot_thrust_profile(t: float, burn_time: float, max_thrust: float):
 
 def falcon1_thrust_profile(t: float, burn_time: float, max_thrust: float):
     # Almost constant thrust with a slight linear decrease
-    return max(0.0, max_thrust * (1 - 0.1 * t / burn_time))
\ No newline at end of file
+    return max(0.0, max_thrust * (1 - 0.1 * t / burn_time))
+
+# Map thrust profile names to their functions
+THRUST_PROFILES = {
+    "linear": linear_thrust,
+    "quarter": quarter_thrust,
+    "v2": V2_thrust_profile,
+    "hellfire": hellfire_thrust_profile,
+    "patriot": patriot_thrust_profile,
+    "falcon1": falcon1_thrust_profile
+}
+
+# Function to look up the registered name of a thrust profile function
+#   - returns None for profiles that are not in THRUST_PROFILES (lambdas, closures)
+def profile_name(thrust_profile):
+    if isinstance(thrust_profile, ThrustCurve):
+        return thrust_profile.name
+    for name, profile in THRUST_PROFILES.items():
+        if profile is thrust_profile:
+            return name
+    return None
+
+
+# Function to turn a profile name (as stored in presets) into a thrust profile
+#   - formula profiles come from THRUST_PROFILES, anything else is looked up in inc/engines
+def resolve_thrust_profile(name: str):
+    if name in THRUST_PROFILES:
+        return THRUST_PROFILES[name]
+    return find_thrust_curve(name)
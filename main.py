@@ -11,55 +11,61 @@
         Burn Time
         Fuel Mass
         Drag Coefficient
+        Mach-dependent Drag (presets with a C_D(Mach) table)
         Cross-Section Area
         Initial Altitude
         Initial Velocity
         Launch Angle
         Time Step
+        Apogee Tolerance (Auto Time Step)
         Simulation Duration
     
     Outputs:
         Altitude Graph
         Velocity Graph
+        Comparison Graphs (several presets / variants overlaid)
         Truncation Error Graphs
 '''
 import sys
 import json
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QFormLayout, QLabel, QLineEdit, QPushButton, QComboBox, QMainWindow, QHBoxLayout
+    QApplication, QWidget, QVBoxLayout, QFormLayout, QLabel, QLineEdit, QPushButton, QComboBox, QMainWindow, QHBoxLayout,
+    QCheckBox, QListWidget, QListWidgetItem, QStackedWidget
 )
-from PyQt5.QtCore import Qt, QThreadPool, QRunnable, pyqtSignal, QObject
-from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt, QThreadPool, QRunnable, pyqtSignal, QObject, QTimer, QEvent
+from PyQt5.QtGui import QFont, QImage, QPixmap
 from matplotlib.backends.backend_qt5agg import (
     FigureCanvasQTAgg as FigureCanvas,
     NavigationToolbar2QT as NavigationToolbar
 )
 
 # Import everything needed for the simulation
+import numpy as np
 import matplotlib.pyplot as plt
 from src.RocketSimulation import RocketSimulation
 from src.Rocket import Rocket
-from src.analysis import analyze_convergence
-from inc.thrust_profiles import linear_thrust, quarter_thrust, V2_thrust_profile, hellfire_thrust_profile, patriot_thrust_profile, falcon1_thrust_profile
-
-# Map thrust profile names to their functions
-THRUST_PROFILES = {
-    "linear": linear_thrust,
-    "quarter": quarter_thrust,
-    "v2": V2_thrust_profile,
-    "hellfire": hellfire_thrust_profile,
-    "patriot": patriot_thrust_profile
-}
-
-# Function to load presets from JSON
-def load_presets(json_file):
-    with open(json_file, "r") as f:
-        presets = json.load(f)
-    return presets
+from src.analysis import analyze_convergence, select_dt
+from src.batch import load_presets, params_key, SIM_DEFAULTS
+from src.checkpoint import params_from_simulation
+from src.SharedResultPool import SharedResultPool
+from inc.thrust_profiles import linear_thrust, quarter_thrust, V2_thrust_profile, hellfire_thrust_profile, patriot_thrust_profile, falcon1_thrust_profile, THRUST_PROFILES, resolve_thrust_profile
+from src.ThrustCurve import available_thrust_curves, find_thrust_curve
+from src.DragTable import load_drag_table
+from src.rendering import draw_trajectory, draw_error_analysis, draw_comparison, rasterize
 
 # Worker signals
 class WorkerSignals(QObject):
     finished = pyqtSignal()  
+    # (preview generation, finished simulation)
+    preview_ready = pyqtSignal(int, object)
+    # select_dt result dict, or the exception it raised
+    auto_dt_ready = pyqtSignal(object)
+    # (comparison cache key, label, finished Future of a SharedResult)
+    comparison_ready = pyqtSignal(str, str, object)
+    # (plot generation, RGBA image array)
+    render_ready = pyqtSignal(int, object)
+    # (dt values, altitude errors, velocity errors, RGBA image array), or the exception raised
+    analysis_ready = pyqtSignal(object)
 
 # Simulation worker
 class SimulationWorker(QRunnable):
@@ -72,21 +78,204 @@ class SimulationWorker(QRunnable):
         self.sim.run()
         self.signals.finished.emit()
 
-# Error Analysis worker
+# Live preview worker: runs the same inputs from coarse to fine dt
+class PreviewWorker(QRunnable):
+    def __init__(self, sims, generation):
+        super().__init__()
+        self.sims = sims
+        self.generation = generation
+        self.cancelled = False
+        self.signals = WorkerSignals()
+
+    def cancel(self):
+        self.cancelled = True
+        for sim in self.sims:
+            sim.cancel()
+
+    def run(self):
+        for sim in self.sims:
+            if self.cancelled:
+                return
+            sim.run()
+            if sim.stop_reason == "cancelled":
+                return
+            self.signals.preview_ready.emit(self.generation, sim)
+
+# Automatic time step worker: pilot runs to find the largest dt meeting a tolerance
+class AutoDtWorker(QRunnable):
+    def __init__(self, make_sim, tolerance):
+        super().__init__()
+        self.make_sim = make_sim
+        self.tolerance = tolerance
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            result = select_dt(self.make_sim, self.tolerance)
+        except Exception as e:
+            result = e
+        self.signals.auto_dt_ready.emit(result)
+
+# Function to pick the step sizes of a live preview, coarse to fine
+#   - starts with about coarse_steps steps and refines by `factor` down to dt
+def preview_dt_levels(dt, T, coarse_steps=2000, factor=4):
+    levels = [dt]
+    while T / levels[-1] > coarse_steps * factor:
+        levels.append(levels[-1] * factor)
+    return levels[::-1]
+
+# Function to downsample a curve for plotting, keeping the min and max of every bucket
+#   so peaks (apogee, max velocity) survive
+def downsample(times, values, max_points=2000):
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    buckets = max_points // 2
+    if len(times) <= max_points:
+        return times.copy(), values.copy()
+    edges = np.linspace(0, len(times), buckets + 1).astype(int)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        chunk = values[start:end]
+        low, high = start + np.argmin(chunk), start + np.argmax(chunk)
+        keep.extend(sorted((low, high)))
+    keep = np.unique(np.array(keep + [len(times) - 1]))
+    return times[keep], values[keep]
+
+# Render worker: rasterizes a plot with Agg off the GUI thread
+class RenderWorker(QRunnable):
+    def __init__(self, draw, args, width, height, dpi, generation):
+        super().__init__()
+        self.draw = draw
+        self.args = args
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.generation = generation
+        self.signals = WorkerSignals()
+
+    def run(self):
+        image = rasterize(self.draw, self.width, self.height, self.dpi, *self.args)
+        self.signals.render_ready.emit(self.generation, image)
+
+# Error Analysis worker: runs the convergence analysis and rasterizes its plots
 class ErrorAnalysisWorker(QRunnable):
-    def __init__(self, sim):
+    def __init__(self, sim, dt_values, width, height, dpi):
         super().__init__()
         self.sim = sim
-        #self.dt_values = dt_values
+        self.dt_values = dt_values
+        self.width = width
+        self.height = height
+        self.dpi = dpi
         self.signals = WorkerSignals()
-        #self.callback = callback
 
     def run(self):
-        #E_h_array, E_v_array = analyze_convergence(self.sim.rocket, self.sim, self.dt_values)
-        #self.callback(E_h_array, E_v_array)
-        #error_window = ErrorAnalysisWindow(self.sim, self.dt_values)
-        #error_window.show()
-        self.signals.finished.emit()
+        try:
+            E_h_array, E_v_array = analyze_convergence(self.sim.rocket, self.sim, self.dt_values)
+            image = rasterize(draw_error_analysis, self.width, self.height, self.dpi,
+                              self.dt_values, E_h_array, E_v_array)
+            result = (self.dt_values, E_h_array, E_v_array, image)
+        except Exception as e:
+            result = e
+        self.signals.analysis_ready.emit(result)
+
+# Plot area that shows plots rasterized by background workers and switches to an
+#   interactive matplotlib canvas when the user clicks or scrolls on it
+class PlotView(QWidget):
+    def __init__(self, thread_pool, figsize):
+        super().__init__()
+        self.thread_pool = thread_pool
+        self.draw = None
+        self.args = ()
+        self.generation = 0
+        self.interactive = False
+
+        # Interactive canvas, drawn only on demand
+        self.figure = plt.figure(figsize=figsize)
+        self.canvas = FigureCanvas(self.figure)
+        self.toolbar = NavigationToolbar(self.canvas, self)
+        self.toolbar.setVisible(False)
+
+        # Rasterized plot
+        self.image_label = QLabel("")
+        self.image_label.setAlignment(Qt.AlignCenter)
+        self.image_label.setMinimumSize(1, 1)
+        self.image_label.setStyleSheet("background-color: white;")
+        self.image_label.setToolTip("Click or scroll to zoom and pan")
+        self.image_label.installEventFilter(self)
+
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.image_label)
+        self.stack.addWidget(self.canvas)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.toolbar)
+        layout.addWidget(self.stack)
+
+        # Re-rasterize once resizing has settled
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(150)
+        self.resize_timer.timeout.connect(self.render)
+
+    # Function to show a new plot: rasterized in the background, drawn interactively on demand
+    def set_plot(self, draw, *args):
+        self.draw = draw
+        self.args = args
+        self.interactive = False
+        self.toolbar.setVisible(False)
+        self.stack.setCurrentWidget(self.image_label)
+        self.render()
+
+    # Function to show an image that was already rasterized (e.g. by ErrorAnalysisWorker)
+    def set_image(self, image, draw, *args):
+        self.draw = draw
+        self.args = args
+        self.generation += 1
+        self.show_image(image)
+
+    def render(self):
+        if self.draw is None or self.interactive:
+            return
+        # Results of older renders (previous plots or sizes) are ignored
+        self.generation += 1
+        ratio = self.devicePixelRatioF()
+        size = self.stack.size()
+        worker = RenderWorker(self.draw, self.args, int(size.width() * ratio), int(size.height() * ratio),
+                              self.logicalDpiX() * ratio, self.generation)
+        worker.signals.render_ready.connect(self.on_render_ready)
+        self.thread_pool.start(worker)
+
+    def on_render_ready(self, generation, image):
+        if generation == self.generation and not self.interactive:
+            self.show_image(image)
+
+    def show_image(self, image):
+        height, width = image.shape[:2]
+        pixmap = QPixmap.fromImage(QImage(image.data, width, height, 4 * width, QImage.Format_RGBA8888))
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        self.image_label.setPixmap(pixmap)
+
+    # Function to switch to the interactive (vector) canvas
+    def show_interactive(self):
+        if self.draw is None:
+            return
+        self.interactive = True
+        self.draw(self.figure, *self.args)
+        self.canvas.draw()
+        self.stack.setCurrentWidget(self.canvas)
+        self.toolbar.setVisible(True)
+
+    def eventFilter(self, obj, event):
+        if obj is self.image_label and event.type() in (QEvent.MouseButtonPress, QEvent.Wheel):
+            self.show_interactive()
+            return True
+        return super().eventFilter(obj, event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if not self.interactive:
+            self.resize_timer.start()
 
 # Window for errors to display upon unexpected user actions
 class ErrorWindow(QMainWindow):
@@ -112,9 +301,9 @@ class ErrorWindow(QMainWindow):
         self.layout.addWidget(self.ok_button, alignment=Qt.AlignCenter)
         
 
-# Error Analysis Window
+# Error Analysis Window: shows the plots the ErrorAnalysisWorker rasterized
 class ErrorAnalysisWindow(QMainWindow):
-    def __init__(self, sim, dt_values):
+    def __init__(self, thread_pool, dt_values, E_h_array, E_v_array, image):
         super().__init__()
         self.setWindowTitle("Error Analysis")
         self.setGeometry(200, 200, 800, 1200)
@@ -124,38 +313,136 @@ class ErrorAnalysisWindow(QMainWindow):
         self.setCentralWidget(self.central_widget)
         self.layout = QVBoxLayout(self.central_widget)
 
-        # Matplotlib figure for error analysis
-        self.figure = plt.figure(figsize=(10, 6))
-        self.canvas = FigureCanvas(self.figure)
-        self.toolbar = NavigationToolbar(self.canvas, self)
-
-        self.layout.addWidget(self.toolbar)
-        self.layout.addWidget(self.canvas)
+        # Rasterized error plots, interactive on click or scroll
+        self.plot_view = PlotView(thread_pool, figsize=(10, 6))
+        self.layout.addWidget(self.plot_view)
+        self.plot_view.set_image(image, draw_error_analysis, dt_values, E_h_array, E_v_array)
 
-        # Perform error analysis
-        E_h_array, E_v_array = analyze_convergence(sim.rocket, sim, dt_values)
-
-        # Plot error analysis
-        self.figure.clear()
-
-        # Altitude Error Plot
-        ax1 = self.figure.add_subplot(2, 1, 1)
-        ax1.loglog(dt_values, E_h_array, marker='o', label="Altitude Error")
-        ax1.set_xlabel("Time Step Size (s)")
-        ax1.set_ylabel("Error")
-        ax1.grid(which="both")
-        ax1.legend()
-
-        # Velocity Error Plot
-        ax2 = self.figure.add_subplot(2, 1, 2)
-        ax2.loglog(dt_values, E_v_array, marker='o', label="Velocity Error")
-        ax2.set_xlabel("Time Step Size (s)")
-        ax2.set_ylabel("Error")
-        ax2.grid(which="both")
-        ax2.legend()
+# Comparison window: overlays several presets / parameter variants run concurrently
+class ComparisonWindow(QMainWindow):
+    def __init__(self, gui):
+        super().__init__()
+        self.gui = gui
+        self.setWindowTitle("Compare Runs")
+        self.setGeometry(250, 150, 1200, 900)
+        self.signals = WorkerSignals()
+        self.signals.comparison_ready.connect(self.on_run_finished)
+        # Keys of the runs shown in the current comparison, in plot order
+        self.shown = []
+        self.labels = {}
+        self.variant_count = 0
 
-        # Refresh canvas
-        self.canvas.draw()
+        # Main layout
+        self.central_widget = QWidget()
+        self.setCentralWidget(self.central_widget)
+        self.layout = QHBoxLayout(self.central_widget)
+
+        # Left: runs to compare
+        self.controls = QVBoxLayout()
+        self.run_list = QListWidget()
+        for name in gui.presets:
+            item = QListWidgetItem(name)
+            item.setData(Qt.UserRole, {"preset": name})
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked)
+            self.run_list.addItem(item)
+        self.controls.addWidget(QLabel("Presets and variants:"))
+        self.controls.addWidget(self.run_list)
+
+        self.add_variant_button = QPushButton("Add Current Inputs")
+        self.add_variant_button.clicked.connect(self.add_variant)
+        self.controls.addWidget(self.add_variant_button)
+
+        self.compare_button = QPushButton("Run Comparison")
+        self.compare_button.clicked.connect(self.run_comparison)
+        self.controls.addWidget(self.compare_button)
+
+        self.status_label = QLabel("")
+        self.controls.addWidget(self.status_label)
+        self.layout.addLayout(self.controls, 1)
+
+        # Right: overlaid curves, rasterized in the background and interactive on demand
+        self.plot_view = PlotView(gui.thread_pool, figsize=(10, 8))
+        self.layout.addWidget(self.plot_view, 3)
+
+    # Add the main window's current inputs as a variant
+    def add_variant(self):
+        try:
+            params = params_from_simulation(self.gui.build_simulation(verbose=False))
+        except ValueError as e:
+            self.gui.show_error_window(f"Invalid input: {str(e)}")
+            return
+        self.variant_count += 1
+        item = QListWidgetItem(f"Variant {self.variant_count} (m={params['m']:g}, thrust={params['thrust']:g})")
+        item.setData(Qt.UserRole, params)
+        item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+        item.setCheckState(Qt.Checked)
+        self.run_list.addItem(item)
+
+    # Run every checked entry that is not cached yet; cached ones are drawn right away
+    def run_comparison(self):
+        dt, T = self.gui.comparison_time_settings()
+        self.shown = []
+        labels = {}
+        for row in range(self.run_list.count()):
+            item = self.run_list.item(row)
+            if item.checkState() != Qt.Checked:
+                continue
+            params = dict(item.data(Qt.UserRole))
+            params.update(dt=dt, T=T)
+            key = params_key(params)
+            self.shown.append(key)
+            labels[key] = item.text()
+            if key in self.gui.comparison_cache or key in self.gui.comparison_pending:
+                continue
+            try:
+                future = self.gui.comparison_pool().submit(params)
+            except Exception as e:
+                self.gui.show_error_window(f"Could not start {item.text()}: {str(e)}")
+                continue
+            self.gui.comparison_pending.add(key)
+            future.add_done_callback(lambda future, key=key, label=item.text():
+                                     self.signals.comparison_ready.emit(key, label, future))
+        self.labels = labels
+        self.plot_runs()
+
+    # Copy a finished run into the cache (downsampled) and free its shared memory
+    def on_run_finished(self, key, label, future):
+        self.gui.comparison_pending.discard(key)
+        try:
+            result = future.result()
+        except Exception as e:
+            self.gui.comparison_cache[key] = {"label": label, "error": str(e)}
+        else:
+            with result:
+                self.gui.comparison_cache[key] = {
+                    "label": label,
+                    "summary": dict(result.summary),
+                    "altitude": downsample(result.times, result.altitudes),
+                    "velocity": downsample(result.times, result.velocities)
+                }
+        self.plot_runs()
+
+    def plot_runs(self):
+        runs = []
+        finished = 0
+        for key in self.shown:
+            run = self.gui.comparison_cache.get(key)
+            if run is None:
+                continue
+            finished += 1
+            if "error" in run:
+                continue
+            runs.append((self.labels.get(key, run["label"]), run["summary"]["apogee"],
+                         run["altitude"], run["velocity"]))
+        self.plot_view.set_plot(draw_comparison, runs)
+
+        failed = [self.gui.comparison_cache[key]["label"] for key in self.shown
+                  if "error" in self.gui.comparison_cache.get(key, {})]
+        status = f"{finished}/{len(self.shown)} runs finished"
+        if failed:
+            status += f" ({len(failed)} failed: {', '.join(failed)})"
+        self.status_label.setText(status)
 
 # Main GUI
 class RocketSimulatorGUI(QMainWindow):
@@ -192,13 +479,16 @@ class RocketSimulatorGUI(QMainWindow):
 
         # Thrust profile dropdown
         self.thrust_profile_dropdown = QComboBox()
-        self.thrust_profile_dropdown.addItems(["Linear Decrease", 
+        self.thrust_profile_dropdown.addItems(["Preset Profile",
+                                                "Linear Decrease", 
                                                 "Decrease by 1/4", 
                                                 "V2 Thrust Profile",
                                                 "Hellfire Thrust Profile",
                                                 "Patriot Thrust Profile",
                                                 #"Falcon 1 Thrust Profile",
                                             ])
+        # Measured engine curves from inc/engines
+        self.thrust_profile_dropdown.addItems([f"Engine: {name}" for name in available_thrust_curves()])
         self.form_layout.addRow("Thrust Profile (Override):", self.thrust_profile_dropdown)
 
         # Rocket parameters
@@ -222,18 +512,58 @@ class RocketSimulatorGUI(QMainWindow):
         self.form_layout.addRow("Burn Time (s):", self.burn_time_input)
         self.form_layout.addRow("Fuel Mass (kg):", self.fuel_mass_input)
         self.form_layout.addRow("Drag Coefficient:", self.drag_coefficient_input)
+        # Presets with a C_D(Mach) table use it instead of the constant drag coefficient
+        self.mach_drag_checkbox = QCheckBox("Mach-dependent C_D (preset table)")
+        self.mach_drag_checkbox.setEnabled(False)
+        self.form_layout.addWidget(self.mach_drag_checkbox)
         self.form_layout.addRow("Cross-Section Area (m²):", self.cross_section_input)
         self.form_layout.addRow("Initial Altitude (m):", self.altitude_input)
         self.form_layout.addRow("Initial Velocity (m/s):", self.velocity_input)
         #self.form_layout.addRow("Launch Angle (°):", self.angle_input)
         self.form_layout.addRow("Time Step (s):", self.time_step_input)
+        # Automatic time step from an apogee tolerance
+        self.apogee_tolerance_input = QLineEdit("1.0")
+        self.form_layout.addRow("Apogee Tolerance (m):", self.apogee_tolerance_input)
+        self.auto_dt_button = QPushButton("Auto Time Step")
+        self.auto_dt_button.clicked.connect(self.auto_time_step)
+        self.form_layout.addWidget(self.auto_dt_button)
         self.form_layout.addRow("Simulation Duration (s):", self.sim_duration_input)
 
+        # Live preview: rerun coarse-to-fine on every edit
+        self.live_preview_checkbox = QCheckBox("Live Preview")
+        self.live_preview_checkbox.toggled.connect(self.schedule_preview)
+        self.form_layout.addWidget(self.live_preview_checkbox)
+
+        # Wait for typing to pause before starting a preview
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(300)
+        self.preview_timer.timeout.connect(self.start_preview)
+        self.preview_worker = None
+        self.preview_generation = 0
+
+        for field in (self.mass_input, self.thrust_input, self.burn_time_input, self.fuel_mass_input,
+                      self.drag_coefficient_input, self.cross_section_input, self.altitude_input,
+                      self.velocity_input, self.time_step_input, self.sim_duration_input):
+            field.textChanged.connect(self.schedule_preview)
+        self.thrust_profile_dropdown.currentTextChanged.connect(self.schedule_preview)
+        self.mach_drag_checkbox.toggled.connect(self.schedule_preview)
+
         # Run button
         self.run_button = QPushButton("Run Simulation")
         self.run_button.clicked.connect(self.run_simulation)
         self.form_layout.addWidget(self.run_button)
 
+        # Comparison mode: several presets / variants overlaid
+        self.compare_button = QPushButton("Compare Runs")
+        self.compare_button.clicked.connect(self.show_comparison)
+        self.form_layout.addWidget(self.compare_button)
+        # Process pool (created on first use) and finished runs kept for reuse, by params_key
+        self.shared_pool = None
+        self.comparison_cache = {}
+        self.comparison_pending = set()
+        self.comparison_window = None
+
         # Error analysis button
         self.error_button = QPushButton("Show Error Analysis")
         self.error_button.clicked.connect(self.show_error_analysis)
@@ -249,19 +579,44 @@ class RocketSimulatorGUI(QMainWindow):
         # Right layout: Graphs
         self.graph_layout = QVBoxLayout()
 
-        # Matplotlib canvas
-        self.figure = plt.figure(figsize=(12, 8))
-        self.canvas = FigureCanvas(self.figure)
-        self.toolbar = NavigationToolbar(self.canvas, self)
-
-        self.graph_layout.addWidget(self.toolbar)
-        self.graph_layout.addWidget(self.canvas)
+        # Plots are rasterized in the background; clicking or scrolling makes them interactive
+        self.plot_view = PlotView(self.thread_pool, figsize=(12, 8))
+        self.graph_layout.addWidget(self.plot_view)
 
         # Add the graph layout to the main layout
         self.main_layout.addLayout(self.graph_layout, 4)
 
         self.sim = None
 
+    def show_comparison(self):
+        if self.comparison_window is None:
+            self.comparison_window = ComparisonWindow(self)
+        self.comparison_window.show()
+        self.comparison_window.raise_()
+
+    # Shared memory process pool for comparison runs, started on first use
+    def comparison_pool(self):
+        if self.shared_pool is None:
+            self.shared_pool = SharedResultPool()
+        return self.shared_pool
+
+    # Time step and duration for comparison runs: the form's values when valid
+    def comparison_time_settings(self):
+        try:
+            dt = float(self.time_step_input.text())
+            T = float(self.sim_duration_input.text())
+            if dt > 0 and T > 0:
+                return dt, T
+        except ValueError:
+            pass
+        return SIM_DEFAULTS["dt"], SIM_DEFAULTS["T"]
+
+    def closeEvent(self, event):
+        if self.shared_pool is not None:
+            self.shared_pool.close()
+            self.shared_pool = None
+        super().closeEvent(event)
+
     # method to show error window
     def show_error_window(self, message):
         self.error_window = ErrorWindow(message)
@@ -276,6 +631,9 @@ class RocketSimulatorGUI(QMainWindow):
             self.fuel_mass_input.setText(str(preset["fuel_mass"]))
             self.drag_coefficient_input.setText(str(preset["C_D"]))
             self.cross_section_input.setText(str(preset["A"]))
+            has_table = preset.get("C_D_mach") is not None
+            self.mach_drag_checkbox.setEnabled(has_table)
+            self.mach_drag_checkbox.setChecked(has_table)
         else:
             # Clear inputs if no preset is selected
             self.mass_input.clear()
@@ -284,53 +642,86 @@ class RocketSimulatorGUI(QMainWindow):
             self.fuel_mass_input.clear()
             self.drag_coefficient_input.clear()
             self.cross_section_input.clear()
+            self.mach_drag_checkbox.setChecked(False)
+            self.mach_drag_checkbox.setEnabled(False)
+
+    # Function to build a simulation from the form inputs (raises ValueError on bad input)
+    def build_simulation(self, dt=None, verbose=True):
+        if dt is None:
+            dt = float(self.time_step_input.text())
+        return self.simulation_factory(verbose)(dt)
+
+    # Function to read the form once and return make_sim(dt), which builds a fresh
+    #   simulation per call (safe to use from worker threads)
+    def simulation_factory(self, verbose=True):
+        # Gather inputs
+        m = float(self.mass_input.text())
+        thrust = float(self.thrust_input.text())
+        burn_time = float(self.burn_time_input.text())
+        fuel_mass = float(self.fuel_mass_input.text())
+        C_D = float(self.drag_coefficient_input.text())
+        A = float(self.cross_section_input.text())
+        h_0 = float(self.altitude_input.text())
+        v_0 = float(self.velocity_input.text())
+        #theta = float(self.angle_input.text())
+        T = float(self.sim_duration_input.text())
+
+        # Determine thrust profile: override or preset
+        thrust_profile_option = self.thrust_profile_dropdown.currentText()
+        if thrust_profile_option == "Linear Decrease":
+            thrust_profile = linear_thrust
+        elif thrust_profile_option == "Decrease by 1/4":
+            thrust_profile = quarter_thrust
+        elif thrust_profile_option == "V2 Thrust Profile":
+            thrust_profile = V2_thrust_profile
+        elif thrust_profile_option == "Hellfire Thrust Profile":
+            thrust_profile = hellfire_thrust_profile
+        elif thrust_profile_option == "Patriot Thrust Profile":
+            thrust_profile = patriot_thrust_profile
+        elif thrust_profile_option == "Falcon 1 Thrust Profile":
+            thrust_profile = falcon1_thrust_profile
+        elif thrust_profile_option.startswith("Engine: "):
+            thrust_profile = find_thrust_curve(thrust_profile_option[len("Engine: "):])
+        else:
+            # Default to preset thrust profile if no override
+            thrust_profile = resolve_thrust_profile(self.presets.get(self.preset_dropdown.currentText(), {}).get("thrust_profile", "linear"))
+
+        drag_table = None
+        if self.mach_drag_checkbox.isEnabled() and self.mach_drag_checkbox.isChecked():
+            drag_table = load_drag_table(self.presets[self.preset_dropdown.currentText()]["C_D_mach"])
+
+        # Create Rocket and Simulation objects
+        def make_sim(dt):
+            rocket = Rocket(m, thrust, burn_time, fuel_mass, C_D, A, thrust_profile=thrust_profile,
+                            drag_table=drag_table)
+            return RocketSimulation(rocket, h_0, v_0, 90.0, 288.15, 101325, dt, T, verbose=verbose)
+        return make_sim
+
+    # Function to stop stale background runs (previews and older full runs)
+    def cancel_running(self):
+        if self.preview_worker is not None:
+            self.preview_worker.cancel()
+            self.preview_worker = None
+        # Results of older generations are ignored even if they still arrive
+        self.preview_generation += 1
+        if self.sim is not None:
+            self.sim.cancel()
+        self.loading_label.setVisible(False)
 
     def run_simulation(self):
         try:
-            # Gather inputs
-            m = float(self.mass_input.text())
-            thrust = float(self.thrust_input.text())
-            burn_time = float(self.burn_time_input.text())
-            fuel_mass = float(self.fuel_mass_input.text())
-            C_D = float(self.drag_coefficient_input.text())
-            A = float(self.cross_section_input.text())
-            h_0 = float(self.altitude_input.text())
-            v_0 = float(self.velocity_input.text())
-            #theta = float(self.angle_input.text())
-            dt = float(self.time_step_input.text())
-            T = float(self.sim_duration_input.text())
+            sim = self.build_simulation()
 
-            # Determine thrust profile: override or preset
-            thrust_profile_option = self.thrust_profile_dropdown.currentText()
-            if thrust_profile_option == "Linear Decrease":
-                thrust_profile = linear_thrust
-            elif thrust_profile_option == "Decrease by 1/4":
-                thrust_profile = quarter_thrust
-            elif thrust_profile_option == "V2 Thrust Profile":
-                thrust_profile = V2_thrust_profile
-            elif thrust_profile_option == "Hellfire Thrust Profile":
-                thrust_profile = hellfire_thrust_profile
-            elif thrust_profile_option == "Patriot Thrust Profile":
-                thrust_profile = patriot_thrust_profile
-            elif thrust_profile_option == "Falcon 1 Thrust Profile":
-                thrust_profile = falcon1_thrust_profile
-            else:
-                # Default to preset thrust profile if no override
-                thrust_profile = self.presets.get(self.preset_dropdown.currentText(), {}).get("thrust_profile", linear_thrust)
-
-            # Create Rocket and Simulation objects
-            rocket = Rocket(m, thrust, burn_time, fuel_mass, C_D, A, thrust_profile=thrust_profile)
-            self.sim = RocketSimulation(rocket, h_0, v_0, 90.0, 288.15, 101325, dt, T)
-
-            # Run the simulation
-            #self.sim.run()
+            # Stop older runs so they do not compete with this one
+            self.cancel_running()
+            self.sim = sim
 
             # Show loading indicator
             self.loading_label.setVisible(True)
 
             # Run simulation in the background
-            worker = SimulationWorker(self.sim)
-            worker.signals.finished.connect(self.on_simulation_finished)
+            worker = SimulationWorker(sim)
+            worker.signals.finished.connect(lambda sim=sim: self.on_simulation_finished(sim))
             self.thread_pool.start(worker)
 
             # Enable error analysis button
@@ -340,53 +731,111 @@ class RocketSimulatorGUI(QMainWindow):
         except Exception as e:
             self.show_error_window(f"An unexpected error occurred: {str(e)}")
 
+    # Pick the time step from the apogee tolerance in the background
+    def auto_time_step(self):
+        try:
+            tolerance = float(self.apogee_tolerance_input.text())
+            if tolerance <= 0:
+                raise ValueError("the apogee tolerance must be positive")
+            make_sim = self.simulation_factory(verbose=False)
+        except ValueError as e:
+            self.show_error_window(f"Invalid input: {str(e)}")
+            return
+
+        self.auto_dt_button.setEnabled(False)
+        self.loading_label.setVisible(True)
+        worker = AutoDtWorker(make_sim, tolerance)
+        worker.signals.auto_dt_ready.connect(self.on_auto_dt_ready)
+        self.thread_pool.start(worker)
+
+    def on_auto_dt_ready(self, result):
+        self.auto_dt_button.setEnabled(True)
+        self.loading_label.setVisible(False)
+        if isinstance(result, Exception):
+            self.show_error_window(f"Automatic time step failed: {str(result)}")
+            return
+
+        self.time_step_input.setText(f"{result['dt']:g}")
+        self.time_step_input.setToolTip(f"Estimated apogee error {result['estimated_error']:.3g} m "
+                                        f"(observed order {result['order']:.2f})")
+        if result["verified"] is False:
+            self.show_error_window(f"The apogee tolerance could not be met; using the smallest "
+                                   f"step tried (dt = {result['dt']:g} s, estimated error "
+                                   f"{result['estimated_error']:.3g} m).")
+
+    # Restart the debounce timer after every edit
+    def schedule_preview(self, *args):
+        if self.live_preview_checkbox.isChecked():
+            self.preview_timer.start()
+
+    # Start a coarse-to-fine preview of the current inputs
+    def start_preview(self):
+        try:
+            dt = float(self.time_step_input.text())
+            T = float(self.sim_duration_input.text())
+            sims = [self.build_simulation(level, verbose=False) for level in preview_dt_levels(dt, T)]
+        except Exception:
+            # Incomplete input while typing: wait for the next edit
+            return
+
+        self.cancel_running()
+        self.preview_worker = PreviewWorker(sims, self.preview_generation)
+        self.preview_worker.signals.preview_ready.connect(self.on_preview_ready)
+        self.thread_pool.start(self.preview_worker)
+
+    def on_preview_ready(self, generation, sim):
+        # Ignore levels from previews that have been superseded
+        if generation != self.preview_generation:
+            return
+        self.plot_simulation(sim, f"Preview (dt = {sim.dt:g} s)")
+        if sim is self.preview_worker.sims[-1]:
+            # The finest level is a full-resolution run
+            self.sim = sim
+            self.error_button.setEnabled(True)
+            self.preview_worker = None
+
+    def on_simulation_finished(self, sim=None):
+        # Results of runs that were replaced or cancelled are dropped
+        if sim is not self.sim or sim.stop_reason == "cancelled":
+            return
 
-    def on_simulation_finished(self):
         # Hide loading indicator and enable error analysis button
         self.loading_label.setVisible(False)
         self.error_button.setEnabled(True)
 
         # Plot simulation results
-        self.figure.clear()
-        ax1 = self.figure.add_subplot(2, 1, 1)
-        ax1.plot(self.sim.times, self.sim.altitudes, label="Altitude (m)", color="b")
-        ax1.set_xlabel("Time (s)")
-        ax1.set_ylabel("Altitude (m)")
-        ax1.grid()
-
-        ax2 = self.figure.add_subplot(2, 1, 2)
-        ax2.plot(self.sim.times, self.sim.velocities, label="Velocity (m/s)", color="r")
-        ax2.set_xlabel("Time (s)")
-        ax2.set_ylabel("Velocity (m/s)")
-        ax2.grid()
+        self.plot_simulation(sim)
 
-        self.canvas.draw()
+    # Function to plot altitude and velocity of a finished simulation
+    #   - rendering happens on a worker thread, the GUI only shows the finished image
+    def plot_simulation(self, sim, title=None):
+        self.plot_view.set_plot(draw_trajectory, sim.times, sim.altitudes, sim.velocities, title)
 
     def show_error_analysis(self):
         if self.sim:
             try:
-                #dt_values = [0.001, 0.01, 0.05, 0.1, 0.2]
+                dt_values = [0.001, 0.01, 0.05, 0.1, 0.2]
                 # Show loading indicator
                 self.loading_label.setVisible(True)
 
-                
-                # Create and start the worker
-                #worker = ErrorAnalysisWorker(self.sim, dt_values)
-                worker = ErrorAnalysisWorker(self.sim)
-                worker.signals.finished.connect(self.on_error_analysis_finished)
+                # Analysis and rendering both run in the worker, at the error window's size
+                ratio = self.devicePixelRatioF()
+                worker = ErrorAnalysisWorker(self.sim, dt_values, int(780 * ratio), int(1180 * ratio),
+                                             self.logicalDpiX() * ratio)
+                worker.signals.analysis_ready.connect(self.on_error_analysis_finished)
                 self.thread_pool.start(worker)
             except Exception as e:
                 self.show_error_window(f"An unexpected error occurred: {str(e)}")
 
-
-    def on_error_analysis_finished(self):
-
-        dt_values = [0.001, 0.01, 0.05, 0.1, 0.2]
+    def on_error_analysis_finished(self, result):
         # Hide loading indicator
         self.loading_label.setVisible(False)
+        if isinstance(result, Exception):
+            self.show_error_window(f"Error analysis failed: {str(result)}")
+            return
 
-        # Open error analysis window and plot results (code omitted for brevity)
-        self.error_window = ErrorAnalysisWindow(self.sim, dt_values)
+        # Open error analysis window with the rasterized plots
+        self.error_window = ErrorAnalysisWindow(self.thread_pool, *result)
         self.error_window.show()
 
 
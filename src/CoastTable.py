@@ -0,0 +1,379 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from src.batch import resolve_params, run_params, run_pool, simulation_from_params
+
+COAST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "inc", "coast")
+
+# Same constants as RocketSimulation
+AIR_GAS_CONST = 287.05
+TEMP_LAPSE_RATE = -0.0065
+G = 9.8067
+
+# Loaded tables keyed by their file name
+_table_cache = {}
+
+
+# Air density of the simulation's atmosphere, vectorized (0 where air_density clamps it)
+def _air_density(h, temp: float, pressure: float):
+    cur_temp = temp + TEMP_LAPSE_RATE * h
+    exp = -G / (AIR_GAS_CONST * TEMP_LAPSE_RATE)
+    safe_temp = np.where(cur_temp > 0, cur_temp, temp)
+    rho = pressure * (safe_temp / temp) ** exp / (AIR_GAS_CONST * safe_temp)
+    return np.where(cur_temp > 0, rho, 0.0)
+
+
+# Function to integrate many unpowered coasts to apogee at once
+#   - a = -G - rho(h) v^2 / (2 beta), beta = dry mass / (C_D A) (kg/m^2)
+#   - every coast gets its own step: its climb time (vacuum, or the drag time scale
+#     sqrt(2 beta / (rho G)) when shorter) / steps, and never more than a quarter of
+#     the initial drag deceleration time, so strongly braked coasts stay stable
+#   - the apogee inside the last step comes from the quadratic through v and dv/dt,
+#     integrated once for h
+def coast_apogee(h_b, v_b, beta, temp: float = 288.15, pressure: float = 101325.0, steps: int = 400):
+    h, v, beta = (np.array(x, dtype=np.float64) for x in np.broadcast_arrays(h_b, v_b, beta))
+    shape = h.shape
+    h, v, beta = h.ravel(), v.ravel(), beta.ravel()
+    apogee = h.copy()
+    active = np.flatnonzero(v > 0)
+
+    rho = _air_density(h, temp, pressure)
+    with np.errstate(divide="ignore"):
+        climb = np.minimum(v / G, np.sqrt(2 * beta / (rho * G)))
+        braking = 2 * beta / (rho * v)
+    dt = np.where(v > 0, np.minimum(climb / steps, 0.25 * braking), 0.0)
+
+    def accel(h, v, beta):
+        return -G - 0.5 * _air_density(h, temp, pressure) * v * v / beta
+
+    while len(active):
+        h0, v0, b, d = h[active], v[active], beta[active], dt[active]
+        a1 = accel(h0, v0, b)
+        a2 = accel(h0 + 0.5 * d * v0, v0 + 0.5 * d * a1, b)
+        v2 = v0 + 0.5 * d * a1
+        a3 = accel(h0 + 0.5 * d * v2, v0 + 0.5 * d * a2, b)
+        v3 = v0 + 0.5 * d * a2
+        a4 = accel(h0 + d * v3, v0 + d * a3, b)
+        v4 = v0 + d * a3
+        h1 = h0 + (d / 6.) * (v0 + 2*v2 + 2*v3 + v4)
+        v1 = v0 + (d / 6.) * (a1 + 2*a2 + 2*a3 + a4)
+
+        crossed = v1 <= 0
+        if np.any(crossed):
+            # v(s) = v0 + a1 s + c s^2 through v1 at s = d; its first root is the apogee time
+            c = (v1 - v0 - a1 * d) / (d * d)
+            root = np.sqrt(np.maximum(a1 * a1 - 4 * c * v0, 0.0))
+            # Smaller root in the form without cancellation (a1 < 0)
+            tau = np.clip(2 * v0 / (root - a1), 0.0, d)
+            peak = h0 + v0 * tau + 0.5 * a1 * tau**2 + c * tau**3 / 3
+            apogee[active[crossed]] = peak[crossed]
+
+        h[active], v[active] = h1, v1
+        # NaN states (overflow) stop too and report nan
+        apogee[active[np.isnan(v1)]] = np.nan
+        active = active[~crossed & ~np.isnan(v1)]
+    return apogee.reshape(shape)
+
+
+class CoastTable:
+    '''
+        CoastTable Class (precomputed coast-phase apogee)
+        State Variables:
+            Sea Level Temperature and Pressure (the atmosphere) = temp (K), pressure (Pa)
+            Grid Axes = h_axis (m), v_axis (m/s), beta_axis (kg/m^2)
+            Log of the Apogee Gain above the Burnout Altitude on the Grid = log_gain
+            Interpolation Error of every Cell = cell_error (m)
+            RK4 Steps per Coast = steps
+
+        The grid is uniform in h, log(v) and log(beta), and log(gain) is
+            interpolated: in vacuum log(gain) = 2 log(v) - log(2G) is exactly linear
+            and drag bends it smoothly, so every lookup is an O(1) trilinear
+            interpolation. When the table is built, every cell is also integrated
+            at its center, the point farthest from the nodes; the largest center
+            error of a cell and its neighbours, times a safety factor, is reported
+            with every lookup. Burnout velocities below
+            v_min use the vacuum gain (error below v_min^2 / 2G). Points outside
+            the grid are integrated.
+
+        Functions:
+            build(self):
+                Integrates the coasts of every grid node and cell center
+
+            lookup(self, h_b, v_b, beta, fallback):
+                Returns the apogee and its interpolation error bound (arrays)
+
+            covers(self, h_b, v_b, beta):
+                Returns a mask of the points the table answers without integrating
+
+            check(self, n, seed):
+                Compares lookups with integration at random points inside the grid
+
+            save(self, path):
+                Writes the table to an .npz file
+
+            load(path):
+                Reads a table written by save
+    '''
+    # Constructor
+    def __init__(   self,
+                    temp: float = 288.15,
+                    pressure: float = 101325.0,
+                    h_max: float = 50000.0,
+                    v_range: tuple = (1.0, 3000.0),
+                    beta_range: tuple = (10.0, 1e5),
+                    shape: tuple = (41, 41, 25),
+                    steps: int = 400,
+                    safety: float = 2.0
+                ):
+        self.temp = float(temp)
+        self.pressure = float(pressure)
+        self.h_max = float(h_max)
+        self.v_range = (float(v_range[0]), float(v_range[1]))
+        self.beta_range = (float(beta_range[0]), float(beta_range[1]))
+        self.shape = tuple(int(n) for n in shape)
+        self.steps = int(steps)
+        self.safety = float(safety)
+        if min(self.shape) < 2 or not (0 < self.v_range[0] < self.v_range[1]) or \
+                not (0 < self.beta_range[0] < self.beta_range[1]):
+            raise ValueError("CoastTable needs at least 2 points per axis, 0 < v_min < v_max "
+                             "and 0 < beta_min < beta_max")
+
+        # Interpolation coordinates: h, log(v) and log(beta)
+        self.low = np.array([0.0, np.log(self.v_range[0]), np.log(self.beta_range[0])])
+        self.high = np.array([self.h_max, np.log(self.v_range[1]), np.log(self.beta_range[1])])
+        self.spacing = (self.high - self.low) / (np.array(self.shape) - 1)
+        self.h_axis = np.linspace(0.0, self.h_max, self.shape[0])
+        self.v_axis = np.exp(np.linspace(self.low[1], self.high[1], self.shape[1]))
+        self.beta_axis = np.exp(np.linspace(self.low[2], self.high[2], self.shape[2]))
+
+        self.log_gain = None
+        self.cell_error = None
+
+    def _coordinates(self, h_b, v_b, beta):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.stack(np.broadcast_arrays(np.asarray(h_b, dtype=np.float64),
+                                                np.log(np.asarray(v_b, dtype=np.float64)),
+                                                np.log(np.asarray(beta, dtype=np.float64))), axis=-1)
+
+    # Masks of the points on the grid and of the slow points (v < v_min) within its h and beta range
+    def _regions(self, x, v_b):
+        inside = np.all((x >= self.low) & (x <= self.high), axis=-1)
+        in_h_beta = np.all((x[..., 0::2] >= self.low[0::2]) & (x[..., 0::2] <= self.high[0::2]), axis=-1)
+        return inside, in_h_beta & (v_b < self.v_range[0])
+
+    # Function to tell which points the table answers (the others are integrated)
+    def covers(self, h_b, v_b, beta):
+        x = self._coordinates(h_b, v_b, beta)
+        inside, inside_slow = self._regions(x, np.broadcast_to(np.asarray(v_b, dtype=np.float64), x.shape[:-1]))
+        return inside | inside_slow
+
+    # Trilinear interpolation of log(gain) at grid coordinates x (..., 3), inside the grid
+    def _interpolate(self, x):
+        u = (x - self.low) / self.spacing
+        i = np.clip(u.astype(np.intp), 0, np.array(self.shape) - 2)
+        s = u - i
+        result = 0.0
+        for corner in range(8):
+            bits = [(corner >> axis) & 1 for axis in range(3)]
+            weight = np.prod([s[..., axis] if bit else 1 - s[..., axis] for axis, bit in enumerate(bits)], axis=0)
+            result = result + weight * self.log_gain[i[..., 0] + bits[0], i[..., 1] + bits[1], i[..., 2] + bits[2]]
+        return result, i
+
+    # Function to integrate every node and cell center of the grid
+    def build(self):
+        H, V, B = np.meshgrid(self.h_axis, self.v_axis, self.beta_axis, indexing="ij")
+        self.log_gain = np.log(coast_apogee(H, V, B, self.temp, self.pressure, self.steps) - H)
+
+        # Cell centers in interpolation coordinates
+        centers = [(axis[:-1] + axis[1:]) / 2 for axis in
+                   (self.h_axis, np.log(self.v_axis), np.log(self.beta_axis))]
+        Hc, LVc, LBc = np.meshgrid(*centers, indexing="ij")
+        exact = coast_apogee(Hc, np.exp(LVc), np.exp(LBc), self.temp, self.pressure, self.steps) - Hc
+        # Trilinear value at a cell center is the mean of its 8 corners
+        g = self.log_gain
+        corners = (g[:-1, :-1, :-1] + g[1:, :-1, :-1] + g[:-1, 1:, :-1] + g[:-1, :-1, 1:] +
+                   g[1:, 1:, :-1] + g[1:, :-1, 1:] + g[:-1, 1:, 1:] + g[1:, 1:, 1:]) / 8
+        center_error = np.abs(exact - np.exp(corners))
+        # The error can peak off-center where the gain bends sharply, so every cell
+        #   reports the largest center error of itself and its neighbours
+        padded = np.pad(center_error, 1, mode="edge")
+        n_h, n_v, n_b = center_error.shape
+        neighbourhood = np.max([padded[i:i + n_h, j:j + n_v, k:k + n_b]
+                                for i in range(3) for j in range(3) for k in range(3)], axis=0)
+        # Plus a micrometre for floating point noise
+        self.cell_error = self.safety * neighbourhood + 1e-6
+        return self
+
+    # Function to look up apogees
+    #   - returns (apogee, error): arrays shaped like the broadcast inputs
+    #   - points outside the grid are integrated (error 0) when fallback is True, nan otherwise
+    def lookup(self, h_b, v_b, beta, fallback: bool = True):
+        if self.log_gain is None:
+            raise ValueError("CoastTable has not been built")
+        x = self._coordinates(h_b, v_b, beta)
+        h = x[..., 0]
+        v_b, beta = (np.broadcast_to(np.asarray(a, dtype=np.float64), h.shape) for a in (v_b, beta))
+        inside, inside_slow = self._regions(x, v_b)
+
+        apogee = np.full(h.shape, np.nan)
+        error = np.full(h.shape, np.nan)
+        log_gain, i = self._interpolate(x[inside])
+        apogee[inside] = h[inside] + np.exp(log_gain)
+        error[inside] = self.cell_error[i[:, 0], i[:, 1], i[:, 2]]
+
+        # Barely moving: vacuum arc (v <= 0 is already at apogee)
+        vacuum_gain = np.maximum(v_b[inside_slow], 0.0)**2 / (2 * G)
+        apogee[inside_slow] = h[inside_slow] + vacuum_gain
+        error[inside_slow] = vacuum_gain
+
+        outside = ~(inside | inside_slow)
+        if fallback and np.any(outside):
+            apogee[outside] = coast_apogee(h[outside], v_b[outside], beta[outside],
+                                           self.temp, self.pressure, self.steps)
+            error[outside] = 0.0
+        return apogee, error
+
+    # Function to validate the reported errors at random points of the grid
+    #   - returns the largest actual error and the largest ratio of actual to reported error
+    def check(self, n: int = 2000, seed: int = 0):
+        unit = np.random.default_rng(seed).random((n, 3))
+        x = self.low + unit * (self.high - self.low)
+        h_b, v_b, beta = x[:, 0], np.exp(x[:, 1]), np.exp(x[:, 2])
+        apogee, error = self.lookup(h_b, v_b, beta)
+        actual = np.abs(apogee - coast_apogee(h_b, v_b, beta, self.temp, self.pressure, self.steps))
+        return {"max_error": float(actual.max()),
+                "max_reported": float(error.max()),
+                "max_ratio": float(np.max(actual / error))}
+
+    def _meta(self):
+        return {"temp": self.temp, "pressure": self.pressure, "h_max": self.h_max,
+                "v_range": list(self.v_range), "beta_range": list(self.beta_range), "shape": list(self.shape),
+                "steps": self.steps, "safety": self.safety}
+
+    # Function to save the table
+    def save(self, path: str):
+        np.savez(path, log_gain=self.log_gain, cell_error=self.cell_error, meta=np.array(json.dumps(self._meta())))
+
+    # Function to load a table saved with save
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            table = cls(**json.loads(str(data["meta"])))
+            table.log_gain = data["log_gain"]
+            table.cell_error = data["cell_error"]
+        return table
+
+    def __repr__(self):
+        return (f"CoastTable(temp={self.temp:g}K, pressure={self.pressure:g}Pa, h<={self.h_max:g}m, "
+                f"v {self.v_range[0]:g}-{self.v_range[1]:g}m/s, beta {self.beta_range[0]:g}-{self.beta_range[1]:g}kg/m^2)")
+
+
+# Function to load (or build and save) the table of an atmosphere
+#   - tables are files in `directory` named by a hash of the atmosphere and grid, and
+#     are also cached in memory
+def load_coast_table(temp: float = 288.15, pressure: float = 101325.0, directory: str = COAST_DIR, **grid):
+    table = CoastTable(temp, pressure, **grid)
+    key = hashlib.sha1(json.dumps(table._meta(), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(directory, f"coast_{key}.npz")
+    if path not in _table_cache:
+        if os.path.exists(path):
+            table = CoastTable.load(path)
+        else:
+            table.build()
+            os.makedirs(directory, exist_ok=True)
+            # Write under a temporary name so concurrent builders never read a partial file
+            tmp = os.path.join(directory, f".coast_{key}.{os.getpid()}.npz")
+            table.save(tmp)
+            os.replace(tmp, path)
+        _table_cache[path] = table
+    return _table_cache[path]
+
+
+# Function to integrate a parameter dict to engine burnout with the run() step
+#   - burnout is the first step after burn_time at which the thrust profile is 0
+#     (profiles like "quarter" keep thrusting past burn_time, fitted ones may turn negative)
+#   - the stopping rules of run() apply, so a flight that ends under power (landed,
+#     left the atmosphere, reached T) has its stop_reason set and is complete
+#   - returns the burnout state plus the max altitude and velocity of the powered flight
+def burnout_state(params: dict):
+    sim = simulation_from_params(params)
+    rocket = sim.rocket
+    t, h, v = 0.0, sim.h_0, sim.v_0
+    max_h, max_v = -np.inf, -np.inf
+    steps = 0
+    stop_reason = "end_time"
+    while t <= sim.T:
+        if t > rocket.burn_time and rocket.thrust_profile(t, rocket.burn_time, rocket.thrust) == 0:
+            stop_reason = None
+            break
+        reason = sim.check_stop(t, h, v)
+        if reason is not None:
+            stop_reason = reason
+            break
+        # Same samples as run() records
+        max_h, max_v = max(max_h, h), max(max_v, v)
+        reason = sim.check_stop(t, h, v, recorded=True)
+        if reason is not None:
+            stop_reason = reason
+            break
+        t, h, v = sim.rk4_step(t, h, v)
+        steps += 1
+    return {"t": float(t), "h": float(h), "v": float(v),
+            "beta": float(rocket.dry_mass / (rocket.C_D * rocket.A)) if rocket.C_D > 0 else np.inf,
+            "max_altitude": float(max_h), "max_velocity": float(max_v), "steps": steps,
+            "stop_reason": stop_reason, "temp": float(sim.temp), "pressure": float(sim.pressure)}
+
+
+# Worker side: burnout states of a chunk of parameter dicts (see batch.run_pool)
+def _burnout_batch(param_list: list, include_trajectory: bool = False):
+    return [burnout_state(params) for params in param_list]
+
+
+# Function to predict the apogees of many parameter sets: integrate each to burnout,
+#   then look the coasts up in the table of their atmosphere (one vectorized lookup each)
+#   - method is "table" (error = reported interpolation error), "integrated" (outside the
+#     grid) or "run" (rockets with a C_D(Mach) table, and flights that end before burnout,
+#     are simulated in full)
+def predict_apogees(param_list: list, table: CoastTable = None, processes: int = 1, pool=None, **grid):
+    resolved = [resolve_params(params) for params in param_list]
+    results = [None] * len(resolved)
+
+    coast_index = [i for i, params in enumerate(resolved) if params.get("C_D_mach") is None]
+    for i in set(range(len(resolved))) - set(coast_index):
+        summary = run_params(resolved[i], include_trajectory=False)
+        results[i] = {"apogee": summary["apogee"], "apogee_error": 0.0,
+                      "max_velocity": summary["max_velocity"], "method": "run"}
+
+    states = run_pool([resolved[i] for i in coast_index], processes, pool=pool, runner=_burnout_batch)
+
+    # Flights that ended under power are complete; one lookup per atmosphere for the rest
+    groups = {}
+    for i, state in zip(coast_index, states):
+        if state["stop_reason"] is not None:
+            results[i] = {"apogee": state["max_altitude"], "apogee_error": 0.0,
+                          "max_velocity": state["max_velocity"], "burnout": state, "method": "run"}
+            continue
+        groups.setdefault((state["temp"], state["pressure"]), []).append((i, state))
+    for (temp, pressure), members in groups.items():
+        group_table = table if table is not None else load_coast_table(temp, pressure, **grid)
+        if (group_table.temp, group_table.pressure) != (temp, pressure):
+            raise ValueError(f"Coast table atmosphere ({group_table.temp}, {group_table.pressure}) "
+                             f"does not match ({temp}, {pressure})")
+        h_b = np.array([s["h"] for _, s in members])
+        v_b = np.array([s["v"] for _, s in members])
+        beta = np.array([s["beta"] for _, s in members])
+        inside = np.isfinite(beta)
+        apogee, error = np.full(len(members), np.nan), np.zeros(len(members))
+        apogee[inside], error[inside] = group_table.lookup(h_b[inside], v_b[inside], beta[inside])
+        # No drag (C_D = 0): vacuum arc
+        apogee[~inside] = h_b[~inside] + np.maximum(v_b[~inside], 0.0)**2 / (2 * G)
+
+        on_grid = inside & group_table.covers(h_b, v_b, np.where(inside, beta, 1.0))
+        for (i, state), value, err, grid_hit in zip(members, apogee, error, on_grid):
+            results[i] = {"apogee": float(max(value, state["max_altitude"])), "apogee_error": float(err),
+                          "max_velocity": state["max_velocity"], "burnout": state,
+                          "method": "table" if grid_hit else "integrated"}
+    return results
@@ -0,0 +1,103 @@
+import os
+import hashlib
+
+import numpy as np
+
+DRAG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "inc", "drag")
+
+# Compiled tables keyed by the sha256 of their points
+_table_cache = {}
+
+class DragTable:
+    '''
+        DragTable Class (drag coefficient as a function of Mach number)
+        State Variables:
+            Table Points = machs, cds
+            Where the table came from (name, path or point list) = source
+            Uniform Grid Spacing = grid_dm (Mach)
+            Drag Coefficient on the Grid = cd_table
+            Slope dC_D/dMach on the Grid = slope_table
+
+        The points are compiled once into a uniform Mach grid so every lookup is
+            O(1). Mach numbers past the last point use the last C_D.
+
+        Functions:
+            __call__(mach):
+                Returns C_D at the given Mach number(s) (scalar or array)
+
+            slope(mach):
+                Returns dC_D/dMach at the given Mach number(s)
+    '''
+    # Constructor
+    def __init__(self, machs, cds, source=None, grid_points: int = 1024):
+        machs = np.asarray(machs, dtype=np.float64)
+        cds = np.asarray(cds, dtype=np.float64)
+        if len(machs) < 2 or len(machs) != len(cds):
+            raise ValueError("A drag table needs at least two matching (Mach, C_D) points")
+        if np.any(np.diff(machs) <= 0) or machs[0] < 0:
+            raise ValueError("Drag table Mach numbers must be positive and increasing")
+
+        # Tables implicitly hold their first C_D down to Mach 0
+        if machs[0] > 0:
+            machs = np.insert(machs, 0, 0.0)
+            cds = np.insert(cds, 0, cds[0])
+
+        self.machs = machs
+        self.cds = cds
+        self.source = source if source is not None else np.column_stack([machs, cds]).tolist()
+        self.grid_dm = machs[-1] / (grid_points - 1)
+        grid = np.linspace(0.0, machs[-1], grid_points)
+        self.cd_table = np.interp(grid, machs, cds)
+        self.slope_table = np.append(np.diff(self.cd_table) / self.grid_dm, 0.0)
+
+    # Function to look up C_D (O(1), scalar or array)
+    def __call__(self, mach):
+        if np.ndim(mach) == 0:
+            x = mach / self.grid_dm
+            # Also catches inf and nan Mach numbers
+            if not x < len(self.cd_table) - 1:
+                return self.cd_table[-1]
+            i = int(x)
+            return self.cd_table[i] + (x - i) * (self.cd_table[i + 1] - self.cd_table[i])
+
+        x = np.clip(np.asarray(mach, dtype=np.float64) / self.grid_dm, 0.0, len(self.cd_table) - 1)
+        i = np.minimum(x.astype(np.intp), len(self.cd_table) - 2)
+        return self.cd_table[i] + (x - i) * (self.cd_table[i + 1] - self.cd_table[i])
+
+    # Function to look up dC_D/dMach (piecewise constant on the grid)
+    def slope(self, mach):
+        x = np.asarray(mach, dtype=np.float64) / self.grid_dm
+        i = np.clip(x.astype(np.intp), 0, len(self.slope_table) - 1)
+        return self.slope_table[i] if np.ndim(mach) else float(self.slope_table[int(i)])
+
+    def __repr__(self):
+        return f"DragTable({self.source!r}, {len(self.machs)} points, Mach 0-{self.machs[-1]:g})"
+
+
+# Function to read a two column (Mach, C_D) table file; '#' starts a comment
+def read_drag_file(path: str):
+    points = np.loadtxt(path, delimiter=",", comments="#", ndmin=2)
+    return points[:, 0], points[:, 1]
+
+
+# Function to build (and cache) a drag table from a preset entry
+#   - spec is a list of [Mach, C_D] points, a file path, or a name in inc/drag
+def load_drag_table(spec, grid_points: int = 1024):
+    if isinstance(spec, DragTable):
+        return spec
+    if isinstance(spec, str):
+        path = spec if os.path.exists(spec) else os.path.join(DRAG_DIR, f"{spec}.csv")
+        if not os.path.exists(path):
+            raise ValueError(f"Unknown drag table: {spec}")
+        machs, cds = read_drag_file(path)
+    else:
+        points = np.asarray(spec, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 2:
+            raise ValueError("Drag table points must be [[Mach, C_D], ...]")
+        machs, cds = points[:, 0], points[:, 1]
+
+    key = (hashlib.sha256(np.ascontiguousarray([machs, cds]).tobytes()).hexdigest(), grid_points)
+    if key not in _table_cache:
+        source = spec if isinstance(spec, str) else None
+        _table_cache[key] = DragTable(machs, cds, source=source, grid_points=grid_points)
+    return _table_cache[key]
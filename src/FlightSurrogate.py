@@ -0,0 +1,182 @@
+import json
+
+import numpy as np
+
+from src.batch import resolve_params, run_params, run_pool
+from src.sampling import latin_hypercube
+
+# Flight metrics the surrogate learns
+METRICS = ("apogee", "max_velocity", "flight_time")
+
+class FlightSurrogate:
+    '''
+        FlightSurrogate Class (interpolating model of flight metrics)
+        State Variables:
+            Preset Family (parameter dict every sample starts from) = base_params
+            Sampled Fields and their Ranges = bounds {field: (low, high)}
+            Field Order = fields
+            Training Inputs (scaled to [0, 1]) = X
+            Training Outputs = Y (one column per metric)
+            RBF and Polynomial Coefficients = weights, poly
+            Leave-One-Out Errors of the Training Points = loo_errors
+
+        The model is a cubic radial basis function interpolant with a linear
+            polynomial tail, fitted in coordinates scaled to the unit cube. Error
+            estimates are the largest exact leave-one-out residual (Rippa's formula)
+            among the training points nearest to the query.
+            Queries outside the trained box fall back to a real simulation.
+
+        Functions:
+            fit(self, n_samples, processes, seed):
+                Samples the box with RocketSimulation and fits the interpolant
+
+            predict(self, query, fallback):
+                Returns metric predictions and error estimates for many designs at once
+
+            save(self, path):
+                Writes the fitted model to an .npz file
+
+            load(path):
+                Reads a model written by save
+    '''
+    # Constructor
+    def __init__(self, base_params: dict, bounds: dict):
+        if not bounds:
+            raise ValueError("FlightSurrogate needs at least one field to vary")
+        self.base_params = dict(base_params)
+        self.fields = tuple(bounds.keys())
+        self.bounds = {field: (float(low), float(high)) for field, (low, high) in bounds.items()}
+        self.low = np.array([self.bounds[f][0] for f in self.fields])
+        self.high = np.array([self.bounds[f][1] for f in self.fields])
+        if np.any(self.high <= self.low):
+            raise ValueError("Every bound needs low < high")
+        # Fails early on bad presets or fields
+        resolve_params(self.base_params)
+
+        self.X = None
+        self.Y = None
+        self.weights = None
+        self.poly = None
+        self.loo_errors = None
+
+    # Scale physical values to the unit cube
+    def _scale(self, values):
+        return (values - self.low) / (self.high - self.low)
+
+    # Turn a query (dict of arrays, or 2D array with columns in self.fields order) into an array
+    def _as_array(self, query):
+        if isinstance(query, dict):
+            columns = [np.atleast_1d(np.asarray(query[f], dtype=np.float64)) for f in self.fields]
+            return np.column_stack(np.broadcast_arrays(*columns))
+        return np.atleast_2d(np.asarray(query, dtype=np.float64))
+
+    def _params_for(self, row):
+        params = dict(self.base_params)
+        params.update(zip(self.fields, (float(x) for x in row)))
+        return params
+
+    # Cubic RBF kernel
+    def _kernel(self, A, B):
+        r = np.sqrt(np.sum((A[:, None, :] - B[None, :, :])**2, axis=-1))
+        return r**3
+
+    # Latin hypercube design in the unit cube
+    def _design(self, n_samples: int, rng):
+        d = len(self.fields)
+        design = latin_hypercube(n_samples, d, rng)
+        # Plus the center of the box
+        return np.vstack([np.full((1, d), 0.5), design])
+
+    # Function to sample the parameter box and fit the interpolant
+    def fit(self, n_samples: int = 200, processes: int = None, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        unit = self._design(n_samples, rng)
+        physical = self.low + unit * (self.high - self.low)
+        param_list = [self._params_for(row) for row in physical]
+
+        results = run_pool(param_list, processes)
+
+        keep = [i for i, r in enumerate(results) if "error" not in r and r["apogee"] is not None]
+        self.X = unit[keep]
+        self.Y = np.array([[results[i][m] for m in METRICS] for i in keep], dtype=np.float64)
+        self._solve()
+        return self
+
+    # Solve the RBF system and the leave-one-out residuals
+    def _solve(self):
+        n, d = self.X.shape
+        P = np.hstack([np.ones((n, 1)), self.X])
+        M = np.zeros((n + d + 1, n + d + 1))
+        M[:n, :n] = self._kernel(self.X, self.X)
+        M[:n, n:] = P
+        M[n:, :n] = P.T
+
+        rhs = np.vstack([self.Y, np.zeros((d + 1, self.Y.shape[1]))])
+        M_inv = np.linalg.pinv(M)
+        coefficients = M_inv @ rhs
+        self.weights = coefficients[:n]
+        self.poly = coefficients[n:]
+        # Rippa: the leave-one-out residual of point i is c_i / (M^-1)_ii
+        self.loo_errors = np.abs(self.weights / np.diag(M_inv)[:n, None])
+
+    # Evaluate the interpolant and its error estimate at scaled points
+    def _evaluate(self, unit, k: int = 4):
+        K = self._kernel(unit, self.X)
+        values = K @ self.weights + np.hstack([np.ones((len(unit), 1)), unit]) @ self.poly
+
+        distances = K ** (1.0 / 3.0)
+        k = min(k, len(self.X))
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        d_near = np.take_along_axis(distances, nearest, axis=1)
+        errors = self.loo_errors[nearest].max(axis=1)
+        # Exactly on a training point the interpolant is exact
+        errors = np.where(d_near.min(axis=1, keepdims=True) < 1e-12, 0.0, errors)
+        return values, errors
+
+    # Function to predict metrics for many designs
+    #   - returns {metric: values, metric_error: estimates, "inside": mask, "simulated": mask}
+    def predict(self, query, fallback: bool = True):
+        if self.X is None:
+            raise RuntimeError("Fit or load the surrogate before predicting")
+        physical = self._as_array(query)
+        unit = self._scale(physical)
+        inside = np.all((unit >= 0.0) & (unit <= 1.0), axis=1)
+
+        values = np.full((len(unit), len(METRICS)), np.nan)
+        errors = np.full((len(unit), len(METRICS)), np.nan)
+        if np.any(inside):
+            values[inside], errors[inside] = self._evaluate(unit[inside])
+
+        simulated = np.zeros(len(unit), dtype=bool)
+        if fallback:
+            for i in np.flatnonzero(~inside):
+                result = run_params(self._params_for(physical[i]), include_trajectory=False)
+                values[i] = [result[m] for m in METRICS]
+                errors[i] = 0.0
+                simulated[i] = True
+
+        output = {"inside": inside, "simulated": simulated}
+        for j, metric in enumerate(METRICS):
+            output[metric] = values[:, j]
+            output[f"{metric}_error"] = errors[:, j]
+        return output
+
+    # Function to save the fitted model
+    def save(self, path: str):
+        np.savez(path,
+                 X=self.X, Y=self.Y, weights=self.weights, poly=self.poly, loo_errors=self.loo_errors,
+                 meta=np.array(json.dumps({"base_params": self.base_params,
+                                           "bounds": [[f, *self.bounds[f]] for f in self.fields]})))
+
+    # Function to load a model saved with save
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            surrogate = cls(meta["base_params"], {f: (low, high) for f, low, high in meta["bounds"]})
+            surrogate.X = data["X"]
+            surrogate.Y = data["Y"]
+            surrogate.weights = data["weights"]
+            surrogate.poly = data["poly"]
+            surrogate.loo_errors = data["loo_errors"]
+        return surrogate
@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+
+import numpy as np
+
+from src.batch import make_pool, params_key, resolve_params, simulation_from_params, summarize
+from src.Trajectory import Trajectory
+
+# Indexed columns of the runs table
+PARAM_COLUMNS = ("m", "thrust", "burn_time", "fuel_mass", "C_D", "A",
+                 "h_0", "v_0", "theta", "temp", "pressure", "dt", "T")
+TEXT_COLUMNS = ("thrust_profile", "C_D_mach")
+METRIC_COLUMNS = ("apogee", "max_velocity", "flight_time")
+COLUMNS = ("id", "key") + PARAM_COLUMNS + TEXT_COLUMNS + METRIC_COLUMNS + \
+    ("steps", "stop_reason", "error", "created", "blob")
+
+# Rows of a trajectory blob
+CHANNELS = ("times", "altitudes", "velocities", "accelerations", "masses")
+
+# Query operators: keyword suffix -> SQL
+OPERATORS = {"lt": "<", "le": "<=", "gt": ">", "ge": ">=", "eq": "=", "ne": "!="}
+
+
+# Worker side: run a chunk of parameter dicts and store them in one transaction
+def _run_into_store(path: str, param_list: list, include_trajectory: bool):
+    records = []
+    for params in param_list:
+        try:
+            sim = simulation_from_params(params)
+            sim.run()
+        except Exception as e:
+            records.append((params, {"error": f"{type(e).__name__}: {e}"}, None))
+            continue
+        arrays = np.array([getattr(sim, channel) for channel in CHANNELS], dtype=np.float64) \
+            if include_trajectory else None
+        records.append((params, summarize(sim), arrays))
+    with ResultsStore(path) as store:
+        store.insert_many(records)
+    return len(records)
+
+
+class ResultsStore:
+    '''
+        File-backed store of simulation results
+        State Variables:
+            Store Directory = path
+            SQLite Database (WAL mode) = path/results.sqlite
+            Trajectory Blobs (.npy, one per run) = path/arrays/
+
+        Every run is one row of the runs table, keyed by the hash of its resolved
+            parameters (params_key), with the rocket parameters and summary
+            metrics in indexed columns, so range queries use the indexes instead
+            of rescanning. Trajectories are written to their own .npy file before
+            the row that points at them is committed.
+
+        Functions:
+            insert(self, params, summary, arrays):
+                Stores one run
+
+            insert_many(self, records):
+                Stores many (params, summary, arrays) records in one transaction
+
+            run(self, param_list, processes, pool, include_trajectory, chunk_size):
+                Runs the parameter sets not stored yet on a pool; workers insert their chunks
+
+            query(self, where, args, order_by, limit, **conditions):
+                Returns the runs matching a filter, e.g. query(apogee__ge=X, apogee__le=Y, C_D__lt=0.5)
+
+            get(self, params):
+                Returns the stored run of a parameter dict (or None)
+
+            params(self, run):
+                Returns the parameter dict of a stored run
+
+            trajectory(self, run):
+                Returns the Trajectory of a stored run (None without a blob)
+
+            close(self):
+                Closes the database connection
+    '''
+    # Constructor
+    #   - timeout is how long a writer waits for another process's transaction
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = path
+        self.blob_dir = os.path.join(path, "arrays")
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(path, "results.sqlite"), timeout=timeout)
+        self.connection.row_factory = sqlite3.Row
+        # WAL lets readers run while a worker commits
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        columns = ", ".join([f"{name} REAL" for name in PARAM_COLUMNS] +
+                            [f"{name} TEXT" for name in TEXT_COLUMNS] +
+                            [f"{name} REAL" for name in METRIC_COLUMNS])
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, "
+                f"{columns}, steps INTEGER, stop_reason TEXT, error TEXT, created REAL, blob TEXT)")
+            for name in PARAM_COLUMNS + METRIC_COLUMNS:
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS runs_{name} ON runs ({name})")
+
+    # Write a trajectory blob atomically (readers never see a partial file)
+    #   - every write gets its own name, so replacing a run never touches a file
+    #     another row (or another process's pending insert) points at
+    def _write_blob(self, key: str, arrays):
+        name = f"{key}-{uuid.uuid4().hex[:12]}.npy"
+        tmp = os.path.join(self.blob_dir, f".{key}.{os.getpid()}.tmp.npy")
+        np.save(tmp, np.asarray(arrays, dtype=np.float64))
+        os.replace(tmp, os.path.join(self.blob_dir, name))
+        return name
+
+    # Text columns hold names as they are and point lists as JSON
+    @staticmethod
+    def _text(value):
+        if value is None or isinstance(value, str):
+            return value
+        return json.dumps(value)
+
+    # Build the row of one run; the blob is written last, once nothing else can fail
+    def _row(self, params: dict, summary: dict, arrays):
+        resolved = resolve_params(params)
+        key = params_key(resolved)
+        row = ((key,) +
+               tuple(resolved.get(name) for name in PARAM_COLUMNS) +
+               tuple(self._text(resolved.get(name)) for name in TEXT_COLUMNS) +
+               tuple(summary.get(name) for name in METRIC_COLUMNS) +
+               (summary.get("steps"), summary.get("stop_reason"), summary.get("error"), time.time()))
+        return row + (self._write_blob(key, arrays) if arrays is not None else None,)
+
+    # Function to store one run
+    #   - arrays: optional (5, n) array of times, altitudes, velocities, accelerations and masses
+    def insert(self, params: dict, summary: dict, arrays=None):
+        self.insert_many([(params, summary, arrays)])
+
+    # Function to store many runs in one transaction (a run already stored is replaced)
+    #   - the blobs of replaced rows are deleted once the transaction commits, and the
+    #     new blobs when it fails, so no file is left without a row pointing at it
+    def insert_many(self, records):
+        names = COLUMNS[1:]
+        rows = []
+        stale = []
+        try:
+            for params, summary, arrays in records:
+                rows.append(self._row(params, summary, arrays))
+            with self.connection:
+                # Take the write lock before reading the rows that are about to be replaced
+                self.connection.execute("BEGIN IMMEDIATE")
+                sql = f"INSERT OR REPLACE INTO runs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+                for row in rows:
+                    old = self.connection.execute("SELECT blob FROM runs WHERE key = ?", (row[0],)).fetchone()
+                    if old is not None and old["blob"]:
+                        stale.append(old["blob"])
+                    self.connection.execute(sql, row)
+        except Exception:
+            # Also covers a bad record after the blobs of earlier ones were written
+            stale = [row[-1] for row in rows if row[-1]]
+            raise
+        finally:
+            for blob in stale:
+                try:
+                    os.remove(os.path.join(self.blob_dir, blob))
+                except FileNotFoundError:
+                    pass
+
+    # Function to run the parameter sets that are not stored yet
+    #   - each worker runs a chunk and inserts it in one transaction of its own
+    #   - returns the number of runs performed
+    def run(self, param_list: list, processes: int = None, pool=None,
+            include_trajectory: bool = True, chunk_size: int = None):
+        pending, keys = [], set()
+        for params in param_list:
+            key = params_key(params)
+            if key not in keys and self.get(params) is None:
+                keys.add(key)
+                pending.append(params)
+        if not pending:
+            return 0
+
+        processes = processes or os.cpu_count() or 1
+        chunk_size = chunk_size or max(1, min(500, len(pending) // (4 * processes)))
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        if pool is None and processes == 1:
+            for chunk in chunks:
+                _run_into_store(self.path, chunk, include_trajectory)
+            return len(pending)
+
+        owns_pool = pool is None
+        if owns_pool:
+            pool = make_pool(min(processes, len(chunks)))
+        try:
+            futures = [pool.submit(_run_into_store, self.path, chunk, include_trajectory) for chunk in chunks]
+            for future in futures:
+                future.result()
+        finally:
+            if owns_pool:
+                pool.shutdown()
+        return len(pending)
+
+    # Function to query the runs table
+    #   - conditions: column=value or column__op=value with op in lt, le, gt, ge, eq, ne,
+    #     or column__between=(low, high); where/args add a raw SQL filter
+    #   - returns a list of dicts in order_by order
+    def query(self, where: str = None, args: tuple = (), order_by: str = None, limit: int = None,
+              **conditions):
+        clauses, values = [], []
+        for name, value in conditions.items():
+            column, _, op = name.partition("__")
+            if column not in COLUMNS:
+                raise ValueError(f"Unknown column: {column}")
+            if op == "between":
+                clauses.append(f"{column} BETWEEN ? AND ?")
+                values.extend(value)
+            elif op in OPERATORS or not op:
+                clauses.append(f"{column} {OPERATORS[op or 'eq']} ?")
+                values.append(value)
+            else:
+                raise ValueError(f"Unknown operator: {op}")
+        if where:
+            clauses.append(f"({where})")
+            values.extend(args)
+
+        sql = "SELECT * FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if order_by:
+            column = order_by.lstrip("-")
+            if column not in COLUMNS:
+                raise ValueError(f"Unknown column: {column}")
+            sql += f" ORDER BY {column} {'DESC' if order_by.startswith('-') else 'ASC'}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self.connection.execute(sql, values)]
+
+    # Function to look up the stored run of a parameter dict
+    def get(self, params: dict):
+        row = self.connection.execute("SELECT * FROM runs WHERE key = ?", (params_key(params),)).fetchone()
+        return dict(row) if row is not None else None
+
+    # Function to rebuild the parameter dict of a stored run
+    def params(self, run: dict):
+        params = {name: run[name] for name in PARAM_COLUMNS + TEXT_COLUMNS if run.get(name) is not None}
+        if params.get("C_D_mach", "").startswith("["):
+            params["C_D_mach"] = json.loads(params["C_D_mach"])
+        return params
+
+    # Function to load the trajectory of a stored run (a row from query or get)
+    #   - it carries a fresh simulation of the run's parameters for the derived channels
+    def trajectory(self, run: dict):
+        if not run.get("blob"):
+            return None
+        arrays = np.load(os.path.join(self.blob_dir, run["blob"]))
+        # Blobs written before masses were recorded have four rows
+        masses = arrays[4] if len(arrays) > 4 else None
+        return Trajectory(*arrays[:4], sim=simulation_from_params(self.params(run)), masses=masses)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,5 +1,7 @@
 import numpy as np
 
+from src.ThrustCurve import ThrustCurve
+
 class Rocket:
     '''
         Rocket Class
@@ -10,8 +12,9 @@ class Rocket:
             Fuel Mass = fuel_mass (kg)
             Engine Burn Rate = fuel_mass / burn_time (kg/s)
             Rocket Drag Coefficient = C_D (unitless)
+            Mach-dependent Drag Coefficient = drag_table (DragTable or None, replaces C_D)
             Rocket Cross Sectional Nose Area = A (m^2)
-            Rocket Engine Thrust Profile = function()
+            Rocket Engine Thrust Profile = function() or ThrustCurve
 
         Functions:
             default_thrust_profile(t, burn_time, thrust):
@@ -22,6 +25,7 @@ class Rocket:
 
             fuel_status(t, dt):
                 Returns the amount of engine fuel left
+                    (ThrustCurve profiles burn fuel in proportion to the measured thrust)
     '''
     # Constructor
     def __init__(
@@ -32,7 +36,8 @@ class Rocket:
                     fuel_mass: float,
                     C_D: float,
                     A: float,
-                    thrust_profile=None
+                    thrust_profile=None,
+                    drag_table=None
                 ):
         # Cast everything to a numpy float 64-bit
         self.dry_mass = np.float64(m)
@@ -45,6 +50,7 @@ class Rocket:
         self.C_D = np.float64(C_D)
         self.A = np.float64(A)
         self.thrust_profile = thrust_profile if thrust_profile else self.default_thrust_profile
+        self.drag_table = drag_table
 
     # Function to set the default thrust profile if one is not provided
     def default_thrust_profile(self, t: float, burn_time: float, max_thrust: float):
@@ -57,6 +63,11 @@ class Rocket:
     # Function to calculate amount of engine fuel left
     def fuel_status(self, t: float, dt: float):
         #dry_mass = self.m - self.fuel_mass
+        if isinstance(self.thrust_profile, ThrustCurve):
+            # Mass follows the curve's cumulative impulse table
+            fuel_left = self.fuel_mass * (1.0 - self.thrust_profile.burned_fraction(t, self.burn_time))
+            self.m = self.dry_mass + fuel_left
+            return fuel_left
         if t <= self.burn_time:
             # Reduce mass based on burn rate and time step
             self.m = max(self.dry_mass, self.m - self.burn_rate * dt)
@@ -2,7 +2,21 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from src.Rocket import Rocket
+from src.Trajectory import Trajectory
+from src.DragTable import load_drag_table
 from src.analysis import analyze_convergence, plot_convergence
+from src.sensitivity import run_sensitivity
+from src.checkpoint import save_checkpoint, load_checkpoint
+from src.phases import run_phased
+from inc.thrust_profiles import resolve_thrust_profile
+
+# International Standard Atmosphere constants
+AIR_GAS_CONST = np.float64(287.05) # given in J/kg K)
+TEMP_LAPSE_RATE = np.float64(-0.0065) # rate at which temp decreases with altitude given in K/m
+HEAT_CAPACITY_RATIO = np.float64(1.4) # ratio of specific heats for air (unitless)
+
+# Altitude above which a run reports that the rocket left the atmosphere (m)
+ATMOSPHERE_EXIT = 99779.3
 
 class RocketSimulation:
     '''
@@ -18,17 +32,42 @@ class RocketSimulation:
             Gravitational Constant = G (m/s^2)
             Step size = dt (s)
             Simulation End Time = T (s)
+            Print Stop Messages = verbose (bool)
 
+            Reason the last run stopped = stop_reason (str)
             Array to hold times = times []
             Array to hold altitudes = altitudes []
             Array to hold velocities = velocities []
+            Array to hold accelerations = accelerations []
+            Array to hold the masses g() used at each sample = masses []
+            Dense output of the last run = result (Trajectory)
+            Phases of the last phased run = phases [(name, t_start, t_end)]
 
         Functions:
             air_density(self, t, h):
                 Calculates the air density in the atmosphere based on rocket altitude
 
+            air_density_array(self, h):
+                Same air density model, vectorized over an array of altitudes
+
+            air_density_gradient(self, h):
+                Calculates the derivative of air density with respect to altitude
+
+            altitude_for_density(self, rho):
+                Calculates the altitude at which the air density falls to rho
+
+            temperature(self, h):
+                Calculates the air temperature at altitude(s) h
+
+            speed_of_sound(self, h):
+                Calculates the speed of sound at altitude(s) h
+
+            speed_of_sound_gradient(self, h):
+                Calculates the derivative of the speed of sound with respect to altitude
+
             drag(self, v):
                 Calculate drag forces on the rocket at current velocity
+                    (C_D follows the rocket's drag table when it has one)
 
             f(self, t, h, v):
                 Computes velocity (dh/dt)
@@ -39,11 +78,37 @@ class RocketSimulation:
             rk4_step(self, t, h, v):
                 Performs a single Runge-Kutta 4th order step
 
-            run(self):
-                Runs the simulation using rk4_step for the entire time duration
+            check_stop(self, t, h, v, recorded):
+                Applies the stopping rules of run() to a sample, returns the stop reason or None
+
+            run(self, checkpoint_path, checkpoint_interval):
+                Runs the simulation using rk4_step for the entire time duration,
+                    optionally saving a checkpoint every checkpoint_interval seconds
+
+            from_checkpoint(path, thrust_profile, verbose, **overrides):
+                Creates a simulation that continues from a saved checkpoint. Overrides
+                    (e.g. T=20000.0 or C_D=0.6) fork a what-if branch off the saved state
+
+            cancel(self):
+                Stops a run in progress at the next step
+
+            finish_result(self):
+                Builds the Trajectory (dense output) from the recorded arrays
+
+            run_phased(self, coast_dt, vacuum_density):
+                Runs the simulation with cheaper coast and closed-form vacuum phases
+
+            trajectory(self, t):
+                Returns altitude and velocity at arbitrary time(s) of the last run
 
             visualize(self):
                 Generates plots using simulation data
+
+            analysis(self, dt_values):
+                Plots the truncation error for a range of step sizes
+
+            sensitivity(self, params):
+                Runs the simulation while also integrating d(state)/d(parameter)
     '''
     # Constructor
     def __init__(   self,
@@ -54,7 +119,8 @@ class RocketSimulation:
                     temp: float,
                     pressure: float,
                     dt: float,
-                    T: float
+                    T: float,
+                    verbose: bool = True
                 ):
         
         # Define all our state variables
@@ -70,23 +136,45 @@ class RocketSimulation:
         # Time parameters
         self.dt = np.float64(dt)
         self.T = np.float64(T)
+
+        # Batch and server runs switch the stop messages off
+        self.verbose = verbose
+        self.stop_reason = None
         
         # Define arrays to hold simulation data
         self.times = []
         self.altitudes = []
         self.velocities = []
+        self.accelerations = []
+        self.masses = []
+        self.result = None
+        self.phases = []
+
+        # Acceleration at the start and end of the last rk4 step (used for dense output)
+        self.accel_start = None
+        self.accel_end = None
+        # Rocket mass g() used at the start of the last rk4 step
+        self.mass_start = None
+
+        # (t, h, v) to continue from instead of the initial conditions (see from_checkpoint)
+        self.resume_state = None
+        # (path, samples saved, segments) of the last checkpoint (see src/checkpoint.py)
+        self.checkpoint_progress = None
+
+        # Set from another thread (see cancel) to stop a run early
+        self.cancelled = False
 
     # Function to calculate air density (rho) based on altitude
     #   - uses the International Standard Atmosphere model
     def air_density(self, h: float):
         # First define some constants
-        air_gas_const = np.float64(287.05) # given in J/kg K)
-        temp_lapse_rate = np.float64(-0.0065) # rate at which temp decreases with altitude given in K/m
+        air_gas_const = AIR_GAS_CONST
+        temp_lapse_rate = TEMP_LAPSE_RATE
         pressure_sea_lvl = self.pressure
         temp_sea_lvl = self.temp
 
         # Calculate the temperature at current altitude
-        cur_temp = temp_sea_lvl + (temp_lapse_rate * h)
+        cur_temp = self.temperature(h)
 
         # Calculate pressure using barometric formula
         exp = -self.G / (air_gas_const * temp_lapse_rate)
@@ -100,13 +188,70 @@ class RocketSimulation:
         #     print(f"Unrealistic air density: {rho}")
 
         return max(0.0, rho)
+
+    # Function to calculate air density for an array of altitudes
+    #   - same model as air_density; rho is 0 where it would be negative or undefined
+    def air_density_array(self, h):
+        cur_temp = self.temperature(np.asarray(h, dtype=np.float64))
+        exp = -self.G / (AIR_GAS_CONST * TEMP_LAPSE_RATE)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rho = self.pressure * (cur_temp / self.temp) ** exp / (AIR_GAS_CONST * cur_temp)
+        return np.where(rho > 0, rho, 0.0)
+
+    # Function to calculate d(rho)/dh for the same atmosphere model
+    #   - zero wherever air_density clamps rho to 0
+    def air_density_gradient(self, h: float):
+        rho = self.air_density(h)
+        if rho <= 0.0:
+            return 0.0
+        cur_temp = self.temperature(h)
+        exp = -self.G / (AIR_GAS_CONST * TEMP_LAPSE_RATE)
+        # rho is proportional to cur_temp ** (exp - 1)
+        return rho * (exp - 1) * TEMP_LAPSE_RATE / cur_temp
     
+    # Function to find the altitude at which air_density falls to rho
+    #   - inverse of the barometric formula used in air_density
+    def altitude_for_density(self, rho: float):
+        exp = -self.G / (AIR_GAS_CONST * TEMP_LAPSE_RATE)
+        rho_sea_lvl = self.pressure / (AIR_GAS_CONST * self.temp)
+        temp = self.temp * (rho / rho_sea_lvl) ** (1.0 / (exp - 1))
+        return (temp - self.temp) / TEMP_LAPSE_RATE
+
+    # Function to calculate the air temperature at altitude h (scalar or array)
+    #   - the one temperature profile of the atmosphere: air_density and speed_of_sound
+    #     both use it, so Mach number and density always describe the same air
+    #   - falls linearly and reaches 0 K near 44 km, where the air density becomes 0
+    def temperature(self, h):
+        return self.temp + (TEMP_LAPSE_RATE * h)
+
+    # Function to calculate the speed of sound at altitude h (scalar or array)
+    #   - infinite where the temperature has reached 0 K: there is no air and the Mach
+    #     number is 0 (drag is 0 there anyway, since air_density is)
+    def speed_of_sound(self, h):
+        cur_temp = self.temperature(h)
+        with np.errstate(invalid="ignore"):
+            speed = np.sqrt(HEAT_CAPACITY_RATIO * AIR_GAS_CONST * cur_temp)
+        if np.ndim(speed) == 0:
+            return speed if cur_temp > 0 else np.float64(np.inf)
+        return np.where(cur_temp > 0, speed, np.inf)
+
+    # Function to calculate d(speed of sound)/dh
+    #   - zero where there is no air
+    def speed_of_sound_gradient(self, h: float):
+        cur_temp = self.temperature(h)
+        if cur_temp <= 0:
+            return 0.0
+        return self.speed_of_sound(h) * TEMP_LAPSE_RATE / (2 * cur_temp)
+
     # Function to calculate drag forces on the rocket
     def drag(self, h: float, v: float):
         # compute the air density value first
         self.rho = self.air_density(h)
+        C_D = self.rocket.C_D
+        if self.rocket.drag_table is not None:
+            C_D = self.rocket.drag_table(abs(v) / self.speed_of_sound(h))
         # now we can calculate the drag forces based on the formula
-        return 0.5 * self.rho * (v**2) * self.rocket.C_D * self.rocket.A
+        return 0.5 * self.rho * (v**2) * C_D * self.rocket.A
     
     # Define f(t, h, v) to compute the velocity (dh/dt)
     def f(self, t: float, h: float, v: float):
@@ -141,6 +286,7 @@ class RocketSimulation:
         # Slope 1 Calculation
         s_1h = self.dt * self.f(t, h, v)
         s_1v = self.dt * self.g(t, h, v)
+        self.mass_start = self.rocket.m
 
         # Slope 2 Calculation
         s_2h = self.dt * self.f((t+0.5*self.dt), (h+0.5*s_1h), (v+0.5*s_1v))
@@ -159,21 +305,65 @@ class RocketSimulation:
         h_1 = h + (1./6.) * (s_1h + 2*s_2h + 2*s_3h + s_4h)
         v_1 = v + (1./6.) * (s_1v + 2*s_2v + 2*s_3v + s_4v)
 
+        self.accel_start = s_1v / self.dt
+        self.accel_end = s_4v / self.dt
+
         return t_1, h_1, v_1
     
     # Run the RK4 Steps for the Desired Time Duration
-    def run(self):
+    # Function to apply the stopping rules of run() at the sample (t, h, v)
+    #   - recorded=False: checks made before the sample is recorded (a stop drops it)
+    #   - recorded=True: checks made after it is recorded (a stop keeps it)
+    #   - returns the stop reason, or None to keep integrating
+    #   - every integrator (run_phased, run_parareal, run_sensitivity,
+    #     CoastTable.burnout_state) stops through here so they all end where run() does
+    def check_stop(self, t: float, h: float, v: float, recorded: bool = False):
+        if not recorded:
+            if np.isnan(h) or np.isnan(v):
+                if self.verbose:
+                    print(f"Simulation stopped due to NaN at time {t:.2f}s")
+                return "nan"
+            if h < 0 and t > self.rocket.burn_time:
+                if self.verbose:
+                    print("Rocket has landed.")
+                return "landed"
+            return None
+
+        if h > ATMOSPHERE_EXIT:
+            if self.verbose:
+                print("Exited Earth's Atmosphere!")
+            return "exited_atmosphere"
+        if t > 2.0 and h <= -0.001:
+            return "landed"
+        return None
+
+    def run(self, checkpoint_path: str = None, checkpoint_interval: float = None):
         # initialize time, altitude, and velocity
-        t = 0.0
-        v = self.v_0
-        h = self.h_0
+        if self.resume_state is not None:
+            t, h, v = self.resume_state
+            self.resume_state = None
+        else:
+            t = 0.0
+            v = self.v_0
+            h = self.h_0
+        self.stop_reason = "end_time"
+
+        next_checkpoint = np.inf
+        if checkpoint_path is not None and checkpoint_interval:
+            next_checkpoint = t + checkpoint_interval
 
         while (t <= self.T):
-            if np.isnan(h) or np.isnan(v):
-                print(f"Simulation stopped due to NaN at time {t:.2f}s")
+            if self.cancelled:
+                self.stop_reason = "cancelled"
                 break
-            if h < 0 and t > self.rocket.burn_time:
-                print("Rocket has landed.")
+            # Snapshot before recording, so the checkpoint state is the next sample
+            if t >= next_checkpoint:
+                save_checkpoint(self, checkpoint_path, t, h, v)
+                next_checkpoint = t + checkpoint_interval
+
+            stop_reason = self.check_stop(t, h, v)
+            if stop_reason is not None:
+                self.stop_reason = stop_reason
                 break
 
             #print(f"Time: {t} Alt: {h} Velo: {v}")
@@ -182,16 +372,84 @@ class RocketSimulation:
             self.altitudes.append(h)
             self.velocities.append(v)
 
-
-            # Check to see if rocket has escaped earth's atmosphere
-            if h > 99779.3:
-                print("Exited Earth's Atmosphere!")
-                return
-            if t > 2.0 and h <= -0.001:
+            # Check to see if rocket has escaped earth's atmosphere (or landed)
+            stop_reason = self.check_stop(t, h, v, recorded=True)
+            if stop_reason is not None:
+                self.stop_reason = stop_reason
                 break
 
             # Update variables based on rk4 output for next loop run
             t, h, v = self.rk4_step(t, h, v)
+            self.accelerations.append(self.accel_start)
+            self.masses.append(self.mass_start)
+
+        # Runs that reached T can be extended later by resuming with a larger T
+        if checkpoint_path is not None and self.stop_reason == "end_time":
+            save_checkpoint(self, checkpoint_path, t, h, v)
+
+        self.finish_result()
+
+    # Function to create a simulation continuing from a checkpoint
+    #   - overrides replace saved rocket/simulation parameters for the continuation
+    #   - thrust_profile is needed when the saved profile was not a registered one
+    #   - verbose defaults to the setting of the simulation that saved the checkpoint
+    @classmethod
+    def from_checkpoint(cls, path: str, thrust_profile=None, verbose: bool = None, **overrides):
+        checkpoint = load_checkpoint(path)
+        p = dict(checkpoint["params"])
+        unknown = [key for key in overrides if key not in p and key != "C_D_mach"]
+        if unknown:
+            raise ValueError(f"Unknown checkpoint overrides: {', '.join(unknown)}")
+        p.update(overrides)
+
+        if thrust_profile is None:
+            thrust_profile = resolve_thrust_profile(p["thrust_profile"])
+        drag_table = load_drag_table(p["C_D_mach"]) if p.get("C_D_mach") is not None else None
+        rocket = Rocket(p["m"], p["thrust"], p["burn_time"], p["fuel_mass"], p["C_D"], p["A"],
+                        thrust_profile=thrust_profile, drag_table=drag_table)
+        # Continue with the mass the rocket had when the checkpoint was written
+        rocket.m = checkpoint["m"]
+
+        if verbose is None:
+            verbose = checkpoint["verbose"]
+        sim = cls(rocket, p["h_0"], p["v_0"], p["theta"], p["temp"], p["pressure"], p["dt"], p["T"],
+                  verbose=verbose)
+        sim.times = checkpoint["times"]
+        sim.altitudes = checkpoint["altitudes"]
+        sim.velocities = checkpoint["velocities"]
+        sim.accelerations = checkpoint["accelerations"]
+        sim.masses = checkpoint["masses"]
+        sim.resume_state = (checkpoint["t"], checkpoint["h"], checkpoint["v"])
+        # Saving to the same path again only appends the new samples
+        sim.checkpoint_progress = (path, checkpoint["samples"], checkpoint["segments"])
+        return sim
+
+    # Function to run the simulation split into powered / coast / vacuum phases
+    def run_phased(self, coast_dt: float = None, vacuum_density: float = 1e-8):
+        return run_phased(self, coast_dt, vacuum_density)
+
+    # Function to stop a run that is in progress (e.g. a stale GUI preview)
+    def cancel(self):
+        self.cancelled = True
+
+    # Function to build the dense output of the recorded run
+    #   - the last sample has no step after it, so it reuses the end slope of the last step
+    #     and the mass the rocket has after it
+    def finish_result(self):
+        if len(self.accelerations) < len(self.times):
+            last = self.accel_end if self.accel_end is not None else 0.0
+            self.accelerations.extend([last] * (len(self.times) - len(self.accelerations)))
+        del self.accelerations[len(self.times):]
+        self.masses.extend([self.rocket.m] * (len(self.times) - len(self.masses)))
+        del self.masses[len(self.times):]
+        self.result = Trajectory(self.times, self.altitudes, self.velocities, self.accelerations,
+                                 sim=self, masses=self.masses)
+
+    # Function to evaluate altitude and velocity of the last run at arbitrary time(s)
+    def trajectory(self, t):
+        if self.result is None:
+            raise RuntimeError("Run the simulation before querying its trajectory")
+        return self.result(t)
 
     # Function to visualize output in plots
     def visualize(self):
@@ -223,4 +481,7 @@ class RocketSimulation:
         # show the plots of the errors for both altitude and velocity
         #   - they should be somewhat linear on a log-log graph
         return plot_convergence(dt_values, E_h_array, E_v_array)
-        
+
+    # Function to run the simulation with forward parameter sensitivities
+    def sensitivity(self, params=("m", "thrust", "burn_time", "fuel_mass", "C_D", "A")):
+        return run_sensitivity(self, params)
@@ -0,0 +1,194 @@
+import uuid
+import threading
+from concurrent.futures import Future
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from src.batch import make_pool, resolve_params, simulation_from_params, summarize
+from src.Trajectory import Trajectory
+
+# Channels stored in every block, one row each
+CHANNELS = ("times", "altitudes", "velocities", "accelerations", "masses")
+
+
+# Worker side: run one simulation and copy its arrays into a block of exactly their size
+#   - the block is created only once the run is over and handed to the parent by name;
+#     it is registered with the parent's resource tracker, so it is unlinked even if
+#     the parent never receives the name
+def _run_into_block(params: dict):
+    sim = simulation_from_params(params)
+    sim.run()
+    n = len(sim.times)
+
+    shm = SharedMemory(name=f"rocket_{uuid.uuid4().hex[:16]}", create=True,
+                       size=max(len(CHANNELS) * n * 8, 1))
+    try:
+        data = np.ndarray((len(CHANNELS), n), dtype=np.float64, buffer=shm.buf)
+        for row, channel in enumerate(CHANNELS):
+            data[row] = getattr(sim, channel)
+        del data
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+
+    summary = summarize(sim)
+    summary["length"] = n
+    summary["block"] = shm.name
+    return summary
+
+
+class SharedResult:
+    '''
+        Result of a simulation run in a worker process, backed by shared memory
+        State Variables:
+            Simulation Parameters = params (dict)
+            Run Summary = summary (dict)
+            Trajectory Arrays (views into the block, no copies) =
+                times, altitudes, velocities, accelerations, masses (np.ndarray)
+
+        Functions:
+            trajectory(self):
+                Returns a Trajectory (dense output) built on the shared arrays
+
+            release(self):
+                Drops the views and frees the shared memory block
+    '''
+    def __init__(self, pool, shm: SharedMemory, params: dict, summary: dict):
+        self.pool = pool
+        self.shm = shm
+        self.params = params
+        self.summary = summary
+
+        data = np.ndarray((len(CHANNELS), summary["length"]), dtype=np.float64, buffer=shm.buf)
+        for row, channel in enumerate(CHANNELS):
+            setattr(self, channel, data[row])
+
+    def trajectory(self):
+        # A fresh simulation from the same parameters provides the derived channels
+        return Trajectory(self.times, self.altitudes, self.velocities, self.accelerations,
+                          sim=simulation_from_params(self.params), masses=self.masses)
+
+    def release(self):
+        if self.shm is None:
+            return
+        for channel in CHANNELS:
+            setattr(self, channel, None)
+        self.pool._free(self.shm)
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SharedResultPool:
+    '''
+        Process pool that returns trajectories through shared memory
+        State Variables:
+            Number of Worker Processes = processes
+            Worker Pool = executor (created with make_pool when not given)
+            Blocks currently owned by the pool = blocks {name: SharedMemory}
+
+        Each worker creates one block of exactly the size of its run and returns
+            only its name with the summary dict, so no trajectory is pickled and no
+            memory is reserved for samples a run never records. From then on the
+            parent owns the block and frees it deterministically when its result is
+            released or the pool is closed. A worker that fails or crashes before
+            returning unlinks its block itself (or the resource tracker does).
+
+        Functions:
+            submit(self, params):
+                Runs a parameter dict on the pool, returns a Future of SharedResult
+
+            map(self, param_list):
+                Runs several parameter dicts and returns their SharedResults in order
+
+            close(self):
+                Frees every block still owned by the pool and shuts the workers down
+    '''
+    # Constructor
+    #   - an executor passed in should be created after resource_tracker.ensure_running()
+    def __init__(self, processes: int = None, executor=None):
+        # Start the resource tracker before forking workers: attaching to a block then
+        #   registers it with the same tracker instead of one per worker that would
+        #   unlink (and warn about) blocks the parent still owns
+        resource_tracker.ensure_running()
+        self.owns_executor = executor is None
+        self.executor = executor if executor is not None else make_pool(processes)
+        self.processes = processes
+        self.blocks = {}
+        self.closed = False
+        self.lock = threading.Lock()
+
+    # Take ownership of a block a worker created
+    #   - returns None (and frees the block) when the pool was closed meanwhile
+    def _adopt(self, name: str):
+        shm = SharedMemory(name=name)
+        with self.lock:
+            if not self.closed:
+                self.blocks[name] = shm
+                return shm
+        self._free(shm)
+        return None
+
+    # Free a block; views the caller still holds keep the memory mapped until dropped
+    def _free(self, shm: SharedMemory):
+        with self.lock:
+            self.blocks.pop(shm.name, None)
+        try:
+            shm.close()
+        except BufferError:
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    # Function to run a parameter dict on the pool
+    def submit(self, params: dict):
+        params = resolve_params(params)
+        result = Future()
+        job = self.executor.submit(_run_into_block, params)
+
+        def finished(job):
+            try:
+                summary = job.result()
+                shm = self._adopt(summary.pop("block"))
+                if shm is None:
+                    raise RuntimeError("SharedResultPool was closed before the result arrived")
+            except BaseException as e:
+                # Worker raised or crashed (BrokenProcessPool): it never handed over a block
+                result.set_exception(e)
+                return
+            result.set_result(SharedResult(self, shm, params, summary))
+
+        job.add_done_callback(finished)
+        return result
+
+    # Function to run several parameter dicts and wait for all of them
+    def map(self, param_list: list):
+        futures = [self.submit(params) for params in param_list]
+        return [future.result() for future in futures]
+
+    # Function to free all blocks and shut the pool down
+    def close(self):
+        if self.owns_executor and self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        with self.lock:
+            self.closed = True
+            blocks = list(self.blocks.values())
+        for shm in blocks:
+            self._free(shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
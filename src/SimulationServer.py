@@ -0,0 +1,530 @@
+'''
+    Simulation Server
+
+    Local HTTP/JSON job server, so other tools on the same machine can request
+        trajectories without importing the simulator. Jobs are parameter dicts
+        (see src/batch.py) run on a process pool from make_pool, whose workers
+        are all started and warmed up before the server accepts connections.
+        Small jobs that arrive within batch_window of each other are sent to the
+        pool as one batch, split into one chunk per worker, and identical
+        requests share one job.
+
+    Classes:
+        Job:
+            One queued, running or finished simulation
+
+        SimulationServer:
+            asyncio server with the HTTP endpoints, the batcher and the pool
+
+        SimulationClient:
+            Blocking client for the server
+'''
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import http.client
+import socket
+from collections import OrderedDict
+
+from src.batch import params_key, resolve_params, run_batch, make_pool
+
+# Reason phrases for the status codes the server sends
+HTTP_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class Job:
+    '''
+        Job Class
+        State Variables:
+            Job Identifier = job_id (str)
+            Parameter Hash = key (str)
+            Resolved Simulation Parameters = params (dict)
+            Job Status = status ("queued", "running", "done" or "failed")
+            Simulation Output = result (dict)
+            Error Message = error (str)
+            Process that ran the job = worker (pid)
+            Completion Future = done (asyncio.Future)
+            Timestamps = created, started, finished (s)
+    '''
+    def __init__(self, key: str, params: dict, loop):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.params = params
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.worker = None
+        self.done = loop.create_future()
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    # Function to describe the job without its trajectory
+    def describe(self):
+        info = {"job_id": self.job_id, "status": self.status, "params": self.params}
+        if self.result is not None:
+            info["summary"] = {k: v for k, v in self.result.items()
+                               if k not in ("times", "altitudes", "velocities")}
+        if self.error is not None:
+            info["error"] = self.error
+        if self.worker is not None:
+            info["worker"] = self.worker
+        if self.finished is not None:
+            info["run_time"] = self.finished - self.started
+        return info
+
+
+# Worker side: run a chunk of jobs and report which process ran them
+def _run_chunk(param_list: list):
+    return os.getpid(), run_batch(param_list)
+
+
+class SimulationServer:
+    '''
+        Local Simulation Job Server
+        State Variables:
+            Host and Port to listen on = host, port
+            Unix Socket Path (used instead of host/port when set) = unix_path
+            Number of Worker Processes = processes
+            Time to wait for more small jobs before running a batch = batch_window (s)
+            Maximum Jobs per Batch = max_batch
+            Largest Job (in RK4 steps) that gets batched = small_job_steps
+            Number of Finished Jobs kept for reuse = max_finished
+            Rows per Streamed Chunk = stream_chunk
+
+        HTTP Endpoints:
+            POST /jobs:
+                Submits a parameter dict (or a list of them), returns job ids.
+                Identical requests share one job while it is queued, running or cached
+            POST /simulate:
+                Submits a job and waits for its full result
+            GET /jobs/<id>:
+                Returns the status (and summary once finished) of a job
+            GET /jobs/<id>/result:
+                Waits for a job and returns its full result
+            GET /jobs/<id>/stream:
+                Streams status updates, then the trajectory in chunks, as JSON lines
+            GET /status:
+                Returns queue and pool statistics
+
+        Functions:
+            start(self):
+                Starts the warm process pool, the batcher and the listener
+
+            serve_forever(self):
+                Starts the server and serves until cancelled
+
+            close(self):
+                Stops the listener and shuts the process pool down
+
+            submit(self, params):
+                Queues a job (or returns the identical job already known)
+    '''
+    # Constructor
+    def __init__(   self,
+                    host: str = "127.0.0.1",
+                    port: int = 8765,
+                    unix_path: str = None,
+                    processes: int = None,
+                    batch_window: float = 0.005,
+                    max_batch: int = 32,
+                    small_job_steps: int = 20000,
+                    max_finished: int = 1000,
+                    stream_chunk: int = 1000
+                ):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.processes = processes or os.cpu_count() or 1
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.small_job_steps = small_job_steps
+        self.max_finished = max_finished
+        self.stream_chunk = stream_chunk
+
+        self.jobs = {}
+        self.jobs_by_key = {}
+        self.finished_jobs = OrderedDict()
+        self.stats = {"submitted": 0, "deduplicated": 0, "batches": 0, "batched_jobs": 0}
+
+        self.pool = None
+        self.server = None
+        self.small_jobs = None
+        self.batcher = None
+        self.tasks = set()
+
+    # Function to start the pool, the batcher and the listener
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.pool = await loop.run_in_executor(None, make_pool, self.processes)
+        self.small_jobs = asyncio.Queue()
+        self.batcher = asyncio.create_task(self._batch_loop())
+
+        if self.unix_path:
+            self.server = await asyncio.start_unix_server(self._handle_connection, path=self.unix_path)
+        else:
+            self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+            # Pick up the real port when port 0 was requested
+            self.port = self.server.sockets[0].getsockname()[1]
+
+    # Function to start the server and serve until cancelled
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    # Function to stop the listener and the pool
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.batcher is not None:
+            self.batcher.cancel()
+        for task in list(self.tasks):
+            task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+
+    # Function to queue a job, deduplicating identical requests
+    #   - raises ValueError for invalid parameters before anything is registered
+    def submit(self, params: dict):
+        params = resolve_params(params)
+        key = params_key(params)
+        small = params["T"] / params["dt"] <= self.small_job_steps
+        self.stats["submitted"] += 1
+
+        job = self.jobs_by_key.get(key)
+        if job is not None and job.status != "failed":
+            self.stats["deduplicated"] += 1
+            if job.job_id in self.finished_jobs:
+                self.finished_jobs.move_to_end(job.job_id)
+            return job, True
+
+        job = Job(key, params, asyncio.get_running_loop())
+        self.jobs[job.job_id] = job
+        self.jobs_by_key[key] = job
+
+        if small:
+            self.small_jobs.put_nowait(job)
+        else:
+            self._spawn(self._run_jobs([job]))
+        return job, False
+
+    # Function to keep a reference to a background task
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    # Coalesce small jobs that arrive close together into one pool call
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.small_jobs.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.small_jobs.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._spawn(self._run_jobs(batch))
+
+    # Run a batch of jobs on the pool, one chunk per worker
+    async def _run_jobs(self, batch: list):
+        self.stats["batches"] += 1
+        self.stats["batched_jobs"] += len(batch)
+        n_chunks = min(self.processes, len(batch))
+        chunks = [batch[i::n_chunks] for i in range(n_chunks)]
+        await asyncio.gather(*(self._run_chunk(chunk) for chunk in chunks))
+
+    # Run one chunk of jobs back to back on a pool worker
+    async def _run_chunk(self, chunk: list):
+        loop = asyncio.get_running_loop()
+        started = time.time()
+        for job in chunk:
+            job.status = "running"
+            job.started = started
+
+        try:
+            worker, results = await loop.run_in_executor(self.pool, _run_chunk, [job.params for job in chunk])
+        except Exception as e:
+            worker, results = None, [{"error": f"{type(e).__name__}: {e}"}] * len(chunk)
+
+        finished = time.time()
+        for job, result in zip(chunk, results):
+            job.finished = finished
+            job.worker = worker
+            if "error" in result:
+                job.status = "failed"
+                job.error = result["error"]
+            else:
+                job.status = "done"
+                job.result = result
+            job.done.set_result(None)
+            self._retire(job)
+
+    # Keep finished jobs around for reuse, evicting the oldest ones
+    def _retire(self, job: Job):
+        self.finished_jobs[job.job_id] = job
+        while len(self.finished_jobs) > self.max_finished:
+            _, old = self.finished_jobs.popitem(last=False)
+            self.jobs.pop(old.job_id, None)
+            if self.jobs_by_key.get(old.key) is old:
+                del self.jobs_by_key[old.key]
+
+    # Function to describe the queue and the pool
+    def status(self):
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {"jobs": counts, "processes": self.processes, **self.stats}
+
+    # Read one HTTP request, dispatch it and close the connection
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(" ", 2)
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            body = b""
+            if "content-length" in headers:
+                body = await reader.readexactly(int(headers["content-length"]))
+
+            await self._dispatch(method, target.split("?", 1)[0], body, writer)
+        except Exception as e:
+            try:
+                self._respond(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+            except Exception:
+                pass
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    # Route a request to the matching endpoint
+    async def _dispatch(self, method: str, path: str, body: bytes, writer):
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["status"] and method == "GET":
+            self._respond(writer, 200, self.status())
+            return
+
+        if parts in (["jobs"], ["simulate"]):
+            if method != "POST":
+                self._respond(writer, 405, {"error": "Use POST"})
+                return
+            try:
+                payload = json.loads(body or b"null")
+                requests = payload if isinstance(payload, list) else [payload]
+                if not all(isinstance(params, dict) for params in requests):
+                    raise ValueError("Expected a parameter object or a list of them")
+                # Validate the whole list first so a bad entry queues nothing
+                for params in requests:
+                    resolve_params(params)
+                submitted = [self.submit(params) for params in requests]
+            except ValueError as e:
+                self._respond(writer, 400, {"error": str(e)})
+                return
+
+            if parts == ["simulate"]:
+                await asyncio.gather(*(job.done for job, _ in submitted))
+                output = [self._full_result(job) for job, _ in submitted]
+                self._respond(writer, 200, output if isinstance(payload, list) else output[0])
+                return
+
+            output = [{"job_id": job.job_id, "status": job.status, "deduplicated": dedup}
+                      for job, dedup in submitted]
+            self._respond(writer, 202, output if isinstance(payload, list) else output[0])
+            return
+
+        if len(parts) in (2, 3) and parts[0] == "jobs" and method == "GET":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                self._respond(writer, 404, {"error": f"Unknown job: {parts[1]}"})
+            elif len(parts) == 2:
+                self._respond(writer, 200, job.describe())
+            elif parts[2] == "result":
+                await asyncio.shield(job.done)
+                self._respond(writer, 200, self._full_result(job))
+            elif parts[2] == "stream":
+                await self._stream(job, writer)
+            else:
+                self._respond(writer, 404, {"error": f"Unknown endpoint: {path}"})
+            return
+
+        self._respond(writer, 404, {"error": f"Unknown endpoint: {path}"})
+
+    # Function to build the full response body for a finished job
+    def _full_result(self, job: Job):
+        info = job.describe()
+        if job.result is not None:
+            info["result"] = job.result
+        return info
+
+    # Write a complete JSON response
+    def _respond(self, writer, code: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write((f"HTTP/1.1 {code} {HTTP_REASONS[code]}\r\n"
+                      "Content-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      "Connection: close\r\n\r\n").encode("latin-1") + body)
+
+    # Stream status changes and then the trajectory as chunked JSON lines
+    async def _stream(self, job: Job, writer):
+        writer.write(("HTTP/1.1 200 OK\r\n"
+                      "Content-Type: application/x-ndjson\r\n"
+                      "Transfer-Encoding: chunked\r\n"
+                      "Connection: close\r\n\r\n").encode("latin-1"))
+
+        def send(payload):
+            line = json.dumps(payload).encode("utf-8") + b"\n"
+            writer.write(f"{len(line):x}\r\n".encode("latin-1") + line + b"\r\n")
+
+        last_status = None
+        while not job.done.done():
+            if job.status != last_status:
+                last_status = job.status
+                send({"job_id": job.job_id, "status": job.status})
+                await writer.drain()
+            await asyncio.wait([job.done], timeout=0.05)
+
+        send(job.describe())
+        if job.result is not None:
+            n = len(job.result["times"])
+            for start in range(0, n, self.stream_chunk):
+                stop = start + self.stream_chunk
+                send({"start": start,
+                      "times": job.result["times"][start:stop],
+                      "altitudes": job.result["altitudes"][start:stop],
+                      "velocities": job.result["velocities"][start:stop]})
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    # HTTPConnection that talks to a Unix socket instead of a TCP port
+    def __init__(self, unix_path: str, timeout: float = None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = unix_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class SimulationClient:
+    '''
+        Blocking client for SimulationServer (no numpy needed on the caller side)
+
+        Functions:
+            submit(self, params):
+                Queues a job (or a list of jobs) and returns the job id(s)
+
+            status(self, job_id=None):
+                Returns the status of a job, or of the server when job_id is None
+
+            result(self, job_id):
+                Waits for a job and returns its full result
+
+            simulate(self, params):
+                Runs a job and waits for its full result
+
+            stream(self, job_id):
+                Yields the streamed JSON lines of a job
+    '''
+    # Constructor
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, unix_path: str = None, timeout: float = None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.unix_path:
+            return _UnixHTTPConnection(self.unix_path, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, payload=None):
+        connection = self._connection()
+        try:
+            body = None if payload is None else json.dumps(payload)
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read())
+            if response.status >= 400:
+                raise RuntimeError(data.get("error", f"HTTP {response.status}"))
+            return data
+        finally:
+            connection.close()
+
+    def submit(self, params):
+        return self._request("POST", "/jobs", params)
+
+    def status(self, job_id: str = None):
+        return self._request("GET", "/status" if job_id is None else f"/jobs/{job_id}")
+
+    def result(self, job_id: str):
+        return self._request("GET", f"/jobs/{job_id}/result")
+
+    def simulate(self, params):
+        return self._request("POST", "/simulate", params)
+
+    def stream(self, job_id: str):
+        connection = self._connection()
+        try:
+            connection.request("GET", f"/jobs/{job_id}/stream")
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise RuntimeError(json.loads(response.read()).get("error", f"HTTP {response.status}"))
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            connection.close()
+
+
+# Run the server from the command line:
+#   python -m src.SimulationServer --port 8765
+#   python -m src.SimulationServer --unix /tmp/rocket.sock
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local rocket simulation job server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--batch-window", type=float, default=0.005)
+    args = parser.parse_args()
+
+    server = SimulationServer(args.host, args.port, args.unix, args.processes, args.batch_window)
+    print(f"Serving on {args.unix or f'{args.host}:{args.port}'}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,207 @@
+import os
+import hashlib
+
+import numpy as np
+
+ENGINES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "inc", "engines")
+
+# Compiled curves keyed by the sha256 of the engine file contents
+_curve_cache = {}
+
+class ThrustCurve:
+    '''
+        ThrustCurve Class (measured engine thrust curve)
+        State Variables:
+            Engine Name = name
+            Motor Diameter = diameter (mm)
+            Motor Length = length (mm)
+            Ejection Delays = delays
+            Propellant Mass = propellant_mass (kg)
+            Loaded Motor Mass = total_mass (kg)
+            Manufacturer = manufacturer
+            Measured Points = data_times (s), data_thrusts (N)
+            Burn Time = burn_time (s)
+            Peak Thrust = peak_thrust (N)
+            Total Impulse = total_impulse (N s)
+
+            Uniform Grid Spacing = grid_dt (s)
+            Thrust on the Grid = thrust_table (N)
+            Cumulative Impulse on the Grid = impulse_table (N s)
+            Propellant Mass Flow on the Grid = mass_flow_table (kg/s)
+
+        The measured points are compiled once into uniform-grid tables so every
+            lookup is O(1). Propellant is assumed to burn in proportion to thrust
+            (mass flow = propellant_mass * thrust / total_impulse).
+
+        Functions:
+            thrust(t):
+                Returns the measured thrust at time t (scalar or array)
+
+            impulse(t):
+                Returns the impulse delivered up to time t
+
+            mass_flow(t):
+                Returns the propellant mass flow at time t
+
+            burned_fraction(t, burn_time):
+                Returns the fraction of propellant burned by time t, with time stretched
+                    so that the curve lasts burn_time
+
+            __call__(t, burn_time, max_thrust):
+                Thrust profile interface used by Rocket: the curve is stretched to last
+                    burn_time and scaled by max_thrust / peak_thrust
+    '''
+    # Constructor
+    def __init__(   self,
+                    name: str,
+                    times,
+                    thrusts,
+                    propellant_mass: float,
+                    total_mass: float = 0.0,
+                    diameter: float = 0.0,
+                    length: float = 0.0,
+                    delays: str = "",
+                    manufacturer: str = "",
+                    grid_points: int = 2048
+                ):
+        times = np.asarray(times, dtype=np.float64)
+        thrusts = np.asarray(thrusts, dtype=np.float64)
+        if len(times) == 0 or len(times) != len(thrusts):
+            raise ValueError(f"Thrust curve {name} needs matching time and thrust points")
+        if np.any(np.diff(times) <= 0) or times[0] < 0:
+            raise ValueError(f"Thrust curve {name} times must be positive and increasing")
+
+        # Curves implicitly start from zero thrust at t = 0
+        if times[0] > 0:
+            times = np.insert(times, 0, 0.0)
+            thrusts = np.insert(thrusts, 0, 0.0)
+
+        self.name = name
+        self.diameter = np.float64(diameter)
+        self.length = np.float64(length)
+        self.delays = delays
+        self.propellant_mass = np.float64(propellant_mass)
+        self.total_mass = np.float64(total_mass)
+        self.manufacturer = manufacturer
+        self.data_times = times
+        self.data_thrusts = thrusts
+        self.burn_time = np.float64(times[-1])
+        self.peak_thrust = np.float64(np.max(thrusts))
+
+        # Compile the uniform-grid tables
+        self.grid_dt = self.burn_time / (grid_points - 1)
+        grid = np.linspace(0.0, self.burn_time, grid_points)
+        self.thrust_table = np.interp(grid, times, thrusts)
+        self.impulse_table = np.concatenate(([0.0], np.cumsum(
+            0.5 * (self.thrust_table[1:] + self.thrust_table[:-1]) * self.grid_dt)))
+        self.total_impulse = np.float64(self.impulse_table[-1])
+        if self.total_impulse > 0:
+            self.mass_flow_table = self.propellant_mass * self.thrust_table / self.total_impulse
+        else:
+            self.mass_flow_table = np.zeros_like(self.thrust_table)
+
+    # O(1) linear lookup into a grid table, zero before ignition and `after` past burnout
+    def _lookup(self, table, t, after: float):
+        if np.ndim(t) == 0:
+            if t <= 0.0:
+                return 0.0
+            x = t / self.grid_dt
+            i = int(x)
+            if i >= len(table) - 1:
+                return after
+            return table[i] + (x - i) * (table[i + 1] - table[i])
+
+        t = np.asarray(t, dtype=np.float64)
+        x = np.clip(t / self.grid_dt, 0.0, len(table) - 1)
+        i = np.minimum(x.astype(np.intp), len(table) - 2)
+        values = table[i] + (x - i) * (table[i + 1] - table[i])
+        values = np.where(t <= 0.0, 0.0, values)
+        return np.where(t >= self.burn_time, after, values)
+
+    def thrust(self, t):
+        return self._lookup(self.thrust_table, t, 0.0)
+
+    def impulse(self, t):
+        return self._lookup(self.impulse_table, t, self.total_impulse)
+
+    def mass_flow(self, t):
+        return self._lookup(self.mass_flow_table, t, 0.0)
+
+    # Function to get the fraction of propellant burned, stretched to last burn_time
+    def burned_fraction(self, t, burn_time: float):
+        if self.total_impulse <= 0:
+            return 0.0
+        return self.impulse(t * (self.burn_time / burn_time)) / self.total_impulse
+
+    # Thrust profile interface: (t, burn_time, max_thrust) like inc/thrust_profiles.py
+    def __call__(self, t, burn_time: float, max_thrust: float):
+        return self.thrust(t * (self.burn_time / burn_time)) * (max_thrust / self.peak_thrust)
+
+    def __repr__(self):
+        return (f"ThrustCurve({self.name!r}, burn_time={self.burn_time:.3f}s, "
+                f"peak={self.peak_thrust:.1f}N, impulse={self.total_impulse:.2f}Ns)")
+
+
+# Function to parse the text of a RASP (.eng) engine file
+def parse_eng(text: str, grid_points: int = 2048):
+    header = None
+    times = []
+    thrusts = []
+    for raw_line in text.splitlines():
+        line = raw_line.split(";", 1)[0].strip()
+        if not line:
+            continue
+        fields = line.split()
+        if header is None:
+            if len(fields) < 7:
+                raise ValueError(f"Malformed .eng header: {raw_line!r}")
+            header = fields
+            continue
+        if len(fields) < 2:
+            raise ValueError(f"Malformed .eng data line: {raw_line!r}")
+        times.append(float(fields[0]))
+        thrusts.append(float(fields[1]))
+        # The curve ends at the first zero thrust point after ignition
+        if thrusts[-1] == 0.0 and times[-1] > 0.0:
+            break
+
+    if header is None:
+        raise ValueError("No engine header found in .eng data")
+    name, diameter, length, delays, propellant_mass, total_mass = header[:6]
+    return ThrustCurve(name, times, thrusts,
+                       propellant_mass=float(propellant_mass),
+                       total_mass=float(total_mass),
+                       diameter=float(diameter),
+                       length=float(length),
+                       delays=delays,
+                       manufacturer=" ".join(header[6:]),
+                       grid_points=grid_points)
+
+
+# Function to load (and cache) an engine file
+#   - the cache is keyed by file contents, so edited files are recompiled
+def load_thrust_curve(path: str, grid_points: int = 2048):
+    with open(path, "rb") as f:
+        data = f.read()
+    key = (hashlib.sha256(data).hexdigest(), grid_points)
+    if key not in _curve_cache:
+        curve = parse_eng(data.decode("utf-8", errors="replace"), grid_points)
+        # Curves are referenced by file name (inc/engines/<name>.eng)
+        curve.name = os.path.splitext(os.path.basename(path))[0]
+        _curve_cache[key] = curve
+    return _curve_cache[key]
+
+
+# Function to list the engine curves shipped in inc/engines
+def available_thrust_curves(engines_dir: str = ENGINES_DIR):
+    if not os.path.isdir(engines_dir):
+        return []
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(engines_dir) if f.lower().endswith(".eng"))
+
+
+# Function to load an engine curve by name from inc/engines
+def find_thrust_curve(name: str, engines_dir: str = ENGINES_DIR):
+    path = os.path.join(engines_dir, f"{name}.eng")
+    if not os.path.exists(path):
+        raise ValueError(f"Unknown thrust profile or engine curve: {name}")
+    return load_thrust_curve(path)
@@ -0,0 +1,200 @@
+from functools import cached_property
+
+import numpy as np
+
+from src.ThrustCurve import ThrustCurve
+
+# Derived channels, recomputed from the stored arrays on first access
+CHANNELS = ("thrust", "drag", "mass", "air_density", "dynamic_pressure", "acceleration", "mach")
+
+class Trajectory:
+    '''
+        Trajectory Class (result of RocketSimulation.run)
+        State Variables:
+            Step Boundary Times = times (s)
+            Altitudes at the Boundaries = altitudes (m)
+            Velocities at the Boundaries = velocities (m/s)
+            Accelerations at the Boundaries = accelerations (m/s^2)
+            Simulation that produced it = sim
+            Masses g() used at the Samples = masses (kg, recorded by the run)
+            Phases of a phased run = phases [(name, t_start, t_end)]
+
+            Derived Channels at the Samples (need sim, computed and cached on first access) =
+                thrust (N), drag (N), mass (kg), air_density (kg/m^3),
+                dynamic_pressure (Pa), acceleration (m/s^2), mach (unitless)
+
+        Dense output uses cubic Hermite interpolation on each step: altitude is
+            interpolated from (h, v) at both ends and velocity from (v, a), so no
+            rerun is needed to evaluate the flight between the stored samples.
+            Steps do not have to be uniform.
+
+        The derived channels are the values g() used at the start of each step,
+            recomputed vectorized so run() does not have to record them. Only the
+            mass is recorded, because fuel_status decrements it per call and its
+            history depends on every step size the run used (resumed runs with a
+            dt override, phased runs with a coast_dt). Without recorded masses
+            only a ThrustCurve rocket has a mass channel (from the burned impulse).
+
+        Functions:
+            __call__(self, t):
+                Returns altitude and velocity at the given time(s)
+
+            altitude(self, t):
+                Returns altitude at the given time(s)
+
+            velocity(self, t):
+                Returns velocity at the given time(s)
+
+            resample(self, dt, t_start, t_end):
+                Returns times, altitudes and velocities on a uniform grid
+
+            channel(self, name):
+                Returns a derived channel by name (see CHANNELS)
+    '''
+    # Constructor
+    def __init__(   self,
+                    times,
+                    altitudes,
+                    velocities,
+                    accelerations,
+                    sim=None,
+                    masses=None
+                ):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.altitudes = np.asarray(altitudes, dtype=np.float64)
+        self.velocities = np.asarray(velocities, dtype=np.float64)
+        self.accelerations = np.asarray(accelerations, dtype=np.float64)
+        self.sim = sim
+        self.masses = np.asarray(masses, dtype=np.float64) if masses is not None else None
+        self.phases = list(sim.phases) if sim is not None else []
+
+        if not (len(self.times) == len(self.altitudes) == len(self.velocities) == len(self.accelerations)):
+            raise ValueError("Trajectory arrays must all have the same length")
+        if self.masses is not None and len(self.masses) != len(self.times):
+            raise ValueError("Trajectory arrays must all have the same length")
+
+    def __len__(self):
+        return len(self.times)
+
+    # Function to locate the step containing each query time (binary search)
+    def _locate(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        n = len(self.times)
+        if n == 0:
+            raise ValueError("Trajectory is empty")
+        if n == 1:
+            return t, np.zeros(t.shape, dtype=np.intp), np.zeros(t.shape), np.ones(t.shape)
+
+        i = np.searchsorted(self.times, t, side="right") - 1
+        i = np.clip(i, 0, n - 2)
+        width = self.times[i + 1] - self.times[i]
+        s = (t - self.times[i]) / width
+        return t, i, s, width
+
+    # Cubic Hermite blend of values y with slopes dy at the step ends
+    def _hermite(self, i, s, width, y, dy):
+        if len(y) == 1:
+            return np.full(s.shape, y[0])
+        s2 = s * s
+        s3 = s2 * s
+        h00 = 2 * s3 - 3 * s2 + 1
+        h10 = s3 - 2 * s2 + s
+        h01 = -2 * s3 + 3 * s2
+        h11 = s3 - s2
+        return h00 * y[i] + h10 * width * dy[i] + h01 * y[i + 1] + h11 * width * dy[i + 1]
+
+    # Function to evaluate altitude and velocity at arbitrary time(s)
+    #   - times outside the simulated interval return nan
+    def __call__(self, t):
+        t, i, s, width = self._locate(t)
+        h = self._hermite(i, s, width, self.altitudes, self.velocities)
+        v = self._hermite(i, s, width, self.velocities, self.accelerations)
+
+        outside = (t < self.times[0]) | (t > self.times[-1])
+        if np.any(outside):
+            h = np.where(outside, np.nan, h)
+            v = np.where(outside, np.nan, v)
+        return h, v
+
+    def altitude(self, t):
+        return self(t)[0]
+
+    def velocity(self, t):
+        return self(t)[1]
+
+    # Function to resample the trajectory on a uniform time grid
+    def resample(self, dt: float, t_start: float = None, t_end: float = None):
+        t_start = self.times[0] if t_start is None else t_start
+        t_end = self.times[-1] if t_end is None else t_end
+        t_grid = t_start + dt * np.arange(int(np.floor((t_end - t_start) / dt + 1e-9)) + 1)
+        # The tolerance keeps a last point that rounding put just past t_end
+        t_grid = np.minimum(t_grid, t_end)
+        h, v = self(t_grid)
+        return t_grid, h, v
+
+    def _require_sim(self):
+        if self.sim is None:
+            raise ValueError("Derived channels need the simulation that produced the trajectory")
+        return self.sim
+
+    # Function to get a derived channel by name
+    def channel(self, name: str):
+        if name not in CHANNELS:
+            raise ValueError(f"Unknown channel: {name}")
+        return getattr(self, name)
+
+    # Thrust of the engine profile at every sample
+    #   - plain Python profiles that only take scalars are evaluated sample by sample
+    @cached_property
+    def thrust(self):
+        rocket = self._require_sim().rocket
+        profile = rocket.thrust_profile
+        try:
+            thrust = np.asarray(profile(self.times, rocket.burn_time, rocket.thrust), dtype=np.float64)
+            if thrust.shape != self.times.shape:
+                raise ValueError("profile did not return one value per time")
+        except (TypeError, ValueError):
+            thrust = np.array([profile(t, rocket.burn_time, rocket.thrust) for t in self.times],
+                              dtype=np.float64)
+        if self.phases:
+            # Phased runs switch the engine off after the powered phase (see src/phases.py)
+            starts = np.array([start for _, start, _ in self.phases])
+            names = np.array([name for name, _, _ in self.phases])
+            phase = names[np.maximum(np.searchsorted(starts, self.times, side="right") - 1, 0)]
+            thrust = np.where(phase == "powered", thrust, 0.0)
+        return thrust
+
+    # Mass recorded by the run (the burned impulse of a ThrustCurve when none was recorded)
+    @cached_property
+    def mass(self):
+        if self.masses is not None:
+            return self.masses
+        rocket = self._require_sim().rocket
+        if isinstance(rocket.thrust_profile, ThrustCurve):
+            burned = rocket.thrust_profile.burned_fraction(self.times, rocket.burn_time)
+            return rocket.dry_mass + rocket.fuel_mass * (1.0 - burned)
+        raise ValueError("The mass channel needs the masses recorded by the run")
+
+    @cached_property
+    def air_density(self):
+        return self._require_sim().air_density_array(self.altitudes)
+
+    @cached_property
+    def mach(self):
+        return np.abs(self.velocities) / self._require_sim().speed_of_sound(self.altitudes)
+
+    @cached_property
+    def dynamic_pressure(self):
+        return 0.5 * self.air_density * self.velocities**2
+
+    # Drag force as RocketSimulation.drag computes it (C_D from the drag table when there is one)
+    @cached_property
+    def drag(self):
+        rocket = self._require_sim().rocket
+        C_D = rocket.drag_table(self.mach) if rocket.drag_table is not None else rocket.C_D
+        return self.dynamic_pressure * C_D * rocket.A
+
+    # Net acceleration as g() computes it
+    @cached_property
+    def acceleration(self):
+        return (self.thrust - self.mass * self.sim.G - self.drag) / self.mass
@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import threading
+import multiprocessing
+
+from src.batch import resolve_params, run_batch
+
+# Subdirectories of the queue root
+QUEUE_DIRS = ("pending", "claimed", "done", "results", "tmp")
+
+
+class WorkQueue:
+    '''
+        Work queue backed by a shared directory (no broker)
+        State Variables:
+            Queue Root = root, with the subdirectories
+                pending/    tasks waiting for a worker         <task_id>.json
+                claimed/    tasks a worker is running          <task_id>@<worker_id>.json
+                done/       finished tasks                     <task_id>.json
+                results/    run summaries of finished tasks    <task_id>.json
+                tmp/        files being written
+
+        A task is a batch of parameter dicts. Every state change is a single
+            os.rename, which is atomic on one file system: of several workers
+            renaming the same pending file only one succeeds, and files are
+            written to tmp/ first so nobody reads a partial file. A worker
+            heartbeats its claim by touching the file (mtime); a claim whose mtime
+            is older than stale_after is renamed back to pending/ by any worker.
+
+        Runs are deterministic, so a task finished twice (a slow worker whose claim
+            was reclaimed) writes the same results again. Hosts must share the
+            directory and roughly agree on the time: keep stale_after well above
+            both the heartbeat interval and the clock skew.
+
+        Functions:
+            submit(self, param_list, batch_size, include_trajectory):
+                Writes the parameter sets as tasks, returns their ids
+
+            claim(self, worker_id):
+                Moves one pending task to claimed/, returns (claim_path, task) or None
+
+            heartbeat(self, claim_path):
+                Touches a claim, returns False when it was reclaimed
+
+            complete(self, claim_path, results):
+                Writes the results of a claimed task and moves it to done/
+
+            reclaim_stale(self, stale_after):
+                Moves claims without a recent heartbeat back to pending/
+
+            work(self, worker_id, heartbeat_interval, stale_after, poll_interval, exit_when_empty, max_tasks):
+                Worker loop: reclaims, claims, runs and completes tasks
+
+            status(self):
+                Number of pending, claimed and done tasks
+
+            results(self, task_ids):
+                Run summaries of finished tasks, in order (None while unfinished)
+
+            wait(self, task_ids, timeout, poll_interval):
+                Waits until the tasks are done, returns their results
+    '''
+    # Constructor
+    def __init__(self, root: str):
+        self.root = root
+        for name in QUEUE_DIRS:
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def _path(self, directory: str, name: str):
+        return os.path.join(self.root, directory, name)
+
+    # Write a JSON file into tmp/ and rename it into place
+    def _write(self, directory: str, name: str, data):
+        tmp = self._path("tmp", f"{uuid.uuid4().hex}.json")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(directory, name))
+
+    # Function to queue parameter sets as tasks of batch_size runs each
+    #   - parameters are resolved here, so bad entries fail before reaching a worker
+    def submit(self, param_list: list, batch_size: int = 50, include_trajectory: bool = False):
+        param_list = [resolve_params(params) for params in param_list]
+        task_ids = []
+        for start in range(0, len(param_list), batch_size):
+            # Time prefix: workers claim tasks in submission order
+            task_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+            self._write("pending", f"{task_id}.json",
+                        {"task_id": task_id, "params": param_list[start:start + batch_size],
+                         "include_trajectory": include_trajectory})
+            task_ids.append(task_id)
+        return task_ids
+
+    # Function to claim the oldest pending task
+    def claim(self, worker_id: str):
+        for name in sorted(os.listdir(self._path("pending", ""))):
+            if not name.endswith(".json"):
+                continue
+            task_id = name[:-len(".json")]
+            claim_path = self._path("claimed", f"{task_id}@{worker_id}.json")
+            try:
+                # The rename keeps the mtime, so touch the pending file first: the
+                # claim appears with a fresh heartbeat and reclaim_stale cannot
+                # take it back before this worker has read it
+                os.utime(self._path("pending", name))
+                os.rename(self._path("pending", name), claim_path)
+                with open(claim_path, "r") as f:
+                    return claim_path, json.load(f)
+            except FileNotFoundError:
+                # Another worker got there first (or requeued it already)
+                continue
+        return None
+
+    # Function to heartbeat a claim
+    def heartbeat(self, claim_path: str):
+        try:
+            os.utime(claim_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    # Function to finish a claimed task
+    #   - returns False (and drops the results) when the claim was reclaimed meanwhile
+    def complete(self, claim_path: str, results: list):
+        task_id = os.path.basename(claim_path).split("@")[0]
+        if not os.path.exists(claim_path):
+            return False
+        self._write("results", f"{task_id}.json", results)
+        try:
+            os.rename(claim_path, self._path("done", f"{task_id}.json"))
+            return True
+        except FileNotFoundError:
+            return False
+
+    # Function to requeue claims whose worker stopped heartbeating
+    #   - returns the ids of the requeued tasks
+    def reclaim_stale(self, stale_after: float = 60.0):
+        now = time.time()
+        requeued = []
+        for name in os.listdir(self._path("claimed", "")):
+            claim_path = self._path("claimed", name)
+            try:
+                if now - os.stat(claim_path).st_mtime < stale_after:
+                    continue
+                task_id = name.split("@")[0]
+                os.rename(claim_path, self._path("pending", f"{task_id}.json"))
+                requeued.append(task_id)
+            except FileNotFoundError:
+                continue
+        return requeued
+
+    # Function to run tasks until the queue is empty (or forever)
+    #   - a background thread heartbeats the claim while the task runs
+    #   - exit_when_empty stops once nothing is pending or claimed by others
+    #   - returns the number of tasks this worker completed
+    def work(self, worker_id: str = None, heartbeat_interval: float = 10.0, stale_after: float = 60.0,
+             poll_interval: float = 1.0, exit_when_empty: bool = True, max_tasks: int = None):
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        completed = 0
+        while max_tasks is None or completed < max_tasks:
+            self.reclaim_stale(stale_after)
+            claimed = self.claim(worker_id)
+            if claimed is None:
+                counts = self.status()
+                if exit_when_empty and counts["pending"] == 0 and counts["claimed"] == 0:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            claim_path, task = claimed
+            stop = threading.Event()
+
+            def beat():
+                while not stop.wait(heartbeat_interval):
+                    if not self.heartbeat(claim_path):
+                        return
+
+            heart = threading.Thread(target=beat, daemon=True)
+            heart.start()
+            try:
+                results = run_batch(task["params"], task.get("include_trajectory", False))
+            finally:
+                stop.set()
+                heart.join()
+            self.complete(claim_path, results)
+            completed += 1
+        return completed
+
+    # Function to count the tasks in each state
+    def status(self):
+        return {name: sum(1 for f in os.listdir(self._path(name, "")) if f.endswith(".json"))
+                for name in ("pending", "claimed", "done")}
+
+    # Function to collect the results of tasks
+    def results(self, task_ids: list):
+        collected = []
+        for task_id in task_ids:
+            try:
+                with open(self._path("results", f"{task_id}.json"), "r") as f:
+                    collected.append(json.load(f))
+            except FileNotFoundError:
+                collected.append(None)
+        return collected
+
+    # Function to wait for tasks to finish and return their results
+    #   - raises TimeoutError when timeout (s) passes first
+    def wait(self, task_ids: list, timeout: float = None, poll_interval: float = 0.5):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            done = [os.path.exists(self._path("done", f"{task_id}.json")) for task_id in task_ids]
+            if all(done):
+                return self.results(task_ids)
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"{done.count(False)} of {len(task_ids)} tasks unfinished")
+            time.sleep(poll_interval)
+
+
+def _work(root: str, options: dict):
+    WorkQueue(root).work(**options)
+
+
+# Function to start worker processes on this machine (e.g. for testing)
+#   - returns the started multiprocessing.Process objects
+def start_local_workers(root: str, processes: int = None, **work_options):
+    workers = []
+    for _ in range(processes or os.cpu_count() or 1):
+        worker = multiprocessing.Process(target=_work, args=(root, work_options))
+        worker.start()
+        workers.append(worker)
+    return workers
+
+
+# Run a worker from the command line (one per core on every host sharing the directory):
+#   python -m src.WorkQueue /shared/rocket_queue
+#   python -m src.WorkQueue /shared/rocket_queue --processes 4 --forever
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rocket simulation work queue worker")
+    parser.add_argument("root", help="Shared queue directory")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--heartbeat", type=float, default=10.0)
+    parser.add_argument("--stale-after", type=float, default=60.0)
+    parser.add_argument("--forever", action="store_true", help="Keep polling when the queue is empty")
+    args = parser.parse_args()
+
+    options = {"heartbeat_interval": args.heartbeat, "stale_after": args.stale_after,
+               "exit_when_empty": not args.forever}
+    workers = start_local_workers(args.root, args.processes, **options)
+    print(f"{len(workers)} worker(s) on {args.root}", file=sys.stderr)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
@@ -8,6 +8,12 @@
 
         plot_convergence(dt_values, E_h_arr, E_v_arr):
             Displays the log-log plots of altitude error and velocity error
+
+        pilot_quantity(make_sim, dt, quantity, pilot_T):
+            Runs one pilot simulation and returns its apogee or final (h, v)
+
+        select_dt(make_sim, tolerance, quantity, ...):
+            Picks the largest step size whose estimated error meets the tolerance
 '''
 import numpy as np
 import matplotlib.pyplot as plt
@@ -81,3 +87,126 @@ def plot_convergence(dt_values: list, E_h_arr: list, E_v_arr: list):
 
     plt.tight_layout()
     plt.show()
+
+
+# Round a step size down to 1, 2 or 5 times a power of ten
+def _nice_dt(dt: float):
+    scale = 10.0 ** np.floor(np.log10(dt))
+    for step in (5.0, 2.0, 1.0):
+        if step * scale <= dt * (1 + 1e-12):
+            return float(step * scale)
+    return float(scale)
+
+
+# Function to run a pilot simulation and measure the quantity the tolerance applies to
+#   - "apogee": maximum altitude, refined on the dense output around the highest sample
+#   - "state": (altitude, velocity) at pilot_T, read from the dense output
+def pilot_quantity(make_sim, dt: float, quantity: str = "apogee", pilot_T: float = None):
+    return _measure(_pilot_run(make_sim, dt, pilot_T), dt, quantity)
+
+
+def _pilot_run(make_sim, dt: float, pilot_T: float = None):
+    sim = make_sim(dt)
+    sim.verbose = False
+    if pilot_T is not None:
+        sim.T = np.float64(pilot_T)
+    sim.run()
+    if len(sim.times) < 2:
+        raise ValueError(f"Pilot run with dt = {dt:g} s stopped after {len(sim.times)} steps")
+    return sim
+
+
+def _measure(sim, dt: float, quantity: str):
+    if quantity == "apogee":
+        i = int(np.argmax(sim.altitudes))
+        t_local = np.linspace(max(sim.times[0], sim.times[i] - dt), min(sim.times[-1], sim.times[i] + dt), 201)
+        return np.array([np.max(sim.result.altitude(t_local))])
+    if quantity == "state":
+        t_end = min(sim.T, sim.times[-1])
+        return np.array(sim.result(t_end), dtype=np.float64)
+    raise ValueError(f"Unknown quantity: {quantity}")
+
+
+# Function to pick the largest step size meeting a tolerance
+#   - make_sim(dt) must return a fresh RocketSimulation (rockets are stateful)
+#   - tolerance is in metres for "apogee", or metres / (m/s) for "state" (altitude and
+#     velocity at pilot_T, default twice the burn time)
+#   - for "apogee" only the coarsest pilot runs to T; the other runs stop shortly after
+#     its apogee unless pilot_T is given
+#   - pilot runs at dt_start, dt_start / 2 and dt_start / 4 give the observed order p
+#     and error constant C of the Richardson model  error(dt) = C dt^p
+#   - the pick stays within [dt_min, dt_max]; "verified" is False when the last step
+#     checked (at most max_attempts halvings, down to dt_min) still misses the tolerance
+#     (e.g. the per-step fuel bookkeeping limits how far errors drop); "estimated_error"
+#     is always the error of the returned dt
+def select_dt(make_sim, tolerance: float, quantity: str = "apogee", dt_start: float = None,
+              pilot_T: float = None, safety: float = 0.5, dt_max: float = 1.0,
+              dt_min: float = 1e-4, verify: bool = True, max_attempts: int = 4):
+    probe = make_sim(0.01)
+    if quantity == "state" and pilot_T is None:
+        pilot_T = min(float(probe.T), 2.0 * float(probe.rocket.burn_time))
+    span = float(pilot_T if pilot_T is not None else probe.T)
+    # Steps longer than a fifth of the burn skip over the thrust curve
+    dt_max = min(dt_max, float(probe.rocket.burn_time) / 5.0)
+    if dt_start is None:
+        # A few hundred steps over the pilot window, but resolve the burn
+        dt_start = min(span / 200.0, float(probe.rocket.burn_time) / 10.0, dt_max)
+
+    dts = [dt_start, dt_start / 2.0, dt_start / 4.0]
+    if quantity == "apogee" and pilot_T is None:
+        # Past the apogee the rest of the flight does not change it
+        coarse_sim = _pilot_run(make_sim, dts[0])
+        values = [_measure(coarse_sim, dts[0], quantity)]
+        t_apogee = coarse_sim.times[int(np.argmax(coarse_sim.altitudes))]
+        pilot_T = min(float(probe.T), 1.1 * t_apogee + 4.0 * dts[0])
+    else:
+        values = [pilot_quantity(make_sim, dts[0], quantity, pilot_T)]
+    values += [pilot_quantity(make_sim, dt, quantity, pilot_T) for dt in dts[1:]]
+    d_1 = np.abs(values[0] - values[1])
+    d_2 = np.abs(values[1] - values[2])
+    eps = 1e-12 * np.maximum(np.abs(values[2]), 1.0)
+
+    dt_needed = np.inf
+    orders = []
+    constants = []
+    for j in range(len(d_1)):
+        if d_1[j] <= eps[j] and d_2[j] <= eps[j]:
+            # Already converged to round-off at the coarsest pilot step
+            orders.append(np.nan)
+            constants.append(0.0)
+            continue
+        p = np.log2(max(d_1[j], eps[j]) / max(d_2[j], eps[j]))
+        p = float(np.clip(p, 0.5, 6.0))
+        # Error of the dt/4 run from the difference to the dt/2 run
+        error_fine = d_2[j] / (2**p - 1)
+        C = error_fine / dts[2]**p
+        orders.append(p)
+        constants.append(float(C))
+        dt_needed = min(dt_needed, (tolerance / C) ** (1.0 / p) if C > 0 else np.inf)
+
+    dt = _nice_dt(min(dt_max, max(dt_min, safety * dt_needed)))
+    finite = [p for p in orders if not np.isnan(p)]
+    result = {
+        "dt": dt,
+        "order": min(finite) if finite else np.nan,
+        "constant": max(constants),
+        "estimated_error": float(max(C * dt**p for C, p in zip(constants, orders) if not np.isnan(p)))
+                           if finite else 0.0,
+        "pilot": [(float(pilot_dt), value.tolist()) for pilot_dt, value in zip(dts, values)],
+        "pilot_T": pilot_T,
+        "verified": None
+    }
+
+    # Check the pick against a run at half the step, halving it if the model was optimistic
+    #   - only a step that was checked is returned
+    if verify:
+        for attempt in range(max_attempts):
+            coarse = pilot_quantity(make_sim, dt, quantity, pilot_T)
+            fine = pilot_quantity(make_sim, dt / 2.0, quantity, pilot_T)
+            p = result["order"] if finite else 4.0
+            error = float(np.max(np.abs(coarse - fine)) * 2**p / (2**p - 1))
+            result.update(dt=dt, estimated_error=error, verified=error <= tolerance)
+            if error <= tolerance or dt <= dt_min or attempt == max_attempts - 1:
+                break
+            dt = max(dt_min, _nice_dt(dt / 2.0 * (1 - 1e-9)))
+    return result
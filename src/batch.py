@@ -0,0 +1,241 @@
+'''
+    Batch Execution Functions
+
+    Simulations are described by plain parameter dicts so they can be hashed,
+        sent to worker processes and stored as JSON. Any field left out falls
+        back to SIM_DEFAULTS, and a "preset" key pulls the rocket fields from
+        inc/rocket_presets.json. An optional "C_D_mach" entry (a table name in
+        inc/drag, a file path or a list of [Mach, C_D] points) replaces the
+        constant C_D; set it to None to fly a preset with its constant C_D.
+
+    Functions:
+        load_presets(json_file):
+            Loads the preset rocket configurations from a JSON file
+
+        resolve_params(params):
+            Fills in preset and default values for a parameter dict, raises ValueError
+                for non-numeric or non-finite values and a non-positive dt or T
+
+        params_key(params):
+            Returns a stable hash of a resolved parameter dict
+
+        simulation_from_params(params):
+            Builds a fresh Rocket and RocketSimulation from a parameter dict
+
+        params_from_simulation(sim):
+            Recovers a parameter dict from an existing simulation (see src/checkpoint.py)
+
+        summarize(sim):
+            Returns the apogee, max velocity and flight time of a finished run
+
+        run_params(params, include_trajectory):
+            Runs one simulation and returns its summary (and trajectory)
+
+        run_batch(param_list, include_trajectory):
+            Runs several simulations back to back in the calling process
+
+        make_pool(processes):
+            Creates a process pool whose workers are already warmed up
+
+        run_pool(param_list, processes, include_trajectory, pool, chunk_size, runner):
+            Runs many simulations on a process pool in chunks, keeping the input order
+'''
+import os
+import json
+import math
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from src.Rocket import Rocket
+from src.RocketSimulation import RocketSimulation
+from src.checkpoint import params_from_simulation
+from src.DragTable import load_drag_table
+from inc.thrust_profiles import resolve_thrust_profile
+
+PRESETS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "inc", "rocket_presets.json")
+
+ROCKET_FIELDS = ("m", "thrust", "burn_time", "fuel_mass", "C_D", "A")
+
+# Simulation settings used when a parameter dict leaves them out (same as the GUI)
+SIM_DEFAULTS = {
+    "h_0": 0.0,
+    "v_0": 0.0,
+    "theta": 90.0,
+    "temp": 288.15,
+    "pressure": 101325.0,
+    "dt": 0.01,
+    "T": 300.0,
+    "thrust_profile": "linear"
+}
+
+_presets = None
+
+
+# Function to load presets from JSON
+def load_presets(json_file=PRESETS_FILE):
+    with open(json_file, "r") as f:
+        presets = json.load(f)
+    return presets
+
+
+# Function to fill in preset and default values for a parameter dict
+def resolve_params(params: dict):
+    global _presets
+    resolved = dict(SIM_DEFAULTS)
+
+    preset_name = params.get("preset")
+    if preset_name is not None:
+        if _presets is None:
+            _presets = load_presets()
+        if preset_name not in _presets:
+            raise ValueError(f"Unknown preset: {preset_name}")
+        resolved.update(_presets[preset_name])
+
+    resolved.update({key: value for key, value in params.items() if key != "preset"})
+
+    missing = [field for field in ROCKET_FIELDS if field not in resolved]
+    if missing:
+        raise ValueError(f"Missing rocket parameters: {', '.join(missing)}")
+    # Raises ValueError for names that are neither formulas nor engine files
+    resolve_thrust_profile(resolved["thrust_profile"])
+    if resolved.get("C_D_mach") is None:
+        resolved.pop("C_D_mach", None)
+    else:
+        # Raises ValueError for unknown or malformed drag tables
+        load_drag_table(resolved["C_D_mach"])
+
+    # Cast numeric fields so that equal requests hash equally
+    for key, value in resolved.items():
+        if key not in ("thrust_profile", "C_D_mach"):
+            try:
+                resolved[key] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Parameter {key} must be a number, got {value!r}") from None
+            if not math.isfinite(resolved[key]):
+                raise ValueError(f"Parameter {key} must be finite, got {value!r}")
+    # The run loop divides by dt and T bounds it
+    for key in ("dt", "T"):
+        if resolved[key] <= 0:
+            raise ValueError(f"Parameter {key} must be positive, got {resolved[key]!r}")
+    return resolved
+
+
+# Function to hash a parameter dict (used to dedupe identical jobs)
+def params_key(params: dict):
+    encoded = json.dumps(resolve_params(params), sort_keys=True)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+# Function to build a fresh rocket and simulator from a parameter dict
+#   - Rocket objects are stateful (fuel_status changes the mass), so every run needs its own
+def simulation_from_params(params: dict, verbose: bool = False):
+    p = resolve_params(params)
+    drag_table = load_drag_table(p["C_D_mach"]) if "C_D_mach" in p else None
+    rocket = Rocket(p["m"], p["thrust"], p["burn_time"], p["fuel_mass"], p["C_D"], p["A"],
+                    thrust_profile=resolve_thrust_profile(p["thrust_profile"]), drag_table=drag_table)
+    return RocketSimulation(rocket, p["h_0"], p["v_0"], p["theta"], p["temp"], p["pressure"],
+                            p["dt"], p["T"], verbose=verbose)
+
+
+# Function to summarize a finished run
+def summarize(sim: RocketSimulation):
+    if not sim.times:
+        return {"apogee": None, "max_velocity": None, "flight_time": 0.0, "steps": 0,
+                "stop_reason": sim.stop_reason}
+    return {
+        "apogee": float(max(sim.altitudes)),
+        "max_velocity": float(max(sim.velocities)),
+        "flight_time": float(sim.times[-1]),
+        "steps": len(sim.times),
+        "stop_reason": sim.stop_reason
+    }
+
+
+# Function to run a single simulation from a parameter dict
+def run_params(params: dict, include_trajectory: bool = True):
+    sim = simulation_from_params(params)
+    sim.run()
+
+    result = summarize(sim)
+    if include_trajectory:
+        result["times"] = [float(t) for t in sim.times]
+        result["altitudes"] = [float(h) for h in sim.altitudes]
+        result["velocities"] = [float(v) for v in sim.velocities]
+    return result
+
+
+# Function to run a list of simulations in the current process
+#   - a failing entry reports its error instead of aborting the whole batch
+def run_batch(param_list: list, include_trajectory: bool = True):
+    results = []
+    for params in param_list:
+        try:
+            results.append(run_params(params, include_trajectory))
+        except Exception as e:
+            results.append({"error": f"{type(e).__name__}: {e}"})
+    return results
+
+
+# Worker initializer: import and exercise the simulation code once, then wait
+#   until every other worker of the pool has done the same
+def _warm_worker(barrier=None, timeout: float = None):
+    sim = simulation_from_params({"m": 1.0, "thrust": 20.0, "burn_time": 0.1, "fuel_mass": 0.01,
+                                  "C_D": 0.5, "A": 0.001, "dt": 0.05, "T": 0.2})
+    sim.run()
+    if barrier is not None:
+        barrier.wait(timeout)
+
+
+# Returns the pid of the worker
+def _worker_pid():
+    return os.getpid()
+
+
+# Function to create a process pool with every worker already started and warmed
+#   - workers are spawned lazily (one per submitted task while none is idle), and a
+#     worker runs no task before its initializer returns; the barrier holds every
+#     initializer until all of them have warmed up, so the first task submitted here
+#     finishes only once all `processes` workers are running and warm
+#   - raises concurrent.futures.process.BrokenProcessPool when a worker fails to
+#     start within timeout seconds
+def make_pool(processes: int = None, timeout: float = 120.0):
+    processes = processes or os.cpu_count() or 1
+    barrier = multiprocessing.Barrier(processes)
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=_warm_worker, initargs=(barrier, timeout))
+    try:
+        for future in [pool.submit(_worker_pid) for _ in range(processes)]:
+            future.result()
+    except Exception:
+        pool.shutdown(cancel_futures=True)
+        raise
+    return pool
+
+
+# Function to run many simulations on a pool, returning results in input order
+#   - runs in the calling process when processes == 1
+#   - pass an existing pool to reuse warm workers across calls
+#   - runner(chunk, include_trajectory) does the work of one chunk (run_batch by default,
+#     must be a module-level function so it can be pickled)
+def run_pool(param_list: list, processes: int = None, include_trajectory: bool = False,
+             pool: ProcessPoolExecutor = None, chunk_size: int = None, runner=run_batch):
+    param_list = list(param_list)
+    if processes == 1 and pool is None:
+        return runner(param_list, include_trajectory)
+
+    processes = processes or os.cpu_count() or 1
+    # A few chunks per worker keeps them all busy without pickling one job at a time
+    chunk_size = chunk_size or max(1, len(param_list) // (4 * processes))
+    chunks = [param_list[i:i + chunk_size] for i in range(0, len(param_list), chunk_size)]
+
+    owns_pool = pool is None
+    if owns_pool:
+        pool = make_pool(min(processes, max(1, len(chunks))))
+    try:
+        results = []
+        for chunk_results in pool.map(runner, chunks, [include_trajectory] * len(chunks)):
+            results.extend(chunk_results)
+    finally:
+        if owns_pool:
+            pool.shutdown()
+    return results
@@ -0,0 +1,290 @@
+'''
+    Design Catalog Functions
+
+    Catalogs are large tables of candidate rockets, one per row, with the Rocket
+        constructor fields (m, thrust, burn_time, fuel_mass, C_D, A) and
+        optionally simulation settings (h_0, v_0, dt, T, ...) or text fields
+        (thrust_profile, C_D_mach, preset) as columns. They come as:
+            .csv  with a header row
+            .npy  structured array with named fields, or a 2D float array plus
+                  the column names (read through a memory map)
+
+    Catalogs are streamed in bounded-size chunks: every chunk is validated with
+        vectorized checks, split into tasks whose column arrays (not dicts) are
+        sent to worker processes, and the results are written row-aligned into
+        an .npy file opened with open_memmap. At no point does the whole catalog
+        exist as Python objects.
+
+    Functions:
+        iter_catalog(path, chunk_size, columns):
+            Yields (first_row, {column: array}) chunks of a catalog
+
+        count_rows(path):
+            Number of data rows in a catalog
+
+        validate_chunk(chunk, malformed):
+            Vectorized check of a chunk, returns a mask of valid rows
+
+        run_catalog(path, output_path, defaults, chunk_size, processes, pool):
+            Simulates every row of a catalog and writes the results row-aligned
+'''
+import os
+import csv
+import itertools
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+from src.batch import ROCKET_FIELDS, load_presets, make_pool, resolve_params, run_params
+from src.DragTable import load_drag_table
+from inc.thrust_profiles import resolve_thrust_profile
+
+# Columns a catalog may contain
+NUMERIC_FIELDS = ROCKET_FIELDS + ("h_0", "v_0", "theta", "temp", "pressure", "dt", "T")
+TEXT_FIELDS = ("thrust_profile", "C_D_mach", "preset")
+
+# Fields that must be > 0 and >= 0
+POSITIVE_FIELDS = ("m", "burn_time", "A", "temp", "pressure", "dt", "T")
+NON_NEGATIVE_FIELDS = ("thrust", "fuel_mass", "C_D")
+
+# Row status in the results file
+STATUS_PENDING = -1
+STATUS_OK = 0
+STATUS_INVALID = 1
+STATUS_FAILED = 2
+
+_presets = None
+
+RESULT_DTYPE = np.dtype([
+    ("status", "i1"),
+    ("apogee", "f8"),
+    ("max_velocity", "f8"),
+    ("flight_time", "f8"),
+    ("steps", "i8"),
+    ("stop_reason", "U17")
+])
+
+
+# Convert a column of strings to floats (unparseable entries become nan)
+def _to_float(values):
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except ValueError:
+        column = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except ValueError:
+                pass
+        return column
+
+
+def _check_columns(columns):
+    unknown = [c for c in columns if c not in NUMERIC_FIELDS + TEXT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown catalog columns: {', '.join(unknown)}")
+
+
+# Yields (first_row, chunk, malformed) with malformed marking rows whose field
+#   count differs from the header
+def _iter_csv(path: str, chunk_size: int):
+    with open(path, "r", newline="") as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+        _check_columns(header)
+        first_row = 0
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                return
+            rows = [row for row in rows if row]
+            # Blank malformed rows before transposing, so they cannot shift or
+            # truncate the columns of the rest of the chunk
+            malformed = np.array([len(row) != len(header) for row in rows], dtype=bool)
+            rows = [row if len(row) == len(header) else [""] * len(header) for row in rows]
+            columns = list(zip(*rows)) if rows else [()] * len(header)
+            chunk = {}
+            for name, values in zip(header, columns):
+                if name in TEXT_FIELDS:
+                    chunk[name] = np.array([value.strip() for value in values], dtype=str)
+                else:
+                    chunk[name] = _to_float(values)
+            yield first_row, chunk, malformed
+            first_row += len(rows)
+
+
+def _iter_npy(path: str, chunk_size: int, columns=None):
+    data = np.load(path, mmap_mode="r")
+    if data.dtype.names:
+        names = list(data.dtype.names)
+        _check_columns(names)
+        for start in range(0, len(data), chunk_size):
+            block = data[start:start + chunk_size]
+            yield start, {name: np.array(block[name]) for name in names}, np.zeros(len(block), dtype=bool)
+        return
+
+    if columns is None or data.ndim != 2 or data.shape[1] != len(columns):
+        raise ValueError("Plain .npy catalogs need a 2D array and one column name per column")
+    _check_columns(columns)
+    for start in range(0, len(data), chunk_size):
+        block = np.asarray(data[start:start + chunk_size], dtype=np.float64)
+        yield start, {name: block[:, j] for j, name in enumerate(columns)}, np.zeros(len(block), dtype=bool)
+
+
+def _iter_chunks(path: str, chunk_size: int, columns=None):
+    if path.endswith(".csv"):
+        return _iter_csv(path, chunk_size)
+    if path.endswith(".npy"):
+        return _iter_npy(path, chunk_size, columns)
+    raise ValueError(f"Unsupported catalog format: {path}")
+
+
+# Function to stream a catalog in chunks of at most chunk_size rows
+#   - columns names the columns of a plain 2D .npy array
+#   - rows of a .csv with the wrong number of fields come back blank (nan and "")
+def iter_catalog(path: str, chunk_size: int = 10000, columns=None):
+    return ((first_row, chunk) for first_row, chunk, _ in _iter_chunks(path, chunk_size, columns))
+
+
+# Function to count the rows of a catalog without loading it
+def count_rows(path: str):
+    if path.endswith(".npy"):
+        return len(np.load(path, mmap_mode="r"))
+    with open(path, "r", newline="") as f:
+        return sum(1 for row in csv.reader(f) if row) - 1
+
+
+# Raises ValueError for names missing from inc/rocket_presets.json
+def _check_preset(name: str):
+    global _presets
+    if _presets is None:
+        _presets = load_presets()
+    if name not in _presets:
+        raise ValueError(f"Unknown preset: {name}")
+
+
+# Function to validate a chunk with vectorized checks
+#   - text columns are checked once per distinct value
+#   - malformed: optional mask of rows to reject (see _iter_csv)
+def validate_chunk(chunk: dict, malformed=None):
+    n = len(next(iter(chunk.values())))
+    valid = np.ones(n, dtype=bool) if malformed is None else ~np.asarray(malformed, dtype=bool)
+    for name, column in chunk.items():
+        if name in TEXT_FIELDS:
+            continue
+        valid &= np.isfinite(column)
+        if name in POSITIVE_FIELDS:
+            valid &= column > 0
+        elif name in NON_NEGATIVE_FIELDS:
+            valid &= column >= 0
+
+    for name, check in (("thrust_profile", resolve_thrust_profile), ("C_D_mach", load_drag_table),
+                        ("preset", _check_preset)):
+        if name not in chunk:
+            continue
+        for value in np.unique(chunk[name]):
+            try:
+                if value:
+                    check(str(value))
+            except ValueError:
+                valid &= chunk[name] != value
+    return valid
+
+
+# Worker side: simulate a block of rows given as column arrays
+def _run_rows(first_row: int, chunk: dict, valid, defaults: dict):
+    n = len(valid)
+    results = np.zeros(n, dtype=RESULT_DTYPE)
+    results["status"] = STATUS_INVALID
+    for metric in ("apogee", "max_velocity", "flight_time"):
+        results[metric] = np.nan
+
+    for i in np.flatnonzero(valid):
+        params = dict(defaults)
+        for name, column in chunk.items():
+            value = column[i]
+            if name in TEXT_FIELDS:
+                if value:
+                    params[name] = str(value)
+            else:
+                params[name] = float(value)
+        try:
+            summary = run_params(params, include_trajectory=False)
+        except Exception:
+            results["status"][i] = STATUS_FAILED
+            continue
+        results["status"][i] = STATUS_OK
+        results["steps"][i] = summary["steps"]
+        results["stop_reason"][i] = summary["stop_reason"] or ""
+        for metric in ("apogee", "max_velocity", "flight_time"):
+            if summary[metric] is not None:
+                results[metric][i] = summary[metric]
+    return first_row, results
+
+
+# Function to simulate every row of a catalog, writing results to output_path (.npy)
+#   - defaults fill in fields missing from the catalog (e.g. {"preset": "V2 Rocket", "T": 600.0})
+#   - at most max_in_flight tasks are queued on the pool, so memory stays bounded
+#   - returns the counts of ok, invalid and failed rows
+def run_catalog(path: str, output_path: str, defaults: dict = None, chunk_size: int = 10000,
+                columns=None, processes: int = None, pool=None, task_size: int = None):
+    defaults = dict(defaults or {})
+    n_rows = count_rows(path)
+
+    # Every row must end up with all rocket fields (from its columns, the defaults or a preset)
+    chunks = _iter_chunks(path, 1, columns)
+    first = next(chunks, None)
+    chunks.close()
+    if first is not None:
+        available = set(defaults) | set(first[1])
+        missing = [f for f in ROCKET_FIELDS if f not in available]
+        if missing and "preset" not in available:
+            raise ValueError(f"Catalog and defaults miss rocket fields: {', '.join(missing)}")
+        if "preset" in defaults:
+            resolve_params(defaults)
+
+    output = np.lib.format.open_memmap(output_path, mode="w+", dtype=RESULT_DTYPE, shape=(n_rows,))
+    output["status"] = STATUS_PENDING
+
+    processes = processes or os.cpu_count() or 1
+    owns_pool = pool is None and processes > 1
+    if owns_pool:
+        pool = make_pool(processes)
+    task_size = task_size or max(1, min(1000, chunk_size // (4 * processes)))
+    max_in_flight = 2 * processes
+
+    def store(done):
+        first_row, results = done
+        output[first_row:first_row + len(results)] = results
+
+    try:
+        in_flight = set()
+        for first_row, chunk, malformed in _iter_chunks(path, chunk_size, columns):
+            valid = validate_chunk(chunk, malformed)
+            n = len(valid)
+            for start in range(0, n, task_size):
+                task = {name: column[start:start + task_size] for name, column in chunk.items()}
+                args = (first_row + start, task, valid[start:start + task_size], defaults)
+                if pool is None:
+                    store(_run_rows(*args))
+                    continue
+                # Wait for a slot so queued tasks never hold more than a few chunks
+                while len(in_flight) >= max_in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        store(future.result())
+                in_flight.add(pool.submit(_run_rows, *args))
+        for future in wait(in_flight)[0]:
+            store(future.result())
+    finally:
+        if owns_pool:
+            pool.shutdown()
+        output.flush()
+
+    status = np.asarray(output["status"])
+    counts = {"rows": n_rows,
+              "ok": int(np.sum(status == STATUS_OK)),
+              "invalid": int(np.sum(status == STATUS_INVALID)),
+              "failed": int(np.sum(status == STATUS_FAILED))}
+    del output
+    return counts
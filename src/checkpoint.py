@@ -0,0 +1,131 @@
+'''
+    Checkpoint Functions
+
+    A checkpoint holds everything needed to continue a run exactly where it
+        stopped: the integrator state (t, h, v), the current rocket mass, the
+        recorded arrays and the parameters of the simulation. Resumed runs
+        reproduce an uninterrupted run bit for bit.
+
+    The recorded arrays are written append-only: every save adds one segment
+        with only the samples recorded since the previous save of the same run
+        (path_segments/000000.npz, 000001.npz, ...) and rewrites the small state
+        file at path, which says how many segments belong to the checkpoint.
+        The cost of a save does not grow with the length of the run.
+
+    Functions:
+        params_from_simulation(sim):
+            Returns the parameter dict (as used by src/batch.py) of a simulation
+
+        save_checkpoint(sim, path, t, h, v):
+            Appends the samples recorded since the last save and atomically
+            writes the state of a running simulation to an .npz file
+
+        load_checkpoint(path):
+            Reads a checkpoint (state and concatenated segments) back into a dict
+
+        segment_dir(path):
+            Returns the directory holding the segments of a checkpoint
+'''
+import os
+import json
+
+import numpy as np
+
+from inc.thrust_profiles import profile_name
+
+# Recorder arrays stored in every checkpoint
+RECORDED = ("times", "altitudes", "velocities", "accelerations", "masses")
+
+
+# Function to recover the parameter dict of a simulation
+def params_from_simulation(sim):
+    rocket = sim.rocket
+    name = profile_name(rocket.thrust_profile)
+    if rocket.thrust_profile == rocket.default_thrust_profile:
+        name = "linear"
+    if name is None:
+        raise ValueError("Thrust profile is not registered in THRUST_PROFILES or inc/engines")
+    params = {
+        "m": float(rocket.dry_mass),
+        "thrust": float(rocket.thrust),
+        "burn_time": float(rocket.burn_time),
+        "fuel_mass": float(rocket.fuel_mass),
+        "C_D": float(rocket.C_D),
+        "A": float(rocket.A),
+        "thrust_profile": name,
+        "h_0": float(sim.h_0),
+        "v_0": float(sim.v_0),
+        "theta": float(np.degrees(sim.theta)),
+        "temp": float(sim.temp),
+        "pressure": float(sim.pressure),
+        "dt": float(sim.dt),
+        "T": float(sim.T)
+    }
+    if rocket.drag_table is not None:
+        params["C_D_mach"] = rocket.drag_table.source
+    return params
+
+
+# Function to get the directory of a checkpoint's segments
+def segment_dir(path: str):
+    return f"{os.path.splitext(path)[0]}_segments"
+
+
+# Write an .npz file through a temp file + rename, so a crash never leaves half a file
+def _write_npz(path: str, **arrays):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+# Function to write a checkpoint
+#   - sim.checkpoint_progress = (path, samples saved, segments) tracks what is on disk already
+#   - the segment is written before the state file that counts it
+def save_checkpoint(sim, path: str, t: float, h: float, v: float):
+    params = params_from_simulation(sim)
+    saved_path, saved, segments = sim.checkpoint_progress or (path, 0, 0)
+    if saved_path != path:
+        saved, segments = 0, 0
+
+    directory = segment_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    if segments == 0:
+        # A new run on this path: drop the segments of an older one
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+    n = len(sim.times)
+    if n > saved:
+        _write_npz(os.path.join(directory, f"{segments:06d}.npz"),
+                   **{name: np.asarray(getattr(sim, name)[saved:n], dtype=np.float64) for name in RECORDED})
+        segments += 1
+
+    _write_npz(path,
+               state=np.array([t, h, v, sim.rocket.m], dtype=np.float64),
+               params=np.array(json.dumps(params)),
+               verbose=np.array(bool(sim.verbose)),
+               samples=np.array(n),
+               segments=np.array(segments))
+    sim.checkpoint_progress = (path, n, segments)
+
+
+# Function to read a checkpoint
+def load_checkpoint(path: str):
+    with np.load(path) as data:
+        t, h, v, m = data["state"]
+        checkpoint = {"t": float(t), "h": h, "v": v, "m": m,
+                      "params": json.loads(str(data["params"])),
+                      "verbose": bool(data["verbose"]),
+                      "samples": int(data["samples"]),
+                      "segments": int(data["segments"])}
+
+    parts = {name: [] for name in RECORDED}
+    directory = segment_dir(path)
+    for k in range(checkpoint["segments"]):
+        with np.load(os.path.join(directory, f"{k:06d}.npz")) as segment:
+            for name in RECORDED:
+                parts[name].append(segment[name])
+    for name in RECORDED:
+        checkpoint[name] = np.concatenate(parts[name]).tolist() if parts[name] else []
+    return checkpoint
@@ -0,0 +1,201 @@
+'''
+    Parallel-in-Time (Parareal) Integration Functions
+
+    A long single run is split into time slices. A cheap coarse propagator (RK4
+        with a large step, run serially) predicts the state (t, h, v, mass) at
+        every slice boundary; all slices are then integrated concurrently on a
+        process pool with the fine RK4 step of the simulation, and the two are
+        combined with the Parareal correction
+
+            U_{j+1} = G(U_j new) + F(U_j old) - G(U_j old)
+
+        until the boundary states stop changing. After k iterations the first k
+        slices are exact, so the method always converges in at most `slices`
+        iterations; it only pays off when it converges in far fewer.
+
+    The fine slices apply the stopping rules of RocketSimulation.run (landing,
+        leaving the atmosphere, NaN), and slices after a stop are dropped.
+
+    Functions:
+        run_parareal(sim, slices, coarse_factor, processes, tol, max_iterations, pool, compare):
+            Runs sim with Parareal, fills its recorded arrays and returns a report
+'''
+import os
+import time
+
+import numpy as np
+
+from src.batch import make_pool, simulation_from_params
+from src.checkpoint import params_from_simulation
+
+
+# Propagate n_steps RK4 steps from state (t, h, v, m)
+#   - fine slices (stops=True) follow the recording and stopping rules of run()
+def _propagate(sim, state, n_steps: int, stops: bool = False, record: bool = False):
+    t, h, v, m = state
+    sim.rocket.m = np.float64(m)
+    samples = ([], [], [], [], [])
+    stop_reason = None
+
+    for _ in range(n_steps):
+        if stops:
+            # Same end condition as the while loop of run()
+            if t > sim.T:
+                break
+            stop_reason = sim.check_stop(t, h, v)
+            if stop_reason is not None:
+                break
+        if record:
+            samples[0].append(t)
+            samples[1].append(h)
+            samples[2].append(v)
+        if stops:
+            stop_reason = sim.check_stop(t, h, v, recorded=True)
+            if stop_reason is not None:
+                break
+
+        t, h, v = sim.rk4_step(t, h, v)
+        if record:
+            samples[3].append(sim.accel_start)
+            samples[4].append(sim.mass_start)
+
+    result = {"state": np.array([t, h, v, sim.rocket.m], dtype=np.float64), "stop_reason": stop_reason}
+    if record:
+        result.update(times=samples[0], altitudes=samples[1], velocities=samples[2],
+                      accelerations=samples[3], masses=samples[4], accel_end=sim.accel_end)
+    return result
+
+
+# Worker side: one fine slice
+def _fine_slice(params: dict, state, n_steps: int):
+    sim = simulation_from_params(params)
+    return _propagate(sim, state, n_steps, stops=True, record=True)
+
+
+# Function to run a simulation with Parareal
+#   - slices defaults to the number of workers; the coarse step is coarse_factor * dt
+#   - tol is the largest change of a boundary altitude (m) or velocity (m/s) between
+#     iterations that counts as converged
+#   - compare=True also times a serial run() and reports the speedup and the difference
+def run_parareal(sim, slices: int = None, coarse_factor: int = 20, processes: int = None,
+                 tol: float = 1e-6, max_iterations: int = None, pool=None, compare: bool = True):
+    params = params_from_simulation(sim)
+    processes = processes or os.cpu_count() or 1
+    slices = slices or processes
+    max_iterations = max_iterations or slices
+
+    # Same number of steps as run() takes when nothing stops it
+    n_total = int(np.floor(params["T"] / params["dt"])) + 1
+    bounds = np.linspace(0, n_total, slices + 1).round().astype(int)
+    slice_steps = np.diff(bounds)
+    coarse_steps = np.maximum(1, np.round(slice_steps / coarse_factor)).astype(int)
+
+    # Coarse propagator: same rocket and atmosphere, larger fixed step; after a stop
+    #   (e.g. landing) the state is held so later slices stay finite
+    coarse_sim = simulation_from_params(params)
+
+    def coarse(j: int, state):
+        coarse_sim.dt = np.float64(slice_steps[j] * params["dt"] / coarse_steps[j])
+        end = _propagate(coarse_sim, state, coarse_steps[j], stops=True)["state"]
+        # Boundary times come from the fine step count, not the coarse one
+        end[0] = state[0] + slice_steps[j] * params["dt"]
+        return end
+
+    start = time.perf_counter()
+    owns_pool = pool is None and processes > 1
+    if owns_pool:
+        pool = make_pool(min(processes, slices))
+
+    try:
+        # Initial prediction with the coarse propagator alone
+        U = [np.array([0.0, sim.h_0, sim.v_0, sim.rocket.dry_mass + sim.rocket.fuel_mass])]
+        G_old = []
+        for j in range(slices):
+            G_old.append(coarse(j, U[j]))
+            U.append(G_old[j].copy())
+
+        fine = [None] * slices
+        fine_start = [None] * slices
+        iterations = 0
+        converged = False
+        last = slices - 1
+        history = []
+
+        while iterations < max_iterations:
+            iterations += 1
+            # Fine slices whose start state changed since their last run
+            todo = [j for j in range(last + 1)
+                    if fine_start[j] is None or not np.array_equal(fine_start[j], U[j])]
+            if pool is not None:
+                futures = [pool.submit(_fine_slice, params, U[j], int(slice_steps[j])) for j in todo]
+                outputs = [future.result() for future in futures]
+            else:
+                outputs = [_fine_slice(params, U[j], int(slice_steps[j])) for j in todo]
+            for j, output in zip(todo, outputs):
+                fine[j] = output
+                fine_start[j] = U[j].copy()
+
+            # A stop inside a slice ends the trajectory there
+            stopped = [j for j in range(last + 1) if fine[j]["stop_reason"] is not None]
+            last = stopped[0] if stopped else slices - 1
+
+            # Serial correction sweep
+            U_new = [U[0]]
+            for j in range(last):
+                G_new = coarse(j, U_new[j])
+                U_new.append(G_new + fine[j]["state"] - G_old[j])
+                G_old[j] = G_new
+            change = max((np.max(np.abs(U_new[j][1:3] - U[j][1:3])) for j in range(1, last + 1)),
+                         default=0.0)
+            history.append(float(change))
+            U[:last + 1] = U_new
+
+            if change <= tol:
+                converged = True
+                break
+
+        # Fine slices started from the final boundary states
+        todo = [j for j in range(last + 1) if not np.array_equal(fine_start[j], U[j])]
+        if todo:
+            if pool is not None:
+                outputs = [pool.submit(_fine_slice, params, U[j], int(slice_steps[j])).result() for j in todo]
+            else:
+                outputs = [_fine_slice(params, U[j], int(slice_steps[j])) for j in todo]
+            for j, output in zip(todo, outputs):
+                fine[j] = output
+    finally:
+        if owns_pool:
+            pool.shutdown()
+    parareal_time = time.perf_counter() - start
+
+    # Stitch the slices into the simulation's recorded arrays
+    sim.times, sim.altitudes, sim.velocities, sim.accelerations, sim.masses = [], [], [], [], []
+    for j in range(last + 1):
+        for name in ("times", "altitudes", "velocities", "accelerations", "masses"):
+            getattr(sim, name).extend(fine[j][name])
+    sim.accel_end = fine[last]["accel_end"]
+    sim.stop_reason = fine[last]["stop_reason"] or "end_time"
+    sim.rocket.m = fine[last]["state"][3]
+    sim.finish_result()
+
+    report = {
+        "iterations": iterations,
+        "converged": converged,
+        "slices": slices,
+        "slices_used": last + 1,
+        "processes": processes,
+        "history": history,
+        "parareal_time": parareal_time
+    }
+
+    if compare:
+        serial = simulation_from_params(params)
+        start = time.perf_counter()
+        serial.run()
+        report["serial_time"] = time.perf_counter() - start
+        report["speedup"] = report["serial_time"] / parareal_time
+        n = min(len(serial.times), len(sim.times))
+        report["max_altitude_difference"] = float(np.max(np.abs(
+            np.asarray(serial.altitudes[:n]) - np.asarray(sim.altitudes[:n])))) if n else 0.0
+        report["serial_steps"] = len(serial.times)
+    return report
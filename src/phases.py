@@ -0,0 +1,144 @@
+'''
+    Phase-Aware Integration Functions
+
+    Splits a run into three phases, each with its own derivative and step size:
+        powered:          t <= burn_time, the normal rk4_step with sim.dt
+        atmospheric coast: engine out (thrust 0, mass = dry mass), RK4 on
+                           a = -G - drag / dry_mass with coast_dt
+        vacuum coast:     above the altitude where air density drops below
+                           vacuum_density, the closed-form ballistic arc
+                           h = h_0 + v_0 t - G t^2 / 2
+
+    Vacuum arcs are jumped over in one step to the next event (apogee, exit of the
+        atmosphere, re-entry into the atmosphere or the end time), so the recorded
+        samples are no longer uniform there; sim.result (dense output) still
+        reproduces the arc exactly. The engine is assumed to be out after
+        burn_time, so thrust profiles that stay nonzero past burn_time (e.g.
+        "quarter") will differ from run().
+
+    Functions:
+        run_phased(sim, coast_dt, vacuum_density):
+            Runs the simulation phase by phase and returns the step count of each phase
+'''
+import numpy as np
+
+
+def run_phased(sim, coast_dt: float = None, vacuum_density: float = 1e-8):
+    # Imported here: src.RocketSimulation imports this module
+    from src.RocketSimulation import ATMOSPHERE_EXIT
+    rocket = sim.rocket
+    G = sim.G
+    coast_dt = np.float64(coast_dt if coast_dt else sim.dt)
+    h_vacuum = sim.altitude_for_density(vacuum_density)
+    drag_factor = 0.5 * rocket.C_D * rocket.A / rocket.dry_mass
+
+    # Coast derivative: no thrust_at_time / fuel_status calls
+    def coast_accel(h: float, v: float):
+        if rocket.drag_table is not None:
+            return -G - sim.drag(h, v) / rocket.dry_mass
+        return -G - drag_factor * sim.air_density(h) * v * v
+
+    def coast_step(t: float, h: float, v: float):
+        a_1 = coast_accel(h, v)
+        h_2, v_2 = h + 0.5 * coast_dt * v, v + 0.5 * coast_dt * a_1
+        a_2 = coast_accel(h_2, v_2)
+        h_3, v_3 = h + 0.5 * coast_dt * v_2, v + 0.5 * coast_dt * a_2
+        a_3 = coast_accel(h_3, v_3)
+        h_4, v_4 = h + coast_dt * v_3, v + coast_dt * a_3
+        a_4 = coast_accel(h_4, v_4)
+
+        sim.accel_start = a_1
+        sim.accel_end = a_4
+        h_1 = h + (coast_dt / 6.) * (v + 2*v_2 + 2*v_3 + v_4)
+        v_1 = v + (coast_dt / 6.) * (a_1 + 2*a_2 + 2*a_3 + a_4)
+        return t + coast_dt, h_1, v_1
+
+    # Time until the ballistic arc h + v tau - G tau^2 / 2 descends to altitude h_target
+    def time_to_descend(h: float, v: float, h_target: float):
+        return (v + np.sqrt(v * v + 2 * G * (h - h_target))) / G
+
+    steps = {"powered": 0, "coast": 0, "vacuum": 0}
+    phase_log = []
+
+    def enter(phase: str, t: float):
+        if not phase_log or phase_log[-1][0] != phase:
+            phase_log.append([phase, t, t])
+
+    t = 0.0
+    h = sim.h_0
+    v = sim.v_0
+    sim.stop_reason = "end_time"
+
+    while (t <= sim.T):
+        if sim.cancelled:
+            sim.stop_reason = "cancelled"
+            break
+        stop_reason = sim.check_stop(t, h, v)
+        if stop_reason is not None:
+            sim.stop_reason = stop_reason
+            break
+
+        sim.times.append(t)
+        sim.altitudes.append(h)
+        sim.velocities.append(v)
+        if phase_log:
+            phase_log[-1][2] = t
+
+        stop_reason = sim.check_stop(t, h, v, recorded=True)
+        if stop_reason is not None:
+            sim.stop_reason = stop_reason
+            break
+
+        if t <= rocket.burn_time:
+            enter("powered", t)
+            t, h, v = sim.rk4_step(t, h, v)
+            sim.accelerations.append(sim.accel_start)
+            sim.masses.append(sim.mass_start)
+            steps["powered"] += 1
+            continue
+
+        # Engine is out from here on
+        rocket.m = rocket.dry_mass
+        tau_reentry = time_to_descend(h, v, h_vacuum) if h >= h_vacuum else 0.0
+
+        if tau_reentry <= 1e-9:
+            enter("coast", t)
+            t, h, v = coast_step(t, h, v)
+            sim.accelerations.append(sim.accel_start)
+            sim.masses.append(rocket.dry_mass)
+            steps["coast"] += 1
+            continue
+
+        # Vacuum: jump to the next event on the closed-form arc
+        enter("vacuum", t)
+        tau_end = sim.T - t
+        if tau_end <= 0:
+            break
+        events = [(tau_reentry, "reentry"), (tau_end, "end")]
+        if v > 0:
+            events.append((v / G, "apogee"))
+            if h + v * v / (2 * G) > ATMOSPHERE_EXIT:
+                # First crossing of ATMOSPHERE_EXIT on the way up
+                events.append(((v - np.sqrt(v * v - 2 * G * (ATMOSPHERE_EXIT - h))) / G, "exit"))
+        tau, event = min(event for event in events if event[0] > 0)
+
+        sim.accelerations.append(-G)
+        sim.masses.append(rocket.dry_mass)
+        t, h, v = t + tau, h + v * tau - 0.5 * G * tau * tau, v - G * tau
+        sim.accel_end = -G
+        steps["vacuum"] += 1
+
+        if event == "exit":
+            # Record the crossing itself and stop like run() does
+            sim.times.append(t)
+            sim.altitudes.append(h)
+            sim.velocities.append(v)
+            phase_log[-1][2] = t
+            if sim.verbose:
+                print("Exited Earth's Atmosphere!")
+            sim.stop_reason = "exited_atmosphere"
+            break
+
+    sim.phases = [(phase, float(start), float(end)) for phase, start, end in phase_log]
+    sim.finish_result()
+    return steps
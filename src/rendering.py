@@ -0,0 +1,99 @@
+'''
+    Offscreen Plot Rendering Functions
+
+    Plots are described by draw functions that fill a matplotlib Figure. The same
+        draw function is used twice:
+            - by background workers, on a Figure with the Agg canvas (no pyplot,
+              no GUI objects, so it is safe outside the GUI thread), rasterized
+              into an RGBA array at the size of the on-screen canvas
+            - by the GUI, on its interactive Qt figure, only when the user wants
+              to zoom or pan
+
+    Functions:
+        draw_trajectory(figure, times, altitudes, velocities, title):
+            Draws the altitude and velocity plots of a run
+
+        draw_error_analysis(figure, dt_values, E_h_array, E_v_array):
+            Draws the altitude and velocity truncation error plots
+
+        draw_comparison(figure, runs):
+            Draws the overlaid altitude and velocity curves of several runs
+
+        rasterize(draw, width, height, dpi, *args):
+            Renders a draw function with Agg, returns an (height, width, 4) uint8 array
+'''
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+# Function to draw the altitude and velocity of a run
+def draw_trajectory(figure, times, altitudes, velocities, title=None):
+    figure.clear()
+    ax1 = figure.add_subplot(2, 1, 1)
+    ax1.plot(times, altitudes, label="Altitude (m)", color="b")
+    if title:
+        ax1.set_title(title)
+    ax1.set_xlabel("Time (s)")
+    ax1.set_ylabel("Altitude (m)")
+    ax1.grid()
+
+    ax2 = figure.add_subplot(2, 1, 2)
+    ax2.plot(times, velocities, label="Velocity (m/s)", color="r")
+    ax2.set_xlabel("Time (s)")
+    ax2.set_ylabel("Velocity (m/s)")
+    ax2.grid()
+
+
+# Function to draw the truncation errors against the step size
+def draw_error_analysis(figure, dt_values, E_h_array, E_v_array):
+    figure.clear()
+
+    # Altitude Error Plot
+    ax1 = figure.add_subplot(2, 1, 1)
+    ax1.loglog(dt_values, E_h_array, marker='o', label="Altitude Error")
+    ax1.set_xlabel("Time Step Size (s)")
+    ax1.set_ylabel("Error")
+    ax1.grid(which="both")
+    ax1.legend()
+
+    # Velocity Error Plot
+    ax2 = figure.add_subplot(2, 1, 2)
+    ax2.loglog(dt_values, E_v_array, marker='o', label="Velocity Error")
+    ax2.set_xlabel("Time Step Size (s)")
+    ax2.set_ylabel("Error")
+    ax2.grid(which="both")
+    ax2.legend()
+
+
+# Function to overlay several runs
+#   - runs: list of (label, apogee, (times, altitudes), (times, velocities))
+#   - apogee is None for a run that recorded nothing, shown as "n/a"
+def draw_comparison(figure, runs):
+    figure.clear()
+    ax1 = figure.add_subplot(2, 1, 1)
+    ax2 = figure.add_subplot(2, 1, 2)
+    for label, apogee, altitude, velocity in runs:
+        apogee = "n/a" if apogee is None else f"{apogee:.0f} m"
+        ax1.plot(*altitude, label=f"{label} (apogee {apogee})")
+        ax2.plot(*velocity, label=label)
+
+    ax1.set_xlabel("Time (s)")
+    ax1.set_ylabel("Altitude (m)")
+    ax1.grid()
+    ax2.set_xlabel("Time (s)")
+    ax2.set_ylabel("Velocity (m/s)")
+    ax2.grid()
+    if runs:
+        ax1.legend()
+        ax2.legend()
+
+
+# Function to rasterize a draw function at a given pixel size
+#   - dpi should match the screen so fonts have the same size as on the interactive canvas
+def rasterize(draw, width: int, height: int, dpi: float = 100.0, *args):
+    figure = Figure(figsize=(max(width, 1) / dpi, max(height, 1) / dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(figure)
+    draw(figure, *args)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
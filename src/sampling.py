@@ -0,0 +1,322 @@
+'''
+    Quasi-Monte Carlo Sampling Functions
+
+    Dispersion studies draw rocket parameters from distributions defined against
+        a preset (or any parameter dict understood by src/batch.py) and run each
+        draw as a simulation. Low-discrepancy designs (scrambled Sobol, Latin
+        hypercube) cover the parameter space far more evenly than pseudo-random
+        draws, so statistics such as the mean apogee converge with fewer runs.
+
+    Distributions are tuples keyed by parameter name:
+        ("uniform", low, high)
+        ("normal", mean, std)
+        ("lognormal", mu, sigma)          (of the underlying normal)
+        ("triangular", low, mode, high)
+        ("uniform%", percent)             base value +- percent
+        ("normal%", percent)              mean = base value, std = percent of it
+    where the base value is the field of the resolved parameter dict (e.g. the preset's thrust).
+
+    Functions:
+        sobol(n, d, scramble, seed, skip):
+            Returns n points of a d-dimensional (scrambled) Sobol sequence in [0, 1)^d
+
+        latin_hypercube(n, d, rng):
+            Returns an n point Latin hypercube design in [0, 1)^d
+
+        normal_ppf(p):
+            Inverse of the standard normal CDF (Acklam's rational approximation)
+
+        transform(unit, distributions, base):
+            Maps points of the unit cube to parameter values
+
+        sample_params(base_params, distributions, n, method, seed):
+            Returns a list of parameter dicts ready for run_batch / run_pool
+
+        run_until_converged(base_params, distributions, metric, statistic, rtol, ...):
+            Runs randomized replicates of a design, doubling them until the standard
+                error of the statistic falls below the tolerance
+'''
+import numpy as np
+
+from src.batch import resolve_params, run_pool
+
+# Sobol points are built from BITS-bit integers (at most 2**BITS points)
+BITS = 30
+
+# Joe & Kuo (new-joe-kuo-6.21201) primitive polynomials and initial direction numbers
+#   (degree s, coefficients a, m_1 ... m_s) for dimensions 2 and up
+JOE_KUO = (
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)),
+    (6, 22, (1, 3, 1, 15, 13, 25)),
+    (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)),
+    (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+)
+MAX_DIM = len(JOE_KUO) + 1
+
+METHODS = ("sobol", "lhs", "random")
+
+
+# Direction numbers of one Sobol dimension as BITS-bit integers
+def _direction_numbers(dim: int):
+    v = np.zeros(BITS, dtype=np.int64)
+    if dim == 0:
+        for j in range(BITS):
+            v[j] = 1 << (BITS - 1 - j)
+        return v
+
+    s, a, m = JOE_KUO[dim - 1]
+    for j in range(min(s, BITS)):
+        v[j] = m[j] << (BITS - 1 - j)
+    for j in range(s, BITS):
+        v[j] = v[j - s] ^ (v[j - s] >> s)
+        for k in range(1, s):
+            if (a >> (s - 1 - k)) & 1:
+                v[j] ^= v[j - k]
+    return v
+
+
+# Linear matrix scramble: multiply the bits of every direction number by a random
+#   lower triangular binary matrix (unit diagonal), which keeps the net structure
+def _scramble(v, rng):
+    L = np.tril(rng.integers(0, 2, size=(BITS, BITS)), -1) + np.eye(BITS, dtype=np.int64)
+    # bits[i, j] is bit i (most significant first) of direction number j
+    bits = (v[None, :] >> (BITS - 1 - np.arange(BITS))[:, None]) & 1
+    scrambled = (L @ bits) % 2
+    return (scrambled << (BITS - 1 - np.arange(BITS))[:, None]).sum(axis=0)
+
+
+# Function to generate Sobol points
+#   - points skip ... skip + n - 1 of the sequence, so designs can be extended later
+#   - use n (and skip) that are powers of two to keep the balance properties
+def sobol(n: int, d: int, scramble: bool = True, seed=None, skip: int = 0):
+    if d > MAX_DIM:
+        raise ValueError(f"Sobol sampling supports at most {MAX_DIM} dimensions")
+    if skip + n > 2**BITS:
+        raise ValueError(f"Sobol sampling supports at most 2**{BITS} points")
+
+    rng = np.random.default_rng(seed)
+    index = np.arange(skip, skip + n, dtype=np.int64)
+    gray = index ^ (index >> 1)
+
+    points = np.empty((n, d))
+    for dim in range(d):
+        v = _direction_numbers(dim)
+        shift = 0
+        if scramble:
+            v = _scramble(v, rng)
+            shift = int(rng.integers(0, 2**BITS))
+        x = np.zeros(n, dtype=np.int64)
+        for j in range(BITS):
+            x ^= ((gray >> j) & 1) * v[j]
+        points[:, dim] = (x ^ shift) / 2.0**BITS
+    return points
+
+
+# Function to generate a Latin hypercube design
+def latin_hypercube(n: int, d: int, rng=None):
+    rng = np.random.default_rng(rng)
+    cells = np.column_stack([rng.permutation(n) for _ in range(d)])
+    return (cells + rng.random((n, d))) / n
+
+
+# Acklam's coefficients for the inverse normal CDF
+_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+      1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+      6.680131188771972e+01, -1.328068155288572e+01)
+_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+      -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+      3.754408661907416e+00)
+
+
+# Function to invert the standard normal CDF (relative error below 1.2e-9)
+def normal_ppf(p):
+    p = np.clip(np.asarray(p, dtype=np.float64), 1e-300, 1 - 1e-16)
+    x = np.empty_like(p)
+    p_low = 0.02425
+
+    # Central region: rational function in (p - 0.5)
+    central = (p >= p_low) & (p <= 1 - p_low)
+    q = p[central] - 0.5
+    r = q * q
+    x[central] = (((((_A[0]*r + _A[1])*r + _A[2])*r + _A[3])*r + _A[4])*r + _A[5]) * q / \
+                 (((((_B[0]*r + _B[1])*r + _B[2])*r + _B[3])*r + _B[4])*r + 1)
+
+    # Tails: rational function in sqrt(-2 log p), mirrored for the upper tail
+    tail = ~central
+    q = np.sqrt(-2 * np.log(np.where(p[tail] < p_low, p[tail], 1 - p[tail])))
+    value = (((((_C[0]*q + _C[1])*q + _C[2])*q + _C[3])*q + _C[4])*q + _C[5]) / \
+            ((((_D[0]*q + _D[1])*q + _D[2])*q + _D[3])*q + 1)
+    x[tail] = np.where(p[tail] < p_low, value, -value)
+    return x
+
+
+# Map one column of unit samples through a distribution
+def _inverse_cdf(u, spec: tuple, base: float):
+    kind, *args = spec
+    if kind == "uniform":
+        low, high = args
+        return low + u * (high - low)
+    if kind == "normal":
+        mean, std = args
+        return mean + std * normal_ppf(u)
+    if kind == "lognormal":
+        mu, sigma = args
+        return np.exp(mu + sigma * normal_ppf(u))
+    if kind == "triangular":
+        low, mode, high = args
+        split = (mode - low) / (high - low)
+        return np.where(u < split,
+                        low + np.sqrt(u * (high - low) * (mode - low)),
+                        high - np.sqrt((1 - u) * (high - low) * (high - mode)))
+    if kind == "uniform%":
+        half_width = abs(base) * args[0] / 100.0
+        return base - half_width + 2 * half_width * u
+    if kind == "normal%":
+        return base + abs(base) * args[0] / 100.0 * normal_ppf(u)
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+# Function to map unit cube points to parameter values
+#   - returns {field: values}, fields in the order of the distributions dict
+def transform(unit, distributions: dict, base: dict = None):
+    unit = np.atleast_2d(unit)
+    if unit.shape[1] != len(distributions):
+        raise ValueError("Need one unit column per distribution")
+    base = base or {}
+    return {field: _inverse_cdf(unit[:, j], spec, base.get(field))
+            for j, (field, spec) in enumerate(distributions.items())}
+
+
+# Unit cube design for one of the sampling methods
+def _design(method: str, n: int, d: int, seed, skip: int = 0):
+    if method == "sobol":
+        return sobol(n, d, scramble=True, seed=seed, skip=skip)
+    if method == "lhs":
+        return latin_hypercube(n, d, seed)
+    if method == "random":
+        return np.random.default_rng(seed).random((n, d))
+    raise ValueError(f"Unknown sampling method: {method} (use one of {', '.join(METHODS)})")
+
+
+# Parameter dicts for a block of unit points
+def _params_for(base_params: dict, distributions: dict, base: dict, unit):
+    values = transform(unit, distributions, base)
+    param_list = []
+    for i in range(len(unit)):
+        params = dict(base_params)
+        params.update({field: float(column[i]) for field, column in values.items()})
+        param_list.append(params)
+    return param_list
+
+
+# Function to draw n parameter dicts from the distributions
+def sample_params(base_params: dict, distributions: dict, n: int, method: str = "sobol", seed: int = 0):
+    base = resolve_params(base_params)
+    unknown = [field for field in distributions if field not in base]
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(unknown)}")
+    unit = _design(method, n, len(distributions), seed)
+    return _params_for(base_params, distributions, base, unit)
+
+
+# Evaluate a statistic of the metric values of one replicate (failed runs are dropped)
+def _statistic(values, statistic):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if callable(statistic):
+        return float(statistic(values))
+    if statistic == "mean":
+        return float(np.mean(values))
+    if statistic == "std":
+        return float(np.std(values, ddof=1))
+    if isinstance(statistic, float):
+        return float(np.quantile(values, statistic))
+    raise ValueError(f"Unknown statistic: {statistic}")
+
+
+# Function to run a dispersion study until the statistic has converged
+#   - runs `replicates` independently randomized designs and doubles each one per round;
+#     the spread of the replicate estimates gives an honest standard error for QMC
+#   - Sobol replicates are extended in place; LHS designs are not extensible and are
+#     redrawn at the doubled size, random ones just draw more points
+#   - statistic: "mean", "std", a quantile in (0, 1) or a function of the values
+#   - n_start and n_max count points per replicate
+def run_until_converged(base_params: dict, distributions: dict, metric: str = "apogee",
+                        statistic="mean", rtol: float = 1e-3, atol: float = 0.0,
+                        method: str = "sobol", replicates: int = 8, n_start: int = 16,
+                        n_max: int = 4096, processes: int = None, pool=None, seed: int = 0):
+    if replicates < 2:
+        raise ValueError("Need at least two replicates to estimate the error")
+    base = resolve_params(base_params)
+    d = len(distributions)
+    seeds = np.random.SeedSequence(seed).spawn(replicates)
+    # Every replicate keeps its own scramble, so Sobol rounds continue the same sequence
+    rngs = [np.random.default_rng(s) for s in seeds]
+    values = [np.empty(0) for _ in range(replicates)]
+
+    history = []
+    n = 0
+    n_new = n_start
+    n_runs = 0
+    while True:
+        param_list = []
+        for r in range(replicates):
+            if method == "sobol":
+                unit = sobol(n_new, d, scramble=True, seed=seeds[r], skip=n)
+            elif method == "lhs":
+                unit = latin_hypercube(n + n_new, d, rngs[r])
+            elif method == "random":
+                unit = rngs[r].random((n_new, d))
+            else:
+                raise ValueError(f"Unknown sampling method: {method} (use one of {', '.join(METHODS)})")
+            param_list.extend(_params_for(base_params, distributions, base, unit))
+
+        results = run_pool(param_list, processes, pool=pool)
+        metric_values = np.array([np.nan if "error" in result or result.get(metric) is None
+                                  else result[metric] for result in results], dtype=np.float64)
+        n_runs += len(results)
+
+        block = len(results) // replicates
+        for r in range(replicates):
+            chunk = metric_values[r * block:(r + 1) * block]
+            values[r] = chunk if method == "lhs" else np.concatenate([values[r], chunk])
+        n = len(values[0])
+
+        estimates = np.array([_statistic(v, statistic) for v in values])
+        estimate = float(np.mean(estimates))
+        standard_error = float(np.std(estimates, ddof=1) / np.sqrt(replicates))
+        history.append({"n_runs": n_runs, "n_per_replicate": n,
+                        "estimate": estimate, "standard_error": standard_error})
+
+        converged = standard_error <= max(atol, rtol * abs(estimate))
+        if converged or 2 * n > n_max:
+            break
+        n_new = n
+
+    return {
+        "estimate": estimate,
+        "standard_error": standard_error,
+        "converged": converged,
+        "n_runs": n_runs,
+        "replicate_estimates": estimates,
+        "values": values,
+        "history": history
+    }
@@ -0,0 +1,201 @@
+'''
+    Forward Sensitivity Functions
+
+    Integrates the variational (tangent) equations alongside h and v so that the
+        derivatives of the whole trajectory with respect to the rocket parameters
+        come out of a single run. The tangent follows the discrete RK4 scheme of
+        RocketSimulation exactly, including the per-call mass update done by
+        Rocket.fuel_status, so the gradients match finite differences of run()
+        in the limit of small perturbations.
+
+    Functions:
+        run_sensitivity(sim, params):
+            Runs the simulation and returns d(state)/d(parameter) trajectories together
+                with the gradients of apogee and max velocity
+
+    Supported parameters:
+        m, thrust, burn_time, fuel_mass, C_D, A (Rocket fields; C_D only without a drag table)
+        h_0, v_0 (initial conditions)
+'''
+import numpy as np
+
+from src.ThrustCurve import ThrustCurve
+
+SENSITIVITY_PARAMS = ("m", "thrust", "burn_time", "fuel_mass", "C_D", "A", "h_0", "v_0")
+
+
+# Run the simulation while integrating the tangent of (h, v, mass)
+def run_sensitivity(sim, params=("m", "thrust", "burn_time", "fuel_mass", "C_D", "A")):
+    params = tuple(params)
+    unknown = [p for p in params if p not in SENSITIVITY_PARAMS]
+    if unknown:
+        raise ValueError(f"Unsupported sensitivity parameters: {', '.join(unknown)}")
+
+    rocket = sim.rocket
+    if rocket.drag_table is not None and "C_D" in params:
+        raise ValueError("C_D is not used when the rocket has a drag table")
+    n_params = len(params)
+    dt = sim.dt
+    G = sim.G
+
+    # Unit vectors picking out each parameter (zeros when it is not requested)
+    def unit(name):
+        e = np.zeros(n_params)
+        if name in params:
+            e[params.index(name)] = 1.0
+        return e
+
+    e_dry, e_thrust, e_burn = unit("m"), unit("thrust"), unit("burn_time")
+    e_fuel, e_CD, e_A = unit("fuel_mass"), unit("C_D"), unit("A")
+
+    # burn_rate = fuel_mass / burn_time
+    d_burn_rate = e_fuel / rocket.burn_time - e_burn * rocket.fuel_mass / rocket.burn_time**2
+
+    # Derivatives of the thrust profile w.r.t. max thrust and burn time (central differences
+    #   of the scalar profile only, so any user supplied profile works)
+    eps_thrust = 1e-6 * max(abs(rocket.thrust), 1.0)
+    eps_burn = 1e-6 * max(abs(rocket.burn_time), 1.0)
+
+    # The initial mass is dry mass + fuel mass
+    state = {"Sm": e_dry + e_fuel}
+
+    # Tangent of g(t, h, v): mirrors thrust_at_time, drag and g in RocketSimulation
+    def g_tangent(t, h, v, Sh, Sv):
+        # Mass update done by Rocket.fuel_status
+        if isinstance(rocket.thrust_profile, ThrustCurve):
+            # m = dry + fuel * (1 - burned_fraction(t * curve_burn_time / burn_time))
+            curve = rocket.thrust_profile
+            stretch = curve.burn_time / rocket.burn_time
+            fraction = curve.burned_fraction(t, rocket.burn_time)
+            d_fraction = curve.thrust(t * stretch) / curve.total_impulse
+            state["Sm"] = (e_dry + e_fuel * (1.0 - fraction)
+                           + e_burn * rocket.fuel_mass * d_fraction * t * stretch / rocket.burn_time)
+        elif t <= rocket.burn_time:
+            burned = rocket.m - rocket.burn_rate * dt
+            if burned > rocket.dry_mass:
+                state["Sm"] = state["Sm"] - d_burn_rate * dt
+            else:
+                state["Sm"] = e_dry.copy()
+        else:
+            state["Sm"] = e_dry.copy()
+        F_T = rocket.thrust_at_time(t, dt=dt)
+        m = rocket.m
+        Sm = state["Sm"]
+
+        profile = rocket.thrust_profile
+        dF_dthrust = (profile(t, rocket.burn_time, rocket.thrust + eps_thrust)
+                      - profile(t, rocket.burn_time, rocket.thrust - eps_thrust)) / (2 * eps_thrust)
+        dF_dburn = (profile(t, rocket.burn_time + eps_burn, rocket.thrust)
+                    - profile(t, rocket.burn_time - eps_burn, rocket.thrust)) / (2 * eps_burn)
+        S_FT = dF_dthrust * e_thrust + dF_dburn * e_burn
+
+        F_D = sim.drag(h, v)
+        rho = sim.rho
+        drho_dh = sim.air_density_gradient(h)
+        C_D, S_CD = rocket.C_D, e_CD
+        if rocket.drag_table is not None:
+            # C_D = table(|v| / a(h)), a follows the same temperature as rho
+            a_sound = sim.speed_of_sound(h)
+            mach = abs(v) / a_sound
+            C_D = rocket.drag_table(mach)
+            da_dh = sim.speed_of_sound_gradient(h)
+            slope = rocket.drag_table.slope(mach)
+            S_CD = slope * (np.sign(v) * Sv - mach * da_dh * Sh) / a_sound
+        S_FD = (0.5 * v**2 * C_D * rocket.A * drho_dh * Sh
+                + rho * C_D * rocket.A * v * Sv
+                + 0.5 * rho * v**2 * (rocket.A * S_CD + C_D * e_A))
+
+        F_net = F_T - m * G - F_D
+        a = F_net / m
+        S_a = (S_FT - G * Sm - S_FD) / m - F_net / m**2 * Sm
+        return a, S_a
+
+    # One RK4 step of the state and its tangent
+    def rk4_tangent_step(t, h, v, Sh, Sv):
+        s_1h = dt * v
+        s_1v, S_1v = g_tangent(t, h, v, Sh, Sv)
+        sim.mass_start = rocket.m
+        s_1v, S_1v, S_1h = dt * s_1v, dt * S_1v, dt * Sv
+
+        h_2, v_2 = h + 0.5 * s_1h, v + 0.5 * s_1v
+        Sh_2, Sv_2 = Sh + 0.5 * S_1h, Sv + 0.5 * S_1v
+        s_2v, S_2v = g_tangent(t + 0.5 * dt, h_2, v_2, Sh_2, Sv_2)
+        s_2h, S_2h = dt * v_2, dt * Sv_2
+        s_2v, S_2v = dt * s_2v, dt * S_2v
+
+        h_3, v_3 = h + 0.5 * s_2h, v + 0.5 * s_2v
+        Sh_3, Sv_3 = Sh + 0.5 * S_2h, Sv + 0.5 * S_2v
+        s_3v, S_3v = g_tangent(t + 0.5 * dt, h_3, v_3, Sh_3, Sv_3)
+        s_3h, S_3h = dt * v_3, dt * Sv_3
+        s_3v, S_3v = dt * s_3v, dt * S_3v
+
+        h_4, v_4 = h + s_3h, v + s_3v
+        Sh_4, Sv_4 = Sh + S_3h, Sv + S_3v
+        s_4v, S_4v = g_tangent(t + dt, h_4, v_4, Sh_4, Sv_4)
+        s_4h, S_4h = dt * v_4, dt * Sv_4
+        s_4v, S_4v = dt * s_4v, dt * S_4v
+
+        h_1 = h + (1./6.) * (s_1h + 2*s_2h + 2*s_3h + s_4h)
+        v_1 = v + (1./6.) * (s_1v + 2*s_2v + 2*s_3v + s_4v)
+        Sh_1 = Sh + (1./6.) * (S_1h + 2*S_2h + 2*S_3h + S_4h)
+        Sv_1 = Sv + (1./6.) * (S_1v + 2*S_2v + 2*S_3v + S_4v)
+        sim.accel_start = s_1v / dt
+        sim.accel_end = s_4v / dt
+        return t + dt, h_1, v_1, Sh_1, Sv_1
+
+    # Same loop and stopping rules as RocketSimulation.run
+    t = 0.0
+    h = sim.h_0
+    v = sim.v_0
+    Sh = unit("h_0")
+    Sv = unit("v_0")
+    S_h_list = []
+    S_v_list = []
+    sim.stop_reason = "end_time"
+
+    while (t <= sim.T):
+        stop_reason = sim.check_stop(t, h, v)
+        if stop_reason is not None:
+            sim.stop_reason = stop_reason
+            break
+
+        sim.times.append(t)
+        sim.altitudes.append(h)
+        sim.velocities.append(v)
+        S_h_list.append(Sh)
+        S_v_list.append(Sv)
+
+        stop_reason = sim.check_stop(t, h, v, recorded=True)
+        if stop_reason is not None:
+            sim.stop_reason = stop_reason
+            break
+
+        t, h, v, Sh, Sv = rk4_tangent_step(t, h, v, Sh, Sv)
+        sim.accelerations.append(sim.accel_start)
+        sim.masses.append(sim.mass_start)
+
+    sim.finish_result()
+
+    dh_dp = np.array(S_h_list).reshape(-1, n_params)
+    dv_dp = np.array(S_v_list).reshape(-1, n_params)
+    altitudes = np.array(sim.altitudes, dtype=np.float64)
+    velocities = np.array(sim.velocities, dtype=np.float64)
+
+    result = {
+        "params": params,
+        "times": np.array(sim.times, dtype=np.float64),
+        "altitudes": altitudes,
+        "velocities": velocities,
+        "dh_dp": dh_dp,
+        "dv_dp": dv_dp
+    }
+    if len(altitudes):
+        # The discrete apogee is the largest recorded altitude, so its gradient is the
+        #   altitude tangent at that sample (same for max velocity)
+        i_apogee = int(np.argmax(altitudes))
+        i_max_v = int(np.argmax(velocities))
+        result["apogee"] = float(altitudes[i_apogee])
+        result["apogee_gradient"] = dict(zip(params, dh_dp[i_apogee].tolist()))
+        result["max_velocity"] = float(velocities[i_max_v])
+        result["max_velocity_gradient"] = dict(zip(params, dv_dp[i_max_v].tolist()))
+    return result
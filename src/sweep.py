@@ -0,0 +1,161 @@
+'''
+    Multi-Fidelity Sweep Functions
+
+    Design sweeps run every candidate twice at most: first at a coarse time step
+        with summary-only output (screening), then only the candidates that
+        survive the screening at the production time step. The coarse and fine
+        results of the survivors (and optionally of the best rejected
+        candidates) are compared so the screening can be trusted.
+
+    Functions:
+        grid_from_preset(preset, **axes):
+            Returns the parameter dicts of a full factorial grid around a preset
+
+        spearman(a, b):
+            Spearman rank correlation of two sequences
+
+        multi_fidelity_sweep(param_list, criterion, keep, ...):
+            Screens candidates at coarse dt and refines the survivors at fine dt
+'''
+import time
+import itertools
+
+import numpy as np
+
+from src.batch import resolve_params, run_pool
+
+# Summary metrics compared between the two fidelities
+METRICS = ("apogee", "max_velocity", "flight_time")
+
+
+# Function to build a full factorial grid
+#   - e.g. grid_from_preset("Hellfire Missile", thrust=[4000, 5000], C_D=np.linspace(0.2, 0.4, 5))
+def grid_from_preset(preset: str, base: dict = None, **axes):
+    params = {"preset": preset, **(base or {})}
+    # Fails early on unknown presets
+    resolve_params(params)
+    names = list(axes)
+    grid = []
+    for values in itertools.product(*(axes[name] for name in names)):
+        candidate = dict(params)
+        candidate.update({name: float(value) for name, value in zip(names, values)})
+        grid.append(candidate)
+    return grid
+
+
+# Ranks with ties sharing their average rank
+def _ranks(values):
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values), dtype=np.float64)
+    _, group, counts = np.unique(values, return_inverse=True, return_counts=True)
+    return np.bincount(group, weights=ranks)[group] / counts[group]
+
+
+# Function to compute the Spearman rank correlation
+def spearman(a, b):
+    if len(a) < 2:
+        return np.nan
+    ra, rb = _ranks(a), _ranks(b)
+    if np.std(ra) == 0 or np.std(rb) == 0:
+        return np.nan
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+# Score of one summary (nan for failed runs)
+def _score(result: dict, criterion):
+    if "error" in result:
+        return np.nan
+    value = criterion(result) if callable(criterion) else result.get(criterion)
+    return np.nan if value is None else float(value)
+
+
+# Function to screen a list of candidates at coarse dt and refine the survivors
+#   - criterion: a summary metric ("apogee", ...) or a function of the summary dict
+#   - keep: number of survivors (int) or fraction of the candidates (float < 1)
+#   - accept: optional function of the coarse summary that rejects candidates outright
+#   - coarse_dt defaults to coarse_factor times each candidate's own dt; fine_dt (when
+#     given) replaces the candidates' dt for the refinement
+#   - audit reruns that many of the best rejected candidates at fine dt to check
+#     that none of them should have survived
+def multi_fidelity_sweep(param_list: list, criterion="apogee", keep=0.1, maximize: bool = True,
+                         accept=None, coarse_dt: float = None, coarse_factor: float = 10.0,
+                         fine_dt: float = None, audit: int = 0, processes: int = None, pool=None):
+    candidates = [resolve_params(params) for params in param_list]
+    sign = 1.0 if maximize else -1.0
+
+    # Screening pass
+    coarse_params = []
+    for params in candidates:
+        coarse = dict(params)
+        coarse["dt"] = coarse_dt if coarse_dt else params["dt"] * coarse_factor
+        coarse_params.append(coarse)
+    start = time.perf_counter()
+    coarse_results = run_pool(coarse_params, processes, pool=pool)
+    coarse_time = time.perf_counter() - start
+
+    coarse_scores = np.array([_score(r, criterion) for r in coarse_results])
+    eligible = ~np.isnan(coarse_scores)
+    if accept is not None:
+        eligible &= np.array(["error" not in r and bool(accept(r)) for r in coarse_results])
+
+    n_keep = keep if isinstance(keep, int) else int(np.ceil(keep * len(candidates)))
+    ranked = [i for i in np.argsort(-sign * coarse_scores, kind="mergesort") if eligible[i]]
+    survivors = ranked[:n_keep]
+    audited = ranked[n_keep:n_keep + audit]
+
+    # Refinement pass (survivors, then audited rejects)
+    fine_params = []
+    for i in survivors + audited:
+        fine = dict(candidates[i])
+        if fine_dt:
+            fine["dt"] = fine_dt
+        fine_params.append(fine)
+    start = time.perf_counter()
+    fine_results = run_pool(fine_params, processes, pool=pool) if fine_params else []
+    fine_time = time.perf_counter() - start
+
+    fine_by_index = dict(zip(survivors + audited, fine_results))
+    fine_scores = np.array([_score(fine_by_index[i], criterion) for i in survivors + audited])
+    survivor_fine = fine_scores[:len(survivors)]
+
+    # Fidelity discrepancy of every refined candidate
+    refined = survivors + audited
+    discrepancy = {}
+    for metric in METRICS:
+        pairs = [(fine_by_index[i].get(metric), coarse_results[i].get(metric)) for i in refined]
+        pairs = np.array([pair for pair in pairs if None not in pair], dtype=np.float64).reshape(-1, 2)
+        differences = np.abs(pairs[:, 0] - pairs[:, 1])
+        discrepancy[metric] = {
+            "max_abs": float(differences.max()) if len(pairs) else np.nan,
+            "max_rel": float((differences / np.maximum(np.abs(pairs[:, 0]), 1e-12)).max()) if len(pairs) else np.nan
+        }
+    score_error = np.abs(fine_scores - coarse_scores[refined]) if refined else np.array([])
+    discrepancy["score_max_abs"] = float(np.nanmax(score_error)) if len(score_error) else np.nan
+    discrepancy["spearman"] = spearman(coarse_scores[survivors], survivor_fine)
+
+    # The screening is safe when no score moved by more than the gap at the cut-off
+    margin = np.nan
+    if survivors and len(ranked) > len(survivors):
+        margin = abs(coarse_scores[survivors[-1]] - coarse_scores[ranked[len(survivors)]])
+    discrepancy["cutoff_margin"] = float(margin)
+    discrepancy["screening_safe"] = bool(np.isnan(margin) or discrepancy["score_max_abs"] <= margin / 2)
+    if audited:
+        # An audited reject beating the worst survivor at fine dt means the cut was wrong
+        worst_survivor = np.nanmin(sign * survivor_fine) if len(survivor_fine) else -np.inf
+        discrepancy["audit_misses"] = [int(i) for i, score in zip(audited, fine_scores[len(survivors):])
+                                       if sign * score > worst_survivor]
+
+    order = np.argsort(-sign * survivor_fine, kind="mergesort")
+    return {
+        "candidates": candidates,
+        "coarse": coarse_results,
+        "coarse_scores": coarse_scores,
+        "survivors": [int(survivors[j]) for j in order],
+        "fine": [fine_by_index[survivors[j]] for j in order],
+        "audited": [int(i) for i in audited],
+        "discrepancy": discrepancy,
+        "timing": {"coarse": coarse_time, "fine": fine_time,
+                   "coarse_runs": len(coarse_params), "fine_runs": len(fine_params)}
+    }
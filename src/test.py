@@ -1,12 +1,55 @@
+import os
+import csv
+import time
+import asyncio
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+
 from src.Rocket import Rocket
 from src.RocketSimulation import RocketSimulation
+from src.parareal import run_parareal
+from src.catalog import STATUS_INVALID, STATUS_OK, run_catalog
+from src.batch import make_pool, run_batch, run_params, simulation_from_params, summarize
+from src.checkpoint import load_checkpoint, segment_dir
+from src.WorkQueue import WorkQueue, start_local_workers
+from src.ResultsStore import ResultsStore
+from src.SharedResultPool import SharedResultPool
+from src.SimulationServer import SimulationClient, SimulationServer
+from src.analysis import select_dt
+from src.rendering import draw_comparison, draw_error_analysis, draw_trajectory, rasterize
+from src.CoastTable import CoastTable, coast_apogee, predict_apogees
+from src.FlightSurrogate import FlightSurrogate
+from src.unscented import sigma_points, unscented_transform
+from src.sweep import grid_from_preset, multi_fidelity_sweep, spearman
+from src.sampling import latin_hypercube, normal_ppf, run_until_converged, sample_params, sobol
+
+try:
+    from main import downsample, preview_dt_levels
+except ImportError:
+    # The GUI helpers need PyQt5
+    downsample = preview_dt_levels = None
+from src.DragTable import DragTable
+from src.ThrustCurve import parse_eng
+from src.RocketSimulation import AIR_GAS_CONST, HEAT_CAPACITY_RATIO
 
 '''
     test
 
         Test file to initialize rocket and simulator objects and run them
+
+        The unittest cases below check behavior without plotting:
+            python -m unittest src.test
 '''
 
+# Small model rocket used by the unit tests (cheap to simulate)
+MODEL_ROCKET = {"m": 0.05, "thrust": 10.0, "burn_time": 1.0, "fuel_mass": 0.0001,
+                "C_D": 0.75, "A": 0.004, "dt": 0.01, "T": 5.0}
+
 def modelRocketTest1():
     rocket = Rocket(m=0.14175,
                         thrust=3.424,
@@ -77,6 +120,59 @@ def SaturnVTest():
 
     sim.analysis()
 
+def SaturnVCheckpointTest():
+    SaturnV = Rocket(m = 137000.0,
+                        thrust = 34500000.0,
+                        burn_time = 168.0,
+                        fuel_mass = 203000.0,
+                        C_D = 0.80,
+                        A = 34.3589)
+
+    sim = RocketSimulation(SaturnV,
+                      h_0=0.0,
+                      v_0=0.0,
+                      theta=90.0,
+                      temp=288.15,
+                      pressure=101325.0,
+                      dt=0.01,
+                      T=30.0)
+
+    # Save the state every 10 simulated seconds (and at T)
+    sim.run(checkpoint_path="saturnv_checkpoint.npz", checkpoint_interval=10.0)
+
+    # Extend the run and fork a lower drag branch from the same saved state
+    extended = RocketSimulation.from_checkpoint("saturnv_checkpoint.npz", T=12000.0)
+    low_drag = RocketSimulation.from_checkpoint("saturnv_checkpoint.npz", T=12000.0, C_D=0.6)
+    extended.run()
+    low_drag.run()
+
+    extended.visualize()
+    low_drag.visualize()
+
+def SaturnVPararealTest():
+    SaturnV = Rocket(m = 137000.0,
+                        thrust = 34500000.0,
+                        burn_time = 168.0,
+                        fuel_mass = 203000.0,
+                        C_D = 0.80,
+                        A = 34.3589)
+
+    sim = RocketSimulation(SaturnV,
+                      h_0=0.0,
+                      v_0=0.0,
+                      theta=90.0,
+                      temp=288.15,
+                      pressure=101325.0,
+                      dt=0.001,
+                      T=45.0)
+
+    # Eight time slices refined on a process pool, compared against a serial run()
+    report = run_parareal(sim, slices=8)
+    print(f"Parareal: {report['iterations']} iterations, speedup {report['speedup']:.2f}x "
+          f"(max altitude difference {report['max_altitude_difference']:.2e} m)")
+
+    sim.visualize()
+
 def V2Test():
     # Define the thrust profile
     def V2_thrust_profile(t, burn_time, max_thrust):
@@ -120,6 +216,730 @@ def V2Test():
     # analyze convergence
     sim.analysis()
 
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_csv(self, rows):
+        path = os.path.join(self.tmp.name, "catalog.csv")
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerows(rows)
+        return path
+
+    def test_malformed_row_is_the_only_invalid_row(self):
+        fields = ["m", "thrust", "burn_time", "fuel_mass", "C_D", "A", "T"]
+        rows = [fields] + [[MODEL_ROCKET[name] for name in fields] for _ in range(50)]
+        rows[11] = rows[11][:4]
+        rows[31] = rows[31] + [1.0]
+        output = os.path.join(self.tmp.name, "results.npy")
+
+        counts = run_catalog(self.write_csv(rows), output, processes=1, chunk_size=40)
+        self.assertEqual(counts, {"rows": 50, "ok": 48, "invalid": 2, "failed": 0})
+        status = np.load(output)["status"]
+        self.assertEqual(list(np.flatnonzero(status == STATUS_INVALID)), [10, 30])
+
+    def test_unknown_preset_is_invalid(self):
+        path = self.write_csv([["preset", "T"], ["V2 Rocket", 5.0], ["No Such Rocket", 5.0]])
+        output = os.path.join(self.tmp.name, "results.npy")
+
+        run_catalog(path, output, processes=1)
+        self.assertEqual(list(np.load(output)["status"]), [STATUS_OK, STATUS_INVALID])
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "checkpoint.npz")
+
+    def test_resume_matches_uninterrupted_run(self):
+        full = simulation_from_params(MODEL_ROCKET)
+        full.run()
+
+        first = simulation_from_params(dict(MODEL_ROCKET, T=2.0))
+        first.run(checkpoint_path=self.path, checkpoint_interval=0.5)
+        resumed = RocketSimulation.from_checkpoint(self.path, T=MODEL_ROCKET["T"])
+        self.assertFalse(resumed.verbose)
+        resumed.run(checkpoint_path=self.path, checkpoint_interval=0.5)
+
+        self.assertEqual(resumed.times, full.times)
+        self.assertEqual(resumed.altitudes, full.altitudes)
+        self.assertEqual(resumed.velocities, full.velocities)
+
+    def test_segments_hold_each_sample_once(self):
+        sim = simulation_from_params(MODEL_ROCKET)
+        sim.run(checkpoint_path=self.path, checkpoint_interval=0.1)
+
+        checkpoint = load_checkpoint(self.path)
+        stored = 0
+        for name in os.listdir(segment_dir(self.path)):
+            with np.load(os.path.join(segment_dir(self.path), name)) as segment:
+                stored += len(segment["times"])
+        self.assertEqual(stored, checkpoint["samples"])
+        self.assertEqual(checkpoint["times"], sim.times[:checkpoint["samples"]])
+
+
+class WorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.queue = WorkQueue(self.tmp.name)
+        self.params = [dict(MODEL_ROCKET, thrust=thrust) for thrust in (8.0, 10.0, 12.0)]
+
+    def test_worker_results_match_run_batch(self):
+        task_ids = self.queue.submit(self.params, batch_size=2)
+        self.assertEqual(self.queue.work("worker", poll_interval=0.01), 2)
+
+        results = [r for batch in self.queue.wait(task_ids, timeout=10) for r in batch]
+        self.assertEqual(results, run_batch(self.params, include_trajectory=False))
+        self.assertEqual(self.queue.status(), {"pending": 0, "claimed": 0, "done": 2})
+
+    # Several processes race for the same pending files; every task ends up in done/ once
+    def test_local_worker_processes(self):
+        param_list = [dict(MODEL_ROCKET, C_D=0.5 + 0.02 * i) for i in range(24)]
+        task_ids = self.queue.submit(param_list, batch_size=1)
+        workers = start_local_workers(self.tmp.name, 4, poll_interval=0.01, stale_after=600)
+        for worker in workers:
+            worker.join(60)
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+
+        self.assertEqual(self.queue.status(), {"pending": 0, "claimed": 0, "done": 24})
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp.name, "done"))),
+                         sorted(f"{task_id}.json" for task_id in task_ids))
+        results = [r for batch in self.queue.wait(task_ids, timeout=10) for r in batch]
+        self.assertEqual(results, run_batch(param_list, include_trajectory=False))
+
+    def test_claim_is_not_stale_right_away(self):
+        task_id, = self.queue.submit(self.params)
+        # A task that waited in pending/ for a long time
+        old = time.time() - 3600
+        os.utime(os.path.join(self.tmp.name, "pending", f"{task_id}.json"), (old, old))
+
+        claim_path, task = self.queue.claim("worker")
+        self.assertEqual(self.queue.reclaim_stale(stale_after=60), [])
+        self.assertEqual(len(task["params"]), 3)
+
+        # Without heartbeats the claim goes back to pending/ and is dropped on completion
+        os.utime(claim_path, (old, old))
+        self.assertEqual(self.queue.reclaim_stale(stale_after=60), [task_id])
+        self.assertFalse(self.queue.complete(claim_path, []))
+        self.assertEqual(self.queue.status()["pending"], 1)
+
+
+class DerivedChannelTest(unittest.TestCase):
+    # The acceleration channel is recomputed from thrust, mass and drag; the run stored g() itself
+    def assertChannelsMatchRun(self, trajectory):
+        np.testing.assert_allclose(trajectory.acceleration[:-1], trajectory.accelerations[:-1],
+                                   rtol=1e-9, atol=1e-9)
+
+    def test_plain_run(self):
+        sim = simulation_from_params({"preset": "Patriot Missile", "T": 20.0})
+        sim.run()
+        self.assertChannelsMatchRun(sim.result)
+
+    def test_phased_run_with_coast_step(self):
+        sim = simulation_from_params(dict(MODEL_ROCKET, thrust_profile="quarter"))
+        sim.run_phased(coast_dt=0.1)
+        self.assertChannelsMatchRun(sim.result)
+
+    def test_resumed_run_with_new_step(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "checkpoint.npz")
+            simulation_from_params(dict(MODEL_ROCKET, T=0.5)).run(checkpoint_path=path, checkpoint_interval=0.25)
+            sim = RocketSimulation.from_checkpoint(path, T=MODEL_ROCKET["T"], dt=0.003)
+        sim.run()
+        self.assertChannelsMatchRun(sim.result)
+        self.assertEqual(sim.result.mass[-1], sim.rocket.dry_mass)
+
+
+class SelectDtTest(unittest.TestCase):
+    def make_sim(self, dt):
+        return simulation_from_params(dict(MODEL_ROCKET, dt=dt))
+
+    def test_pick_meets_tolerance(self):
+        result = select_dt(self.make_sim, 0.01)
+        self.assertTrue(result["verified"])
+        self.assertLessEqual(result["estimated_error"], 0.01)
+        # Pilots stop shortly after the apogee instead of running to T
+        self.assertLess(result["pilot_T"], MODEL_ROCKET["T"])
+
+    def test_unmet_tolerance_returns_the_checked_step(self):
+        pick = select_dt(self.make_sim, 1e-12, verify=False)["dt"]
+        result = select_dt(self.make_sim, 1e-12, max_attempts=1)
+        self.assertEqual(result["dt"], pick)
+        self.assertFalse(result["verified"])
+        self.assertGreater(result["estimated_error"], 1e-12)
+
+
+class CoastTableTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.table = CoastTable(288.15, 101325.0, shape=(21, 21, 13))
+        cls.table.build()
+
+    def test_coast_apogee_without_drag_is_ballistic(self):
+        apogee = coast_apogee([0.0, 1000.0], [50.0, 200.0], 1e12)
+        np.testing.assert_allclose(apogee, [50.0**2 / (2 * 9.8067), 1000.0 + 200.0**2 / (2 * 9.8067)],
+                                   rtol=1e-6)
+
+    def test_reported_error_bounds_interpolation(self):
+        self.assertLessEqual(self.table.check(n=500)["max_ratio"], 1.0)
+
+    def test_predictions_match_run_within_reported_error(self):
+        presets = ["Hellfire Missile", "Model Rocket 2", "Estes C6 Model Rocket", "V2 Rocket", "Patriot Missile"]
+        param_list = [{"preset": preset, "C_D_mach": None} for preset in presets]
+        for params, prediction in zip(param_list, predict_apogees(param_list, table=self.table)):
+            apogee = run_params(params, include_trajectory=False)["apogee"]
+            self.assertLessEqual(abs(prediction["apogee"] - apogee), prediction["apogee_error"] + 1e-9,
+                                 params["preset"])
+
+
+class ComparisonPlotTest(unittest.TestCase):
+    def test_comparison_rasterizes_off_the_gui_thread(self):
+        runs = []
+        for thrust in (8.0, 12.0):
+            sim = simulation_from_params(dict(MODEL_ROCKET, thrust=thrust))
+            sim.run()
+            runs.append((f"thrust {thrust:g}", max(sim.altitudes), (sim.times, sim.altitudes),
+                         (sim.times, sim.velocities)))
+        image = rasterize(draw_comparison, 400, 300, 100.0, runs)
+        self.assertEqual(image.shape, (300, 400, 4))
+        # Something besides the white background was drawn
+        self.assertLess(image[..., :3].min(), 128)
+
+    # A run without samples (apogee None) keeps its legend entry instead of breaking the plot
+    def test_failed_run_in_comparison(self):
+        sim = simulation_from_params(MODEL_ROCKET)
+        sim.run()
+        runs = [("ok", max(sim.altitudes), (sim.times, sim.altitudes), (sim.times, sim.velocities)),
+                ("failed", None, ([], []), ([], []))]
+        figure = Figure()
+        draw_comparison(figure, runs)
+        labels = [text.get_text() for text in figure.axes[0].get_legend().get_texts()]
+        self.assertEqual(labels, [f"ok (apogee {max(sim.altitudes):.0f} m)", "failed (apogee n/a)"])
+        self.assertEqual(rasterize(draw_comparison, 400, 300, 100.0, runs).shape, (300, 400, 4))
+
+
+class SimulationServerTest(unittest.TestCase):
+    def test_make_pool_starts_every_worker(self):
+        pool = make_pool(2)
+        try:
+            self.assertEqual(len(pool._processes), 2)
+        finally:
+            pool.shutdown()
+
+    def test_identical_requests_share_a_job(self):
+        async def scenario():
+            server = SimulationServer(port=0, processes=1)
+            await server.start()
+            try:
+                client = SimulationClient(port=server.port, timeout=30)
+                first = await asyncio.to_thread(client.submit, MODEL_ROCKET)
+                second = await asyncio.to_thread(client.submit, MODEL_ROCKET)
+                result = await asyncio.to_thread(client.result, first["job_id"])
+                return first, second, result
+            finally:
+                await server.close()
+
+        first, second, result = asyncio.run(scenario())
+        self.assertEqual(first["job_id"], second["job_id"])
+        self.assertEqual(result["result"]["apogee"], run_params(MODEL_ROCKET)["apogee"])
+
+    # Invalid parameters are a 400 and register no job
+    def test_invalid_params_rejected(self):
+        async def scenario():
+            server = SimulationServer(port=0, processes=1)
+            await server.start()
+            try:
+                client = SimulationClient(port=server.port, timeout=30)
+                errors = []
+                for params in (dict(MODEL_ROCKET, dt=0), dict(MODEL_ROCKET, m=[1]), dict(MODEL_ROCKET, T="nan"),
+                               [MODEL_ROCKET, dict(MODEL_ROCKET, dt=-1.0)]):
+                    try:
+                        await asyncio.to_thread(client.submit, params)
+                    except RuntimeError as e:
+                        errors.append(str(e))
+                return errors, dict(server.jobs), await asyncio.to_thread(client.simulate, MODEL_ROCKET)
+            finally:
+                await server.close()
+
+        errors, jobs, result = asyncio.run(scenario())
+        self.assertEqual(len(errors), 4)
+        self.assertIn("dt must be positive", errors[0])
+        self.assertIn("m must be a number", errors[1])
+        self.assertIn("T must be finite", errors[2])
+        self.assertEqual(jobs, {})
+        self.assertEqual(result["status"], "done")
+
+    # A coalesced batch is split across the workers instead of running on one
+    def test_batch_runs_on_every_worker(self):
+        param_list = [dict(MODEL_ROCKET, C_D=0.5 + 0.05 * i, dt=0.001) for i in range(8)]
+
+        async def scenario():
+            server = SimulationServer(port=0, processes=2, batch_window=0.5)
+            await server.start()
+            try:
+                client = SimulationClient(port=server.port, timeout=60)
+                results = await asyncio.to_thread(client.simulate, param_list)
+                return results, server.status()
+            finally:
+                await server.close()
+
+        results, status = asyncio.run(scenario())
+        self.assertEqual(status["batches"], 1)
+        self.assertEqual(status["batched_jobs"], 8)
+        self.assertEqual(len({result["worker"] for result in results}), 2)
+        for params, result in zip(param_list, results):
+            self.assertEqual(result["result"]["apogee"], run_params(params)["apogee"])
+
+    # The ndjson stream, over a Unix socket: status lines, the summary, then the trajectory
+    def test_stream_over_unix_socket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            unix_path = os.path.join(tmp, "rocket.sock")
+
+            async def scenario():
+                server = SimulationServer(unix_path=unix_path, processes=1, stream_chunk=100)
+                await server.start()
+                try:
+                    client = SimulationClient(unix_path=unix_path, timeout=30)
+                    job = await asyncio.to_thread(client.submit, MODEL_ROCKET)
+                    return await asyncio.to_thread(lambda: list(client.stream(job["job_id"])))
+                finally:
+                    await server.close()
+
+            lines = asyncio.run(scenario())
+            self.assertFalse(os.path.exists(unix_path))
+
+        expected = run_params(MODEL_ROCKET)
+        summary_index = next(i for i, line in enumerate(lines) if "summary" in line)
+        self.assertEqual(lines[summary_index]["status"], "done")
+        self.assertEqual(lines[summary_index]["summary"]["apogee"], expected["apogee"])
+        chunks = lines[summary_index + 1:]
+        self.assertEqual([chunk["start"] for chunk in chunks], list(range(0, len(expected["times"]), 100)))
+        self.assertEqual(sum((chunk["altitudes"] for chunk in chunks), []), expected["altitudes"])
+
+
+class PararealTest(unittest.TestCase):
+    # The stitched fine slices reproduce a serial run(), up to a landing inside a slice
+    def assertMatchesRun(self, params):
+        sim = simulation_from_params(params)
+        report = run_parareal(sim, slices=4, processes=2)
+        serial = simulation_from_params(params)
+        serial.run()
+
+        self.assertTrue(report["converged"])
+        self.assertLessEqual(report["iterations"], 4)
+        self.assertEqual(sim.stop_reason, serial.stop_reason)
+        self.assertEqual(len(sim.times), len(serial.times))
+        for name in ("times", "altitudes", "velocities"):
+            np.testing.assert_allclose(getattr(sim, name), getattr(serial, name), rtol=0, atol=1e-9)
+        return report
+
+    def test_matches_serial_run(self):
+        report = self.assertMatchesRun(dict(MODEL_ROCKET, dt=0.001))
+        self.assertEqual(report["slices_used"], 4)
+
+    def test_landing_inside_a_slice(self):
+        report = self.assertMatchesRun(dict(MODEL_ROCKET, dt=0.001, T=10.0))
+        self.assertEqual(report["slices_used"], 3)
+
+
+class ResultsStoreTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = ResultsStore(tmp.name)
+        self.addCleanup(self.store.close)
+        self.params = [dict(MODEL_ROCKET, thrust=thrust) for thrust in (8.0, 10.0, 12.0)]
+
+    def blobs(self):
+        return os.listdir(self.store.blob_dir)
+
+    def test_query_and_trajectory(self):
+        self.assertEqual(self.store.run(self.params, processes=1), 3)
+        self.assertEqual(self.store.run(self.params, processes=1), 0)
+
+        expected = run_batch(self.params, include_trajectory=False)
+        apogees = sorted(result["apogee"] for result in expected)
+        rows = self.store.query(apogee__ge=apogees[1], order_by="-apogee")
+        self.assertEqual([row["apogee"] for row in rows], apogees[:0:-1])
+
+        trajectory = self.store.trajectory(self.store.get(self.params[0]))
+        self.assertEqual(trajectory.altitudes.max(), expected[0]["apogee"])
+
+    def test_replacing_a_run_leaves_no_orphan_blob(self):
+        self.store.run(self.params[:1], processes=1)
+        sim = simulation_from_params(self.params[0])
+        sim.run()
+        arrays = [sim.times, sim.altitudes, sim.velocities, sim.accelerations, sim.masses]
+
+        self.store.insert(self.params[0], summarize(sim), arrays)
+        self.assertEqual(self.blobs(), [self.store.get(self.params[0])["blob"]])
+        self.store.insert(self.params[0], summarize(sim))
+        self.assertEqual(self.blobs(), [])
+        self.assertEqual(len(self.store), 1)
+
+    # A bad record after earlier ones wrote their blobs rolls back every blob
+    def test_failed_batch_leaves_no_blob(self):
+        sim = simulation_from_params(self.params[0])
+        sim.run()
+        arrays = [sim.times, sim.altitudes, sim.velocities, sim.accelerations, sim.masses]
+        records = [(self.params[0], summarize(sim), arrays), (self.params[1], summarize(sim), arrays),
+                   (dict(MODEL_ROCKET, dt=0), summarize(sim), arrays)]
+        with self.assertRaises(ValueError):
+            self.store.insert_many(records)
+        self.assertEqual(self.blobs(), [])
+        self.assertEqual(len(self.store), 0)
+
+
+class DragTableTest(unittest.TestCase):
+    def test_lookup_interpolates_and_holds_ends(self):
+        table = DragTable([0.5, 1.0, 2.0], [0.3, 0.5, 0.4])
+        self.assertAlmostEqual(table(0.0), 0.3)
+        self.assertAlmostEqual(table(1.5), 0.45, places=3)
+        self.assertAlmostEqual(table(5.0), 0.4)
+        np.testing.assert_allclose(table(np.array([0.0, 1.5, 5.0])), [0.3, 0.45, 0.4], atol=1e-3)
+
+    # Mach number and air density come from the same temperature, above the tropopause too
+    def test_one_atmosphere(self):
+        sim = simulation_from_params({"preset": "Patriot Missile"})
+        h = np.array([0.0, 5000.0, 15000.0, 30000.0])
+        temp = sim.temperature(h)
+        np.testing.assert_allclose(sim.speed_of_sound(h), np.sqrt(HEAT_CAPACITY_RATIO * AIR_GAS_CONST * temp))
+        np.testing.assert_allclose(sim.air_density_array(h), [sim.air_density(x) for x in h])
+        np.testing.assert_allclose(sim.air_density_array(h) * AIR_GAS_CONST * temp,
+                                   sim.pressure * (temp / sim.temp) ** (-sim.G / (AIR_GAS_CONST * -0.0065)))
+
+    # Where the temperature reaches 0 K there is no air: Mach 0 and no drag, not NaN
+    def test_no_air_gives_no_drag(self):
+        sim = simulation_from_params({"preset": "Patriot Missile"})
+        self.assertEqual(sim.speed_of_sound(50000.0), np.inf)
+        self.assertEqual(sim.speed_of_sound_gradient(50000.0), 0.0)
+        with np.errstate(invalid="ignore"):
+            self.assertEqual(sim.drag(50000.0, 1500.0), 0.0)
+        sim.run()
+        self.assertTrue(np.all(np.isfinite(sim.result.accelerations)))
+
+
+class SensitivityTest(unittest.TestCase):
+    # The tangent follows the discrete RK4 scheme, so it matches finite differences of run()
+    def test_apogee_gradient_matches_finite_differences(self):
+        result = simulation_from_params(MODEL_ROCKET).sensitivity(("C_D", "thrust", "m"))
+        self.assertAlmostEqual(result["apogee"], run_params(MODEL_ROCKET, False)["apogee"])
+        for name, gradient in result["apogee_gradient"].items():
+            eps = 1e-6 * MODEL_ROCKET[name]
+            upper = run_params(dict(MODEL_ROCKET, **{name: MODEL_ROCKET[name] + eps}), False)["apogee"]
+            lower = run_params(dict(MODEL_ROCKET, **{name: MODEL_ROCKET[name] - eps}), False)["apogee"]
+            self.assertAlmostEqual(gradient, (upper - lower) / (2 * eps), delta=1e-4 * abs(gradient))
+
+    def test_rejects_unknown_parameter(self):
+        with self.assertRaises(ValueError):
+            simulation_from_params(MODEL_ROCKET).sensitivity(("G",))
+
+    # Leaving the atmosphere stops the tangent run through the same rule as run()
+    def test_stops_like_run(self):
+        params = {"m": 100.0, "thrust": 30000.0, "burn_time": 20.0, "fuel_mass": 50.0,
+                  "C_D": 0.3, "A": 0.05, "dt": 0.01, "T": 200.0}
+        with np.errstate(invalid="ignore"):
+            sim = simulation_from_params(params)
+            result = sim.sensitivity(("m",))
+            plain = simulation_from_params(params)
+            plain.run()
+        self.assertEqual(sim.stop_reason, "exited_atmosphere")
+        self.assertEqual(plain.stop_reason, "exited_atmosphere")
+        np.testing.assert_array_equal(result["altitudes"], plain.altitudes)
+
+    def test_check_stop_rules(self):
+        sim = simulation_from_params(MODEL_ROCKET)
+        self.assertEqual(sim.check_stop(0.5, -1.0, 0.0), None)
+        self.assertEqual(sim.check_stop(1.5, -1.0, 0.0), "landed")
+        self.assertEqual(sim.check_stop(1.5, np.nan, 0.0), "nan")
+        self.assertEqual(sim.check_stop(1.5, 1.0e5, 0.0, recorded=True), "exited_atmosphere")
+        self.assertEqual(sim.check_stop(2.5, -0.01, 0.0, recorded=True), "landed")
+        self.assertEqual(sim.check_stop(1.5, -0.01, 0.0, recorded=True), None)
+
+
+class TrajectoryTest(unittest.TestCase):
+    def test_dense_output_between_steps(self):
+        coarse = simulation_from_params(dict(MODEL_ROCKET, dt=0.05))
+        coarse.run()
+        fine = simulation_from_params(dict(MODEL_ROCKET, dt=0.001))
+        fine.run()
+        trajectory = coarse.result
+
+        # Exact at the stored samples, close to a fine run between them
+        np.testing.assert_array_equal(trajectory.altitude(trajectory.times), trajectory.altitudes)
+        t = np.linspace(0.1, 4.0, 37)
+        np.testing.assert_allclose(trajectory.altitude(t), fine.result.altitude(t), atol=1e-2)
+        np.testing.assert_allclose(trajectory.velocity(t), fine.result.velocity(t), atol=1e-2)
+        self.assertTrue(np.isnan(trajectory.altitude(trajectory.times[-1] + 1.0)))
+
+    def test_resample(self):
+        sim = simulation_from_params(MODEL_ROCKET)
+        sim.run()
+        t_grid, h, v = sim.result.resample(0.5)
+        np.testing.assert_allclose(t_grid, np.arange(len(t_grid)) * 0.5)
+        self.assertLess(sim.result.times[-1] - t_grid[-1], 0.5 + 1e-9)
+        # Grid points fall on recorded samples (every 50 steps of 0.01 s)
+        np.testing.assert_allclose(h, sim.result.altitudes[::50][:len(h)], atol=1e-6)
+        np.testing.assert_allclose(v, sim.result.velocities[::50][:len(v)], atol=1e-6)
+
+
+class ThrustCurveTest(unittest.TestCase):
+    ENG = "; triangle\nT1 18 70 0 0.01 0.03 Test\n1.0 10.0\n2.0 0.0\n"
+
+    def test_parse_and_tables(self):
+        curve = parse_eng(self.ENG)
+        self.assertEqual(curve.burn_time, 2.0)
+        self.assertEqual(curve.peak_thrust, 10.0)
+        self.assertAlmostEqual(curve.total_impulse, 10.0, places=3)
+        self.assertAlmostEqual(curve.thrust(0.5), 5.0, places=6)
+        self.assertEqual(curve.impulse(3.0), curve.total_impulse)
+        np.testing.assert_allclose(curve.thrust(np.array([0.0, 0.5, 3.0])), [0.0, 5.0, 0.0], atol=1e-6)
+        # Stretched to twice the burn time and scaled to a 20 N peak
+        self.assertAlmostEqual(curve(1.0, 4.0, 20.0), 10.0, places=6)
+        self.assertAlmostEqual(curve.burned_fraction(2.0, 4.0), 0.5, places=3)
+
+    def test_malformed_header(self):
+        with self.assertRaises(ValueError):
+            parse_eng("T1 18 70\n1.0 10.0\n")
+
+    # The mass channel of an engine-curve run ends at the dry mass
+    def test_engine_preset_run(self):
+        sim = simulation_from_params({"preset": "Estes C6 Model Rocket"})
+        sim.run()
+        self.assertEqual(sim.stop_reason, "landed")
+        self.assertAlmostEqual(sim.result.mass[-1], sim.rocket.dry_mass)
+        self.assertGreater(max(sim.altitudes), 0.0)
+
+
+class SharedResultPoolTest(unittest.TestCase):
+    # Arrays written by the workers match a run in this process, and released blocks are freed
+    def test_map_and_release(self):
+        param_list = [MODEL_ROCKET, dict(MODEL_ROCKET, C_D=0.5)]
+        pool = SharedResultPool(processes=2)
+        try:
+            results = pool.map(param_list)
+            for params, result in zip(param_list, results):
+                sim = simulation_from_params(params)
+                sim.run()
+                np.testing.assert_array_equal(result.altitudes, sim.altitudes)
+                np.testing.assert_array_equal(result.masses, sim.masses)
+                self.assertEqual(result.summary["apogee"], summarize(sim)["apogee"])
+                self.assertAlmostEqual(result.trajectory().mass[-1], sim.rocket.dry_mass)
+            self.assertEqual(len(pool.blocks), 2)
+            for result in results:
+                result.release()
+            self.assertEqual(pool.blocks, {})
+        finally:
+            pool.close()
+
+    # Blocks hold exactly the recorded samples, not T / dt of them
+    def test_block_sized_to_the_run(self):
+        params = dict(MODEL_ROCKET, T=1000.0, dt=0.001)
+        with SharedResultPool(processes=1) as pool:
+            result = pool.submit(params).result()
+            self.assertEqual(result.summary["stop_reason"], "landed")
+            self.assertEqual(result.shm.size, 5 * len(result.times) * 8)
+            self.assertLess(len(result.times), 10000)
+            self.assertEqual(result.summary["length"], len(result.times))
+            result.release()
+
+
+class PhasedRunTest(unittest.TestCase):
+    # Above ~44 km there is no air left, so the last part of the flight is a vacuum arc
+    HIGH_ROCKET = {"m": 100.0, "thrust": 20000.0, "burn_time": 20.0, "fuel_mass": 50.0,
+                   "C_D": 0.3, "A": 0.05, "dt": 0.01, "T": 60.0}
+
+    def test_same_step_matches_run(self):
+        plain = simulation_from_params(MODEL_ROCKET)
+        plain.run()
+        phased = simulation_from_params(MODEL_ROCKET)
+        steps = phased.run_phased()
+        self.assertEqual(summarize(phased), summarize(plain))
+        self.assertEqual(steps, {"powered": 100, "coast": 401, "vacuum": 0})
+        self.assertEqual([name for name, _, _ in phased.phases], ["powered", "coast"])
+
+    def test_vacuum_arc(self):
+        with np.errstate(invalid="ignore"):
+            plain = simulation_from_params(self.HIGH_ROCKET)
+            plain.run()
+            phased = simulation_from_params(self.HIGH_ROCKET)
+            steps = phased.run_phased()
+        self.assertEqual(steps["vacuum"], 1)
+        self.assertEqual(phased.phases[-1][0], "vacuum")
+        self.assertLess(len(phased.times), len(plain.times))
+        self.assertAlmostEqual(summarize(phased)["apogee"], summarize(plain)["apogee"], delta=1e-3)
+        t = np.linspace(40.0, 59.0, 5)
+        np.testing.assert_allclose(phased.result.altitude(t), plain.result.altitude(t), atol=1e-3)
+
+
+class FlightSurrogateTest(unittest.TestCase):
+    def test_predict_inside_and_outside(self):
+        surrogate = FlightSurrogate(MODEL_ROCKET, {"C_D": (0.5, 1.0), "thrust": (8.0, 12.0)})
+        surrogate.fit(40, processes=2)
+        query = {"C_D": [0.6, 0.9, 2.0], "thrust": [9.0, 11.0, 10.0]}
+        prediction = surrogate.predict(query)
+        np.testing.assert_array_equal(prediction["inside"], [True, True, False])
+        np.testing.assert_array_equal(prediction["simulated"], [False, False, True])
+
+        for i, (C_D, thrust) in enumerate(zip(query["C_D"], query["thrust"])):
+            apogee = run_params(dict(MODEL_ROCKET, C_D=C_D, thrust=thrust), False)["apogee"]
+            self.assertAlmostEqual(prediction["apogee"][i], apogee, delta=0.1)
+        # Outside the box the value is a real run
+        self.assertEqual(prediction["apogee_error"][2], 0.0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "surrogate.npz")
+            surrogate.save(path)
+            loaded = FlightSurrogate.load(path)
+        np.testing.assert_array_equal(loaded.predict(query, fallback=False)["apogee"][:2],
+                                      prediction["apogee"][:2])
+
+    def test_rejects_inverted_bounds(self):
+        with self.assertRaises(ValueError):
+            FlightSurrogate(MODEL_ROCKET, {"C_D": (1.0, 0.5)})
+
+
+class LivePreviewTest(unittest.TestCase):
+    # cancel() from another thread stops a long run at the next step
+    def test_cancel_stops_run(self):
+        sim = simulation_from_params(dict(MODEL_ROCKET, dt=1e-5, T=1000.0))
+        timer = threading.Timer(0.05, sim.cancel)
+        timer.start()
+        sim.run()
+        timer.join()
+        self.assertEqual(sim.stop_reason, "cancelled")
+        self.assertLess(sim.times[-1], sim.T)
+        self.assertEqual(len(sim.result), len(sim.times))
+
+    @unittest.skipIf(preview_dt_levels is None, "PyQt5 is not installed")
+    def test_preview_levels(self):
+        levels = preview_dt_levels(0.001, 100.0)
+        self.assertEqual(levels[-1], 0.001)
+        self.assertEqual(levels, sorted(levels, reverse=True))
+        self.assertLessEqual(100.0 / levels[0], 2000 * 4)
+        self.assertEqual(preview_dt_levels(0.01, 5.0), [0.01])
+
+    @unittest.skipIf(downsample is None, "PyQt5 is not installed")
+    def test_downsample_keeps_peaks(self):
+        t = np.linspace(0.0, 10.0, 100001)
+        values = np.sin(t)
+        values[31234] = 5.0
+        times, kept = downsample(t, values, max_points=200)
+        self.assertLessEqual(len(kept), 201)
+        self.assertEqual(kept.max(), 5.0)
+        self.assertEqual(kept.min(), values.min())
+        self.assertEqual(times[-1], t[-1])
+
+
+class SamplingTest(unittest.TestCase):
+    def test_sobol_sequence(self):
+        np.testing.assert_array_equal(sobol(4, 2, scramble=False),
+                                      [[0.0, 0.0], [0.5, 0.5], [0.75, 0.25], [0.25, 0.75]])
+        # Scrambled points still fall one per 1/16 slice in every dimension
+        points = sobol(16, 3, seed=1)
+        for column in points.T:
+            self.assertEqual(sorted(np.floor(column * 16).astype(int)), list(range(16)))
+        # Skipped points continue the same sequence
+        np.testing.assert_array_equal(sobol(8, 2, seed=2, skip=8), sobol(16, 2, seed=2)[8:])
+
+    def test_latin_hypercube_strata(self):
+        design = latin_hypercube(10, 2, rng=0)
+        for column in design.T:
+            self.assertEqual(sorted(np.floor(column * 10).astype(int)), list(range(10)))
+
+    def test_normal_ppf(self):
+        np.testing.assert_allclose(normal_ppf([0.5, 0.975, 0.001]), [0.0, 1.959964, -3.090232], atol=1e-6)
+
+    def test_sample_params(self):
+        param_list = sample_params(MODEL_ROCKET, {"C_D": ("uniform%", 10), "thrust": ("normal", 10.0, 0.5)}, 8)
+        self.assertEqual(len(param_list), 8)
+        for params in param_list:
+            self.assertTrue(0.675 <= params["C_D"] <= 0.825)
+            self.assertEqual(params["m"], MODEL_ROCKET["m"])
+        with self.assertRaises(ValueError):
+            sample_params(MODEL_ROCKET, {"mass": ("uniform", 0.0, 1.0)}, 8)
+
+    def test_run_until_converged(self):
+        result = run_until_converged(MODEL_ROCKET, {"C_D": ("uniform%", 5)}, rtol=1e-3,
+                                     replicates=4, n_start=8, n_max=256, processes=2)
+        self.assertTrue(result["converged"])
+        self.assertLessEqual(result["standard_error"], 1e-3 * result["estimate"])
+        self.assertAlmostEqual(result["estimate"], run_params(MODEL_ROCKET, False)["apogee"], delta=0.5)
+
+
+class SweepTest(unittest.TestCase):
+    def test_grid_from_preset(self):
+        grid = grid_from_preset("Model Rocket 1", C_D=[0.5, 0.7, 0.9], thrust=[8.0, 10.0])
+        self.assertEqual(len(grid), 6)
+        self.assertEqual(grid[1], {"preset": "Model Rocket 1", "C_D": 0.5, "thrust": 10.0})
+        with self.assertRaises(ValueError):
+            grid_from_preset("No Such Rocket", C_D=[0.5])
+
+    def test_spearman(self):
+        self.assertAlmostEqual(spearman([1, 2, 3], [10, 30, 20]), 0.5)
+        self.assertAlmostEqual(spearman([1, 2, 2], [3, 1, 1]), -1.0)
+
+    # Survivors are refined at their own dt and ranked by the fine runs
+    def test_multi_fidelity_sweep(self):
+        grid = grid_from_preset("Model Rocket 1", C_D=np.linspace(0.5, 0.9, 5), thrust=[8.0, 10.0])
+        result = multi_fidelity_sweep(grid, keep=2, audit=2, processes=2)
+        self.assertEqual(result["survivors"], [1, 3])
+        self.assertEqual(result["timing"]["coarse_runs"], 10)
+        self.assertEqual(result["timing"]["fine_runs"], 4)
+        for i, fine in zip(result["survivors"], result["fine"]):
+            self.assertEqual(fine["apogee"], run_params(grid[i], False)["apogee"])
+        self.assertTrue(result["discrepancy"]["screening_safe"])
+        self.assertEqual(result["discrepancy"]["audit_misses"], [])
+
+
+class UnscentedTest(unittest.TestCase):
+    # The weighted sigma points reproduce the mean and covariance exactly
+    def test_sigma_points_moments(self):
+        covariance = np.array([[4.0, 1.0], [1.0, 2.0]])
+        points, Wm, Wc = sigma_points([1.0, 2.0], covariance, alpha=0.5)
+        self.assertEqual(len(points), 5)
+        mean = Wm @ points
+        np.testing.assert_allclose(mean, [1.0, 2.0])
+        np.testing.assert_allclose(((points - mean).T * Wc) @ (points - mean), covariance)
+
+    # For small uncertainties the apogee std follows the linearized (sensitivity) estimate
+    def test_matches_linearized_std(self):
+        std = {"C_D": 0.03, "thrust": 0.3}
+        result = unscented_transform(MODEL_ROCKET, {"C_D": None, "thrust": None}, std, processes=1)
+        self.assertEqual(result["runs"], 5)
+        gradient = simulation_from_params(MODEL_ROCKET).sensitivity(tuple(std))["apogee_gradient"]
+        linearized = np.sqrt(sum((gradient[field] * std[field])**2 for field in std))
+        self.assertAlmostEqual(result["std"]["apogee"], linearized, delta=0.01 * linearized)
+        self.assertAlmostEqual(result["mean"]["apogee"], run_params(MODEL_ROCKET, False)["apogee"], delta=0.1)
+        self.assertEqual(result["altitude_mean"].shape, (500,))
+
+
+class RenderingTest(unittest.TestCase):
+    # Background threads rasterize with Agg; the result matches a render on this thread
+    def test_rasterize_in_worker_threads(self):
+        sim = simulation_from_params(MODEL_ROCKET)
+        sim.run()
+        args = (sim.times, sim.altitudes, sim.velocities, "Model Rocket")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(rasterize, draw_trajectory, 320, 240, 80.0, *args) for _ in range(2)]
+            images = [future.result() for future in futures]
+        expected = rasterize(draw_trajectory, 320, 240, 80.0, *args)
+        for image in images:
+            self.assertEqual(image.shape, (240, 320, 4))
+            np.testing.assert_array_equal(image, expected)
+
+    # Draw functions clear the figure, so an interactive figure can be redrawn in place
+    def test_redraw_same_figure(self):
+        figure = Figure()
+        draw_trajectory(figure, [0.0, 1.0], [0.0, 1.0], [1.0, 0.0])
+        draw_error_analysis(figure, [0.1, 0.01], [1e-2, 1e-6], [1e-3, 1e-7])
+        self.assertEqual(len(figure.axes), 2)
+        self.assertEqual(figure.axes[0].get_xscale(), "log")
+
+
 if __name__ == '__main__':
     #modelRocketTest1()
 
@@ -127,4 +947,6 @@ if __name__ == '__main__':
 
     #SaturnVTest()
 
+    #SaturnVPararealTest()
+
     #V2Test()
\ No newline at end of file
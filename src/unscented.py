@@ -0,0 +1,221 @@
+'''
+    Unscented (Sigma-Point) Uncertainty Propagation Functions
+
+    For roughly Gaussian uncertainties in the rocket fields and initial
+        conditions, the mean and covariance of the flight follow from 2n + 1
+        deterministic sigma points (n = number of uncertain parameters) instead
+        of thousands of Monte Carlo runs. The sigma points run as one small
+        ensemble on a process pool; every run is resampled on a common time
+        grid through its Trajectory (dense output), so the trajectory statistics
+        come out alongside those of apogee, max velocity and flight time.
+
+    Trajectory statistics are nan at times where any run has already stopped
+        (landed or left the atmosphere).
+
+    Functions:
+        sigma_points(mean, covariance, alpha, beta, kappa):
+            Returns the 2n + 1 sigma points and their mean and covariance weights
+
+        unscented_transform(base_params, mean, covariance, t_grid, ...):
+            Propagates the uncertainty through RocketSimulation with sigma points
+
+        monte_carlo(base_params, mean, covariance, n_samples, t_grid, ...):
+            The same statistics from random samples (reference)
+
+        compare_monte_carlo(base_params, mean, covariance, n_samples, t_grid, ...):
+            Runs both and reports their differences and costs
+'''
+import os
+import time
+
+import numpy as np
+
+from src.batch import make_pool, resolve_params, simulation_from_params, summarize
+
+# Scalar metrics reported for every ensemble
+METRICS = ("apogee", "max_velocity", "flight_time")
+
+
+# Worker side: run one parameter set and sample it on the time grid
+def _run_on_grid(params: dict, t_grid):
+    sim = simulation_from_params(params)
+    sim.run()
+    summary = summarize(sim)
+    if sim.result is None or len(sim.result) == 0:
+        h = v = np.full(len(t_grid), np.nan)
+    else:
+        h, v = sim.result(t_grid)
+    return [summary[m] if summary[m] is not None else np.nan for m in METRICS], h, v
+
+
+# Run an ensemble and stack its metrics (n, 3) and trajectories (n, len(t_grid))
+def _ensemble(param_list: list, t_grid, processes: int = None, pool=None):
+    processes = processes or os.cpu_count() or 1
+    if pool is None and processes == 1:
+        outputs = [_run_on_grid(params, t_grid) for params in param_list]
+    else:
+        owns_pool = pool is None
+        if owns_pool:
+            pool = make_pool(min(processes, len(param_list)))
+        try:
+            outputs = list(pool.map(_run_on_grid, param_list, [t_grid] * len(param_list),
+                                    chunksize=max(1, len(param_list) // (4 * processes))))
+        finally:
+            if owns_pool:
+                pool.shutdown()
+    metrics = np.array([output[0] for output in outputs], dtype=np.float64)
+    altitudes = np.array([output[1] for output in outputs], dtype=np.float64)
+    velocities = np.array([output[2] for output in outputs], dtype=np.float64)
+    return metrics, altitudes, velocities
+
+
+# Parameter vector and covariance matrix from the user's mean and covariance
+def _prepare(base_params: dict, mean: dict, covariance):
+    base = resolve_params(base_params)
+    fields = list(mean)
+    unknown = [f for f in fields if f not in base or f in ("thrust_profile", "C_D_mach")]
+    if unknown:
+        raise ValueError(f"Unknown or non-numeric parameters: {', '.join(unknown)}")
+    mu = np.array([base[f] if mean[f] is None else mean[f] for f in fields], dtype=np.float64)
+
+    if isinstance(covariance, dict):
+        # Standard deviations of independent parameters
+        P = np.diag([float(covariance.get(f, 0.0))**2 for f in fields])
+    else:
+        P = np.atleast_2d(np.asarray(covariance, dtype=np.float64))
+    if P.shape != (len(fields), len(fields)):
+        raise ValueError("Covariance must be n x n for the n parameters in mean")
+    return fields, mu, P
+
+
+# Parameter dicts for rows of parameter vectors
+def _param_list(base_params: dict, fields: list, points):
+    param_list = []
+    for row in points:
+        params = dict(base_params)
+        params.update(zip(fields, (float(x) for x in row)))
+        param_list.append(params)
+    return param_list
+
+
+# Weighted mean and covariance over the first axis
+def _weighted_stats(values, Wm, Wc):
+    mean = np.tensordot(Wm, values, axes=1)
+    deviations = values - mean
+    covariance = np.einsum("i,i...j,i...k->...jk", Wc, deviations, deviations)
+    return mean, covariance
+
+
+# Statistics of an ensemble (metrics and trajectory per grid time)
+def _statistics(metrics, altitudes, velocities, Wm, Wc, t_grid):
+    metric_mean, metric_cov = _weighted_stats(metrics, Wm, Wc)
+    states = np.stack([altitudes, velocities], axis=-1)
+    state_mean, state_cov = _weighted_stats(states, Wm, Wc)
+    return {
+        "metrics": METRICS,
+        "mean": dict(zip(METRICS, metric_mean)),
+        "std": dict(zip(METRICS, np.sqrt(np.maximum(np.diag(metric_cov), 0.0)))),
+        "covariance": metric_cov,
+        "times": np.asarray(t_grid),
+        "altitude_mean": state_mean[:, 0],
+        "velocity_mean": state_mean[:, 1],
+        "altitude_std": np.sqrt(np.maximum(state_cov[:, 0, 0], 0.0)),
+        "velocity_std": np.sqrt(np.maximum(state_cov[:, 1, 1], 0.0)),
+        "state_covariance": state_cov
+    }
+
+
+# Function to compute the sigma points of a Gaussian (scaled unscented transform)
+#   - alpha spreads the points, beta = 2 is optimal for Gaussians, kappa adds to n
+def sigma_points(mean, covariance, alpha: float = 1.0, beta: float = 2.0, kappa: float = 0.0):
+    mean = np.asarray(mean, dtype=np.float64)
+    n = len(mean)
+    lam = alpha**2 * (n + kappa) - n
+    # Cholesky factor of (n + lambda) P; tiny jitter lets zero-variance entries through
+    jitter = 1e-12 * np.eye(n) * max(np.max(np.abs(np.diag(covariance))), 1.0)
+    L = np.linalg.cholesky((n + lam) * (np.asarray(covariance) + jitter))
+
+    points = np.vstack([mean, mean + L.T, mean - L.T])
+    Wm = np.full(2 * n + 1, 1.0 / (2 * (n + lam)))
+    Wc = Wm.copy()
+    Wm[0] = lam / (n + lam)
+    Wc[0] = Wm[0] + (1 - alpha**2 + beta)
+    return points, Wm, Wc
+
+
+# Function to propagate Gaussian parameter uncertainty with 2n + 1 runs
+#   - mean: {field: value or None (the base value)}
+#   - covariance: n x n matrix in the order of mean, or {field: std} for independent fields
+#   - t_grid defaults to 500 times over [0, T]
+def unscented_transform(base_params: dict, mean: dict, covariance, t_grid=None,
+                        alpha: float = 1.0, beta: float = 2.0, kappa: float = 0.0,
+                        processes: int = None, pool=None):
+    fields, mu, P = _prepare(base_params, mean, covariance)
+    if t_grid is None:
+        t_grid = np.linspace(0.0, resolve_params(base_params)["T"], 500)
+    points, Wm, Wc = sigma_points(mu, P, alpha, beta, kappa)
+
+    start = time.perf_counter()
+    metrics, altitudes, velocities = _ensemble(_param_list(base_params, fields, points), t_grid,
+                                               processes, pool)
+    result = _statistics(metrics, altitudes, velocities, Wm, Wc, t_grid)
+    result.update(runs=len(points), time=time.perf_counter() - start, fields=fields,
+                  sigma_points=points, weights=(Wm, Wc))
+    return result
+
+
+# Function to estimate the same statistics by Monte Carlo sampling
+def monte_carlo(base_params: dict, mean: dict, covariance, n_samples: int = 1000, t_grid=None,
+                seed: int = 0, processes: int = None, pool=None):
+    fields, mu, P = _prepare(base_params, mean, covariance)
+    if t_grid is None:
+        t_grid = np.linspace(0.0, resolve_params(base_params)["T"], 500)
+    samples = np.random.default_rng(seed).multivariate_normal(mu, P, size=n_samples)
+
+    start = time.perf_counter()
+    metrics, altitudes, velocities = _ensemble(_param_list(base_params, fields, samples), t_grid,
+                                               processes, pool)
+    weights = np.full(n_samples, 1.0 / n_samples)
+    # Unbiased sample covariance
+    result = _statistics(metrics, altitudes, velocities, weights, weights * n_samples / (n_samples - 1), t_grid)
+    result.update(runs=n_samples, time=time.perf_counter() - start, fields=fields)
+    return result
+
+
+# Function to validate the unscented transform against Monte Carlo
+#   - differences are relative to the Monte Carlo values; the standard errors of the
+#     Monte Carlo mean and std show how much of the difference is sampling noise
+def compare_monte_carlo(base_params: dict, mean: dict, covariance, n_samples: int = 1000,
+                        t_grid=None, seed: int = 0, processes: int = None, pool=None, **ut_options):
+    if t_grid is None:
+        t_grid = np.linspace(0.0, resolve_params(base_params)["T"], 500)
+    owns_pool = pool is None and (processes or os.cpu_count() or 1) > 1
+    if owns_pool:
+        pool = make_pool(processes)
+    try:
+        ut = unscented_transform(base_params, mean, covariance, t_grid, processes=processes,
+                                 pool=pool, **ut_options)
+        mc = monte_carlo(base_params, mean, covariance, n_samples, t_grid, seed, processes, pool)
+    finally:
+        if owns_pool:
+            pool.shutdown()
+
+    comparison = {}
+    for metric in METRICS:
+        mc_mean, mc_std = mc["mean"][metric], mc["std"][metric]
+        comparison[metric] = {
+            "ut_mean": ut["mean"][metric], "mc_mean": mc_mean,
+            "ut_std": ut["std"][metric], "mc_std": mc_std,
+            "mean_rel_diff": abs(ut["mean"][metric] - mc_mean) / max(abs(mc_mean), 1e-12),
+            "std_rel_diff": abs(ut["std"][metric] - mc_std) / max(abs(mc_std), 1e-12),
+            "mc_mean_stderr": mc_std / np.sqrt(n_samples),
+            "mc_std_stderr": mc_std / np.sqrt(2 * (n_samples - 1))
+        }
+    valid = ~np.isnan(ut["altitude_mean"]) & ~np.isnan(mc["altitude_mean"])
+    comparison["altitude_mean_max_diff"] = float(np.max(np.abs(ut["altitude_mean"] - mc["altitude_mean"])[valid])) \
+        if np.any(valid) else np.nan
+    comparison["altitude_std_max_diff"] = float(np.max(np.abs(ut["altitude_std"] - mc["altitude_std"])[valid])) \
+        if np.any(valid) else np.nan
+    comparison["runs"] = {"unscented": ut["runs"], "monte_carlo": mc["runs"]}
+    comparison["time"] = {"unscented": ut["time"], "monte_carlo": mc["time"]}
+    return {"unscented": ut, "monte_carlo": mc, "comparison": comparison}